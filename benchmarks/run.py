@@ -0,0 +1,290 @@
+"""
+Замеры производительности синхронизации на имитации Яндекс Диска.
+
+Запуск из корня проекта:
+
+    python -m benchmarks.run
+    python -m benchmarks.run tiny idle --latency 0.02 --files 5000
+
+Для каждого сценария выводятся количество файлов и объём данных в секунду,
+количество запросов к API за цикл синхронизации и потребление памяти.
+Задержка --latency добавляется к каждому запросу к API и позволяет оценить
+поведение при работе с удалённым хранилищем, а не с локальным сервером.
+
+Каждый сценарий выполняется в отдельном процессе, а имитация хранилища,
+которая держит принятые файлы в памяти, - в запускающем процессе. Поэтому
+пиковое потребление памяти относится только к синхронизации одного
+сценария. Кроме пика выводится его прирост относительно потребления после
+подготовки файлов.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from loguru import logger
+
+from file_monitor.file_monitor import FileMonitor
+from synchronizer.yandex_synchronizer import YandexSynchronizer
+from tests.mock_disk import MockDisk
+from utils.sync_state import SyncState
+
+REMOTE_FOLDER = 'benchmark'
+WRITE_CHUNK_SIZE = 1024 * 1024
+# Строки, которыми процесс сценария сообщает о начале замера и о его результате
+MEASURE_MARKER = 'measure'
+RESULT_PREFIX = 'result '
+
+
+class Result:
+    """ Вспомогательный класс, содержащий результат одного сценария. """
+    name: str
+    files: int
+    bytes: int
+    elapsed: float
+    cycles: int
+    api_calls: int
+    peak_rss: int
+    baseline_rss: int
+
+    def __init__(
+        self,
+        name: str,
+        files: int,
+        size: int,
+        elapsed: float,
+        cycles: int = 1,
+        api_calls: int = 0,
+        peak_rss: int = 0,
+        baseline_rss: int = 0,
+    ):
+        self.name = name
+        self.files = files
+        self.bytes = size
+        self.elapsed = elapsed
+        self.cycles = cycles
+        self.api_calls = api_calls
+        self.peak_rss = peak_rss
+        self.baseline_rss = baseline_rss
+
+    def format(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        return '{name:<6} {files:>7} файлов {megabytes:>9.1f} МБ {elapsed:>8.2f} с ' \
+            '{files_per_second:>9.1f} файлов/с {megabytes_per_second:>8.2f} МБ/с ' \
+            '{calls:>8.1f} запросов/цикл {rss:>7.1f} МБ RSS (+{growth:.1f} МБ)'.format(
+                name=self.name,
+                files=self.files,
+                megabytes=self.bytes / 2 ** 20,
+                elapsed=self.elapsed,
+                files_per_second=self.files / elapsed,
+                megabytes_per_second=self.bytes / 2 ** 20 / elapsed,
+                calls=self.api_calls / self.cycles,
+                rss=self.peak_rss / 2 ** 20,
+                growth=(self.peak_rss - self.baseline_rss) / 2 ** 20,
+            )
+
+
+def get_peak_rss() -> int:
+    """ Получить пиковое потребление памяти процессом в байтах. """
+    try:
+        # В Linux ru_maxrss наследуется от запускающего процесса, а VmHWM отсчитывается заново
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux значение в килобайтах, в macOS - в байтах
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def create_files(folder: str, names: List[str], size: int):
+    """ Создать файлы с указанными именами и случайным содержимым размера size, записывая их порциями. """
+    for name in names:
+        path = os.path.join(folder, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            remaining = size
+            while remaining:
+                length = min(WRITE_CHUNK_SIZE, remaining)
+                file.write(os.urandom(length))
+                remaining -= length
+
+
+def make_monitor(folder: str, state_path: str) -> FileMonitor:
+    state = SyncState(state_path)
+    synchronizer = YandexSynchronizer('token', folder, REMOTE_FOLDER, state=state)
+    return FileMonitor(folder, 1, synchronizer, state=state)
+
+
+def count_api_calls(disk: MockDisk) -> int:
+    """ Подсчитать запросы к API, не считая передачи данных по ссылкам. """
+    return disk.count_calls() - disk.count_calls(endpoint='/upload') - disk.count_calls(endpoint='/download')
+
+
+def start_measurement() -> int:
+    """
+    Сообщить запускающему процессу о начале замера и дождаться, пока он запомнит счётчик запросов.
+
+    Returns:
+        int: потребление памяти перед замером в байтах.
+    """
+    print(MEASURE_MARKER, flush=True)
+    sys.stdin.readline()
+    return get_peak_rss()
+
+
+def synchronize(monitor: FileMonitor):
+    """ Выполнить цикл синхронизации и дождаться фоновой передачи крупных файлов, которую цикл не ожидает. """
+    monitor.perform_synchronization()
+    while monitor.scheduler.get_pending_keys():
+        time.sleep(0.01)
+
+
+def measure(name: str, folder: str, state_path: str, files: int, size: int) -> Result:
+    """ Выполнить один цикл синхронизации и замерить его. """
+    monitor = make_monitor(folder, state_path)
+    baseline_rss = start_measurement()
+    started_at = time.monotonic()
+    synchronize(monitor)
+    elapsed = time.monotonic() - started_at
+    return Result(name, files, size, elapsed, baseline_rss=baseline_rss)
+
+
+def run_tiny(folder: str, state_path: str, args: argparse.Namespace) -> Result:
+    """ Загрузка большого количества маленьких файлов. """
+    create_files(folder, ['{0:03}/{1}.txt'.format(i // 100, i) for i in range(args.files)], 1024)
+    return measure('tiny', folder, state_path, args.files, args.files * 1024)
+
+
+def run_huge(folder: str, state_path: str, args: argparse.Namespace) -> Result:
+    """ Загрузка одного большого файла. """
+    size = args.huge_size * 2 ** 20
+    create_files(folder, ['huge.bin'], size)
+    return measure('huge', folder, state_path, 1, size)
+
+
+def run_deep(folder: str, state_path: str, args: argparse.Namespace) -> Result:
+    """ Загрузка файлов, разложенных по глубокому дереву папок. """
+    names = []
+    for i in range(args.files):
+        depth = i % args.depth + 1
+        names.append('/'.join('d{0}'.format(level) for level in range(depth)) + '/{0}.txt'.format(i))
+    create_files(folder, names, 1024)
+    return measure('deep', folder, state_path, args.files, args.files * 1024)
+
+
+def run_idle(folder: str, state_path: str, args: argparse.Namespace) -> Result:
+    """ Повторные циклы синхронизации без изменений после первичной загрузки. """
+    create_files(folder, ['{0:03}/{1}.txt'.format(i // 100, i) for i in range(args.files)], 1024)
+    monitor = make_monitor(folder, state_path)
+    synchronize(monitor)
+
+    baseline_rss = start_measurement()
+    started_at = time.monotonic()
+    for _ in range(args.cycles):
+        synchronize(monitor)
+    elapsed = time.monotonic() - started_at
+    return Result('idle', args.files * args.cycles, 0, elapsed, args.cycles, baseline_rss=baseline_rss)
+
+
+SCENARIOS: Dict[str, Callable[[str, str, argparse.Namespace], Result]] = {
+    'tiny': run_tiny,
+    'huge': run_huge,
+    'deep': run_deep,
+    'idle': run_idle,
+}
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Замеры производительности синхронизации.')
+    parser.add_argument(
+        'scenarios',
+        nargs='*',
+        help='сценарии: {names}. По умолчанию выполняются все'.format(names=', '.join(SCENARIOS)),
+    )
+    parser.add_argument('--files', type=int, default=1000, help='количество файлов в сценариях tiny, deep, idle')
+    parser.add_argument('--huge-size', type=int, default=256, help='размер файла в сценарии huge, МБ')
+    parser.add_argument('--depth', type=int, default=20, help='глубина дерева в сценарии deep')
+    parser.add_argument('--cycles', type=int, default=5, help='количество циклов в сценарии idle')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответов API, с')
+    # Используются при запуске сценария в отдельном процессе
+    parser.add_argument('--api-url', help=argparse.SUPPRESS)
+    parser.add_argument('--folder', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error('неизвестные сценарии: {names}'.format(names=', '.join(unknown)))
+    return args
+
+
+def run_scenario(args: argparse.Namespace):
+    """ Выполнить сценарий в текущем процессе и вывести результат для запускающего процесса. """
+    YandexSynchronizer.BASE_URL = args.api_url
+    result = SCENARIOS[args.scenarios[0]](
+        os.path.join(args.folder, 'files'),
+        os.path.join(args.folder, 'state.db'),
+        args,
+    )
+    result.peak_rss = get_peak_rss()
+    print(RESULT_PREFIX + json.dumps(vars(result)), flush=True)
+
+
+def spawn_scenario(name: str, args: argparse.Namespace) -> Result:
+    """ Запустить сценарий в отдельном процессе и подсчитать запросы к имитации хранилища за время замера. """
+    folder = tempfile.mkdtemp(prefix='yadisk-benchmark-')
+    try:
+        with MockDisk(latency=args.latency) as disk:
+            command = [
+                sys.executable, '-m', 'benchmarks.run', name,
+                '--files', str(args.files),
+                '--huge-size', str(args.huge_size),
+                '--depth', str(args.depth),
+                '--cycles', str(args.cycles),
+                '--api-url', disk.api_url,
+                '--folder', folder,
+            ]
+            with subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) as process:
+                calls = 0
+                result = None
+                for line in process.stdout:
+                    line = line.strip()
+                    if line == MEASURE_MARKER:
+                        calls = count_api_calls(disk)
+                        process.stdin.write('\n')
+                        process.stdin.flush()
+                    elif line.startswith(RESULT_PREFIX):
+                        values = json.loads(line[len(RESULT_PREFIX):])
+                        values['size'] = values.pop('bytes')
+                        result = Result(**values)
+                        result.api_calls = count_api_calls(disk) - calls
+        if result is None:
+            raise RuntimeError('Сценарий {name} завершился без результата'.format(name=name))
+        return result
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main(argv: List[str]):
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    if args.api_url:
+        run_scenario(args)
+        return
+
+    for name in args.scenarios or list(SCENARIOS):
+        print(spawn_scenario(name, args).format(), flush=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
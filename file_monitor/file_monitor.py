@@ -1,26 +1,111 @@
+import datetime
+import os
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Set, Tuple, Union
 
 from loguru import logger
 
-from synchronizer.synchronizer import Synchronizer
+from file_monitor.inotify_watcher import InotifyWatcher
+from synchronizer.synchronizer import SynchronizationError, Synchronizer
+from synchronizer.transfer_priority import TransferPriority
+from synchronizer.transfer_scheduler import TransferBatch, TransferScheduler, TransferStats
 from utils import file_utils
+from utils.file_scanner import FileScanner
+from utils.hash_cache import HashCache
+from utils.metrics import Metrics
+from utils.sync_state import SyncRecord, SyncState
 
 
 class FileMonitor:
     """ Класс, отслеживающий состояние файлов. """
+    COMPARE_BY_MTIME = 'mtime'
+    COMPARE_BY_HASH = 'hash'
+    WATCH_AUTO = 'auto'
+    WATCH_INOTIFY = 'inotify'
+    WATCH_POLLING = 'polling'
+    DIRECTION_UPLOAD = 'upload'
+    DIRECTION_BOTH = 'both'
+    CHANGES_BY_LISTING = 'listing'
+    CHANGES_BY_FEED = 'feed'
+    # Запас на расхождение часов и загрузки, завершившиеся после проверки ленты изменений
+    CHANGES_OVERLAP = 300
+
     local_file_folder: str
     interval: int
     synchronizer: Synchronizer
+    state: Union[SyncState, None]
+    listing_interval: int
+    scheduler: TransferScheduler
+    compare_mode: str
+    hash_cache: Union[HashCache, None]
+    watch_mode: str
+    scanner: FileScanner
+    metrics: Metrics
+    direction: str
+    bundle_threshold: int
+    bundle_size: int
+    remote_change_mode: str
+    full_listing_interval: int
+    job_name: str
 
     def __init__(
             self,
             local_file_folder: str,
             interval: int,
             synchronizer: Synchronizer,
+            state: Union[SyncState, None] = None,
+            listing_interval: int = 3600,
+            scheduler: Union[TransferScheduler, None] = None,
+            compare_mode: str = COMPARE_BY_MTIME,
+            hash_cache: Union[HashCache, None] = None,
+            watch_mode: str = WATCH_POLLING,
+            scanner: Union[FileScanner, None] = None,
+            metrics: Union[Metrics, None] = None,
+            priority: Union[TransferPriority, None] = None,
+            direction: str = DIRECTION_UPLOAD,
+            bundle_threshold: int = 0,
+            bundle_size: int = 4 * 1024 * 1024,
+            remote_change_mode: str = CHANGES_BY_LISTING,
+            full_listing_interval: int = 24 * 3600,
+            job_name: str = '',
     ):
         self.interval = interval
         self.local_file_folder = local_file_folder
         self.synchronizer = synchronizer
+        self.state = state
+        self.listing_interval = listing_interval
+        self.scheduler = scheduler or TransferScheduler()
+        self.compare_mode = compare_mode
+        self.hash_cache = hash_cache
+        if compare_mode == self.COMPARE_BY_HASH and hash_cache is None:
+            self.hash_cache = HashCache()
+        self.watch_mode = watch_mode
+        self.scanner = scanner or FileScanner(local_file_folder)
+        self.metrics = metrics or Metrics()
+        self.priority = priority or TransferPriority()
+        self.direction = direction
+        self.bundle_threshold = bundle_threshold
+        self.bundle_size = bundle_size
+        self.remote_change_mode = remote_change_mode
+        self.full_listing_interval = full_listing_interval
+        self.job_name = job_name
+        # Ключи операций в планировщике, общем для нескольких заданий, не должны совпадать
+        self._key_prefix = job_name + ':' if job_name else ''
+        self._bundle: List[Tuple[file_utils.FileInfo, bool]] = []
+        self._bundle_bytes = 0
+        self._bundle_lock = threading.Lock()
+        self._state_is_suspect = False
+        self._batch: Union[TransferBatch, None] = None
+        self._background: Union[TransferBatch, None] = None
+        self._in_flight = set()
+        # При двусторонней синхронизации содержимое файлов одного размера без записи
+        # о синхронизации сверяется и в режиме сравнения по времени изменения
+        self._content_hashes = self.hash_cache
+        if direction == self.DIRECTION_BOTH and self._content_hashes is None:
+            self._content_hashes = HashCache()
 
     def start(self):
         """ Запуск мониторинга. """
@@ -29,43 +114,1339 @@ class FileMonitor:
                 directory=self.local_file_folder,
             ),
         )
-        while True:
+        watcher = self._create_watcher()
+        if watcher is None:
+            while True:
+                self.perform_synchronization()
+                time.sleep(self.interval)
+
+        logger.info('Изменения файлов отслеживаются средствами inotify')
+        try:
+            while True:
+                self.perform_synchronization()
+                full_synchronization_at = time.monotonic() + self.listing_interval
+                while time.monotonic() < full_synchronization_at:
+                    changed = watcher.wait(full_synchronization_at - time.monotonic())
+                    if changed is None:
+                        logger.warning(
+                            'События файловой системы потеряны, выполняется полная проверка',
+                        )
+                        break
+
+                    if changed:
+                        self.synchronize_paths(changed)
+        finally:
+            # Иначе перезапуск задания после ошибки оставляет открытым дескриптор inotify
+            watcher.close()
+
+    def _create_watcher(self) -> Union[InotifyWatcher, None]:
+        """
+        Создать наблюдатель за изменениями, если это позволяет режим и платформа.
+
+        Наблюдатель требует сохранённого состояния синхронизации, с которым
+        сравниваются изменённые файлы. При невозможности его создать
+        используется периодический опрос директории.
+        """
+        if self.watch_mode == self.WATCH_POLLING or self.state is None:
+            return
+
+        if not InotifyWatcher.is_supported():
+            if self.watch_mode == self.WATCH_INOTIFY:
+                logger.warning('inotify недоступен, используется периодический опрос директории')
+            return
+
+        try:
+            return InotifyWatcher(self.local_file_folder)
+        except OSError as e:
+            logger.warning(
+                'Не удалось включить inotify ({error}), используется периодический опрос директории'.format(
+                    error=e,
+                ),
+            )
+
+    def synchronize_paths(self, filenames: Iterable[str]):
+        """
+        Синхронизировать только указанные файлы, сравнивая их с сохранённым состоянием.
+
+        Args:
+            filenames (Iterable[str]): имена изменённых, созданных или удалённых файлов.
+        """
+        if self.state is None or self._is_listing_required():
             self.perform_synchronization()
-            time.sleep(self.interval)
+            return
+
+        deleted_records = {}
+        new_files = {}
+        self._begin_cycle()
+        self.metrics.increment('cycles_total', kind='paths', job=self.job_name)
+        started_at = time.monotonic()
+        for file in filenames:
+            local_file = file_utils.get_file_info(self.local_file_folder, file)
+            record = self.state.get(file)
+            if (
+                local_file is not None and
+                local_file.is_dir and
+                (record is None or not record.is_dir)
+            ):
+                # Содержимое новой папки ещё не синхронизировалось
+                new_files.update(
+                    file_utils.get_files_info(self.local_file_folder, file) or {},
+                )
+
+            if record is None:
+                if local_file is not None:
+                    new_files[file] = local_file
+                continue
+
+            if local_file is None or local_file.is_dir != record.is_dir:
+                logger.info(
+                    'Файл {file} удалён из локальной директории'.format(
+                        file=file
+                    ),
+                )
+                deleted_records[file] = record
+                if record.is_dir:
+                    for nested_record in self.state.records(file):
+                        deleted_records[nested_record.name] = nested_record
+                if local_file is not None:
+                    new_files[file] = local_file
+                continue
+
+            self._compare_with_record(record, local_file)
+
+        self._submit_remaining(
+            list(deleted_records.values()),
+            new_files,
+            'Новый файл {file} обнаружен в локальной директории',
+        )
+        self.metrics.observe('phase_seconds', time.monotonic() - started_at, phase='diff', job=self.job_name)
+        self._finish_cycle()
 
     def perform_synchronization(self):
-        """ Выполнить синхронизацию файлов. """
-        remote_files = self.synchronizer.get_info()
-        local_files = file_utils.get_files_info(self.local_file_folder)
-        if remote_files is None or local_files is None:
+        """
+        Выполнить синхронизацию файлов.
+
+        Если сохранённое состояние синхронизации достоверно, локальные файлы
+        сравниваются с ним без обращения к хранилищу. Полный список файлов
+        хранилища запрашивается раз в listing_interval секунд, а также
+        при отсутствии или недостоверности состояния. В режиме direction='both'
+        изменения в хранилище переносятся в локальную директорию при получении
+        полного списка файлов.
+
+        В режиме remote_change_mode='feed' раз в listing_interval секунд вместо
+        полного списка запрашивается лента загруженных в хранилище файлов,
+        а полный список - раз в full_listing_interval секунд или если
+        по ленте нельзя определить все изменения.
+        """
+        with self.metrics.phase('scan', job=self.job_name):
+            local_files = self.scanner.get_files_info()
+        if local_files is None:
+            return
+
+        self.metrics.set_gauge('local_files', len(local_files), job=self.job_name)
+        self._begin_cycle()
+        is_listing_required = self._is_listing_required()
+        remote_changes = None
+        if is_listing_required and self._is_change_feed_usable():
+            remote_changes = self._get_remote_changes()
+            is_listing_required = remote_changes is None
+
+        if is_listing_required:
+            kind = 'listing'
+        else:
+            kind = 'state' if remote_changes is None else 'feed'
+        self.metrics.increment('cycles_total', kind=kind, job=self.job_name)
+        with self.metrics.phase('diff', job=self.job_name):
+            if is_listing_required:
+                if self.direction == self.DIRECTION_BOTH and self.state is not None:
+                    self._synchronize_both_ways(local_files)
+                else:
+                    self._synchronize_with_listing(local_files)
+            elif remote_changes is not None:
+                self._synchronize_with_changes(local_files, remote_changes)
+            else:
+                self._synchronize_with_state(local_files)
+        self._finish_cycle()
+
+    def _begin_cycle(self):
+        """
+        Начать цикл синхронизации.
+
+        Файлы, передача которых ещё продолжается в фоне, в этом цикле пропускаются.
+        """
+        self._batch = self.scheduler.batch(self._key_prefix)
+        self._in_flight = self.scheduler.get_pending_keys(self._key_prefix)
+
+    def _finish_cycle(self):
+        """
+        Дождаться операций цикла, сообщить их итоги и сохранить состояние.
+
+        Передачи крупных файлов не ожидаются: их итоги сообщаются
+        в конце цикла, к которому они завершились.
+        """
+        with self.metrics.phase('transfer', job=self.job_name):
+            self._flush_bundle()
+            stats = self._batch.wait()
+            # Файлы могли попасть в архив после проверки содержимого
+            while self._flush_bundle():
+                stats = self._batch.wait()
+        if stats.operations:
+            self._log_stats(stats)
+
+        if self._background is not None and not self._background.pending:
+            background_stats = self._background.wait()
+            self._background = None
+            logger.info('Фоновая передача крупных файлов завершена.')
+            self._log_stats(background_stats)
+
+        if self.state is not None:
+            if self._state_is_suspect:
+                self.state.invalidate()
+            self.state.commit()
+        self._state_is_suspect = False
+
+    def _log_stats(self, stats: TransferStats):
+        """ Сообщить итоги выполнения группы операций. """
+        logger.info(
+            'Обработано файлов: {operations}, из них с ошибкой: {failed}. '
+            'Передано {megabytes:.1f} МБ за {elapsed:.1f} с '
+            '({files_per_second:.1f} файлов/с, {megabytes_per_second:.2f} МБ/с), '
+            'без передачи получено {saved_megabytes:.1f} МБ'.format(
+                operations=stats.operations,
+                failed=stats.failed,
+                megabytes=stats.bytes / 2 ** 20,
+                saved_megabytes=stats.bytes_saved / 2 ** 20,
+                elapsed=stats.elapsed,
+                files_per_second=stats.files_per_second,
+                megabytes_per_second=stats.megabytes_per_second,
+            ),
+        )
+        connection_stats = self.synchronizer.get_connection_stats()
+        if connection_stats is not None:
+            logger.info(
+                'Открыто соединений: {opened}, повторно использовано '
+                '{reused} из {requests} запросов ({rate:.0%}).'.format(
+                    opened=connection_stats.opened,
+                    reused=connection_stats.reused,
+                    requests=connection_stats.requests,
+                    rate=connection_stats.reuse_rate,
+                ),
+            )
+
+    def _is_listing_required(self) -> bool:
+        """ Проверить, требуется ли получить список файлов или ленту изменений хранилища. """
+        if self.state is None:
+            return True
+
+        checked_at = self.state.listed_at
+        if not checked_at:
+            # Состояние недостоверно или список ещё не получался: лента изменений
+            # не заменяет полную сверку, и откладывать её нельзя
+            return True
+
+        if self.remote_change_mode == self.CHANGES_BY_FEED:
+            checked_at = max(checked_at, self.state.changes_checked_at)
+        return time.time() - checked_at >= self.listing_interval
+
+    def _is_change_feed_usable(self) -> bool:
+        """ Проверить, можно ли вместо полного списка файлов хранилища запросить ленту изменений. """
+        return (
+            self.remote_change_mode == self.CHANGES_BY_FEED and
+            self.state is not None and
+            time.time() - self.state.listed_at < self.full_listing_interval
+        )
+
+    def _get_remote_changes(self) -> Union[List[file_utils.FileInfo], None]:
+        """
+        Получить файлы, загруженные в хранилище с прошлой проверки.
+
+        Returns:
+            List[FileInfo]: загруженные файлы, пустой список, если ленту получить
+                            не удалось. Или None, если по ленте нельзя определить
+                            все изменения и нужен полный список файлов.
+        """
+        checked_at = time.time()
+        since = max(self.state.listed_at, self.state.changes_checked_at) - self.CHANGES_OVERLAP
+        try:
+            changes = self.synchronizer.get_changes(
+                datetime.datetime.fromtimestamp(since, tz=datetime.timezone.utc),
+            )
+        except SynchronizationError:
+            # Лента будет запрошена в следующем цикле
+            return []
+
+        if changes is None:
+            logger.info(
+                'Изменений в удалённом хранилище больше, чем помещается в ленту, выполняется полная сверка',
+            )
             return
 
-        for file in remote_files:
-            if file not in local_files.keys() or not local_files[file].size:
+        self.state.set_changes_checked_at(checked_at)
+        return changes
+
+    def _synchronize_with_listing(self, local_files: Dict[str, file_utils.FileInfo]):
+        """
+        Синхронизировать файлы, сравнивая их со списком файлов хранилища.
+
+        Обновления выполняются по мере получения списка файлов хранилища.
+        Удаление и загрузка откладываются до получения полного списка,
+        чтобы не сдвигать страницы, которые ещё предстоит запросить.
+        """
+        if self.state is not None:
+            self.state.begin_listing()
+
+        files_to_delete = []
+        try:
+            for remote_file in self.metrics.timed(self.synchronizer.iter_info(), 'listing', job=self.job_name):
+                file = remote_file.name
+                local_file = local_files.pop(file, None)
+                if local_file is None or local_file.is_dir != remote_file.is_dir:
+                    logger.info(
+                        'Подлежащий удалению файл {file} обнаружен в удалённом хранилище'.format(
+                            file=file
+                        ),
+                    )
+                    files_to_delete.append(self._get_deleted_record(remote_file))
+                    if local_file is not None:
+                        local_files[file] = local_file
+                    continue
+
+                if remote_file.is_dir:
+                    self._remember(SyncRecord.from_file_info(local_file))
+                    continue
+
+                if self.compare_mode == self.COMPARE_BY_HASH and remote_file.md5:
+                    if local_file.size == remote_file.size:
+                        record = self.state.get(file) if self.state is not None else None
+                        if (
+                            record is not None and
+                            record.md5 == remote_file.md5 and
+                            record.matches(local_file)
+                        ):
+                            # Файл не менялся с синхронизации, хешировать его не нужно
+                            self._remember(SyncRecord.from_file_info(local_file, remote_file))
+                        else:
+                            self._check_content(local_file, remote_file.md5)
+                        continue
+
+                    logger.info(
+                        'Устаревший файл {file} обнаружен в удалённом хранилище'.format(
+                            file=file
+                        ),
+                    )
+                    self._submit_update(local_file)
+                    continue
+
+                if local_file.modified_at > remote_file.modified_at:
+                    logger.info(
+                        'Устаревший файл {file} обнаружен в удалённом хранилище'.format(
+                            file=file
+                        ),
+                    )
+                    self._submit_update(local_file)
+                    continue
+
+                self._remember(SyncRecord.from_file_info(local_file, remote_file))
+        except SynchronizationError:
+            return
+
+        if self.state is not None:
+            self.state.finish_listing()
+
+        self._submit_remaining(
+            files_to_delete,
+            local_files,
+            'Файл {file} не найден в удалённом хранилище',
+        )
+
+    def _synchronize_both_ways(self, local_files: Dict[str, file_utils.FileInfo]):
+        """
+        Синхронизировать файлы в обе стороны, сравнивая их со списком файлов хранилища.
+
+        Локальный файл и файл в хранилище сравниваются с записью о последней
+        синхронизации, поэтому изменение, сделанное на одной стороне,
+        переносится на другую, а не отменяется ею. Если файл изменён на обеих
+        сторонах, локальная версия сохраняется под новым именем и загружается
+        как новый файл, а версия из хранилища скачивается. Файлы без записи
+        о синхронизации сравниваются по времени изменения.
+
+        Если папка синхронизации в хранилище пуста, а сохранённое состояние -
+        нет, папка скорее всего потеряна или только что создана заново.
+        Тогда локальные файлы не удаляются, а загружаются в хранилище снова.
+        """
+        self.state.begin_listing()
+        files_to_delete = []
+        downloads = []
+        conflicts = {}
+        unverified = []
+        is_remote_empty = True
+        try:
+            for remote_file in self.metrics.timed(self.synchronizer.iter_info(), 'listing', job=self.job_name):
+                is_remote_empty = False
+                file = remote_file.name
+                record = self.state.get(file)
+                local_file = local_files.pop(file, None)
+                if local_file is None:
+                    if record is not None and not self._is_changed_remotely(record, remote_file):
+                        logger.info(
+                            'Файл {file} удалён из локальной директории'.format(
+                                file=file
+                            ),
+                        )
+                        files_to_delete.append(self._get_deleted_record(remote_file))
+                    else:
+                        logger.info(
+                            'Новый файл {file} обнаружен в удалённом хранилище'.format(
+                                file=file
+                            ),
+                        )
+                        downloads.append((remote_file, None))
+                    continue
+
+                if local_file.is_dir != remote_file.is_dir:
+                    logger.info(
+                        'Подлежащий удалению файл {file} обнаружен в удалённом хранилище'.format(
+                            file=file
+                        ),
+                    )
+                    files_to_delete.append(self._get_deleted_record(remote_file))
+                    local_files[file] = local_file
+                    continue
+
+                if remote_file.is_dir:
+                    self._remember(SyncRecord.from_file_info(local_file))
+                    continue
+
+                conflict_copy = self._compare_both_ways(record, local_file, remote_file, downloads, unverified)
+                if conflict_copy is not None:
+                    conflicts[conflict_copy.name] = conflict_copy
+        except SynchronizationError:
+            return
+
+        for conflict_copy in self._verify_contents(unverified, downloads):
+            conflicts[conflict_copy.name] = conflict_copy
+
+        # Записи о файлах, которых нет в хранилище, нужно получить до удаления
+        # устаревших записей: по ним файлы, удалённые из хранилища, отличаются от новых
+        deleted_remotely = []
+        for file, local_file in list(local_files.items()):
+            record = self.state.get(file)
+            if record is not None and record.matches(local_file):
+                del local_files[file]
+                deleted_remotely.append(local_file)
+
+        if is_remote_empty and deleted_remotely:
+            logger.error(
+                'Папка синхронизации в удалённом хранилище пуста, хотя файлов в ней ожидалось: {count}. '
+                'Локальные файлы не удаляются и будут загружены заново.'.format(
+                    count=len(deleted_remotely),
+                ),
+            )
+            local_files.update((local_file.name, local_file) for local_file in deleted_remotely)
+            deleted_remotely = []
+
+        self.state.finish_listing()
+
+        # Папка, в которую предстоит скачать новые файлы, не удаляется целиком
+        download_folders = {
+            folder
+            for remote_file, _ in downloads
+            for folder in file_utils.get_parent_names(remote_file.name)
+        }
+        files_to_delete = [
+            record for record in files_to_delete if record.name not in download_folders
+        ]
+
+        self._delete_local_files(deleted_remotely)
+        local_files.update(conflicts)
+        self._submit_remaining(
+            files_to_delete,
+            local_files,
+            'Файл {file} не найден в удалённом хранилище',
+        )
+        self._submit_downloads(downloads)
+
+    def _compare_both_ways(
+        self,
+        record: Union[SyncRecord, None],
+        local_file: file_utils.FileInfo,
+        remote_file: file_utils.FileInfo,
+        downloads: List[Tuple[file_utils.FileInfo, Union[file_utils.FileInfo, None]]],
+        unverified: List[Tuple[file_utils.FileInfo, file_utils.FileInfo, Future]],
+    ) -> Union[file_utils.FileInfo, None]:
+        """
+        Определить, в какую сторону синхронизировать файл, существующий на обеих сторонах.
+
+        Если записи о синхронизации нет, а размеры совпадают, содержимое
+        сверяется по контрольной сумме после получения списка файлов.
+
+        Args:
+            record (SyncRecord): запись о последней синхронизации файла, если она есть.
+            local_file (FileInfo): информация о локальном файле.
+            remote_file (FileInfo): информация о файле в хранилище.
+            downloads (List[Tuple[FileInfo, FileInfo]]): файлы хранилища, которые нужно
+                                                         скачать, и заменяемые ими локальные файлы.
+            unverified (List[Tuple[FileInfo, FileInfo, Future]]): файлы, содержимое которых
+                                                                 нужно сверить, и вычисление
+                                                                 контрольной суммы локального файла.
+        Returns:
+            FileInfo: копия локальной версии файла, изменённого на обеих сторонах,
+                      которую нужно загрузить как новый файл. Иначе None.
+        """
+        file = local_file.name
+        if record is None:
+            if local_file.modified_at > remote_file.modified_at:
                 logger.info(
-                    'Подлежащий удалению файл {file} обнаружен в удалённом хранилище'.format(
+                    'Устаревший файл {file} обнаружен в удалённом хранилище'.format(
+                        file=file
+                    ),
+                )
+                self._submit_update(local_file)
+            elif local_file.size != remote_file.size:
+                logger.info(
+                    'Устаревший файл {file} обнаружен в локальной директории'.format(
                         file=file
                     ),
                 )
-                self.synchronizer.delete(file)
+                downloads.append((remote_file, local_file))
+            elif remote_file.md5 and local_file.size:
+                unverified.append((local_file, remote_file, self._content_hashes.submit(local_file)))
+            else:
+                self._remember(SyncRecord.from_file_info(local_file, remote_file))
+            return
+
+        changed_locally = not record.matches(local_file)
+        changed_remotely = self._is_changed_remotely(record, remote_file)
+        if changed_remotely:
+            # Запись нужна до завершения скачивания: если оно не удастся,
+            # по ней следующая сверка снова обнаружит изменение в хранилище
+            self._remember(record)
+        if changed_locally and changed_remotely:
+            conflict_copy = self._keep_conflict_copy(local_file)
+            if conflict_copy is not None:
+                downloads.append((remote_file, None))
+            return conflict_copy
+
+        if changed_remotely:
+            logger.info(
+                'Файл {file} изменён в удалённом хранилище'.format(
+                    file=file
+                ),
+            )
+            downloads.append((remote_file, local_file))
+        elif changed_locally:
+            self._compare_with_record(record, local_file)
+        else:
+            self._remember(SyncRecord.from_file_info(local_file, remote_file))
+
+    def _verify_contents(
+        self,
+        unverified: List[Tuple[file_utils.FileInfo, file_utils.FileInfo, Future]],
+        downloads: List[Tuple[file_utils.FileInfo, Union[file_utils.FileInfo, None]]],
+    ) -> List[file_utils.FileInfo]:
+        """
+        Сверить содержимое файлов одного размера, о синхронизации которых нет записи.
+
+        Совпадающие файлы запоминаются как синхронизированные. Если содержимое
+        отличается, неизвестно, какая версия новее, поэтому локальная версия
+        сохраняется под новым именем, а версия из хранилища скачивается.
 
-        for file in local_files.keys():
-            if not local_files[file].size:
+        Args:
+            unverified (List[Tuple[FileInfo, FileInfo, Future]]): локальный файл, файл
+                                                                 в хранилище и вычисление
+                                                                 контрольной суммы локального файла.
+            downloads (List[Tuple[FileInfo, FileInfo]]): файлы хранилища, которые нужно
+                                                         скачать, и заменяемые ими локальные файлы.
+        Returns:
+            List[FileInfo]: копии локальных версий, которые нужно загрузить как новые файлы.
+        """
+        conflicts = []
+        for local_file, remote_file, future in unverified:
+            if future.exception() is not None:
+                # Файл изменён или удалён во время сверки, он будет сверен в следующем цикле
                 continue
 
-            if file not in remote_files:
-                logger.info(
-                    'Файл {file} не найден в удалённом хранилище'.format(
-                        file=file
+            if future.result()[0] == remote_file.md5:
+                self._remember(SyncRecord.from_file_info(local_file, remote_file))
+                continue
+
+            conflict_copy = self._keep_conflict_copy(local_file)
+            if conflict_copy is not None:
+                downloads.append((remote_file, None))
+                conflicts.append(conflict_copy)
+        return conflicts
+
+    @staticmethod
+    def _is_changed_remotely(record: SyncRecord, remote_file: file_utils.FileInfo) -> bool:
+        """
+        Проверить, изменился ли файл в хранилище с момента синхронизации.
+
+        Файл считается изменённым, если отличается его размер или, когда
+        обе известны, контрольная сумма.
+        """
+        if record.is_dir or remote_file.is_dir:
+            return record.is_dir != remote_file.is_dir
+
+        return remote_file.size != record.size or bool(
+            record.md5 and remote_file.md5 and record.md5 != remote_file.md5
+        )
+
+    def _keep_conflict_copy(self, local_file: file_utils.FileInfo) -> Union[file_utils.FileInfo, None]:
+        """
+        Сохранить локальную версию файла, изменённого на обеих сторонах, под новым именем.
+
+        Returns:
+            FileInfo: информация о сохранённой копии. Или None, если переименовать файл не удалось.
+        """
+        folder, _, base_name = local_file.name.rpartition('/')
+        stem, extension = os.path.splitext(base_name)
+        conflict_name = '{stem} (conflict {moment:%Y-%m-%d %H%M%S}){extension}'.format(
+            stem=stem,
+            moment=datetime.datetime.now(),
+            extension=extension,
+        )
+        if folder:
+            conflict_name = '{folder}/{name}'.format(folder=folder, name=conflict_name)
+
+        try:
+            os.rename(
+                local_file.path,
+                file_utils.get_local_path(self.local_file_folder, conflict_name),
+            )
+        except OSError as e:
+            logger.error(
+                'Файл {file} изменён и в локальной директории, и в удалённом хранилище, '
+                'но сохранить локальную версию не удалось: {error}'.format(
+                    file=local_file.name,
+                    error=e,
+                ),
+            )
+            return
+
+        logger.warning(
+            'Файл {file} изменён и в локальной директории, и в удалённом хранилище. '
+            'Локальная версия сохранена как {copy}'.format(
+                file=local_file.name,
+                copy=conflict_name,
+            ),
+        )
+        return file_utils.get_file_info(self.local_file_folder, conflict_name)
+
+    def _delete_local_files(self, local_files: List[file_utils.FileInfo]):
+        """
+        Удалить локальные файлы и папки, удалённые из хранилища.
+
+        Папки удаляются после файлов, начиная с самых вложенных, и только
+        если они пусты: оставшиеся в них новые файлы будут загружены.
+        """
+        folders = []
+        for local_file in local_files:
+            if local_file.name in self._in_flight:
+                continue
+
+            if local_file.is_dir:
+                folders.append(local_file)
+                continue
+
+            try:
+                os.remove(local_file.path)
+            except OSError as e:
+                logger.error(
+                    'Не удалось удалить файл {file} из локальной директории: {error}'.format(
+                        file=local_file.name,
+                        error=e,
                     ),
                 )
-                self.synchronizer.upload(local_files[file].path)
                 continue
 
-            if local_files[file].modified_at > remote_files[file].modified_at:
+            logger.info(
+                'Файл {file} удалён, так как он удалён из удалённого хранилища'.format(
+                    file=local_file.name,
+                ),
+            )
+
+        for folder in sorted(folders, key=lambda f: f.name.count('/'), reverse=True):
+            try:
+                os.rmdir(folder.path)
+            except OSError:
+                continue
+
+            logger.info(
+                'Папка {folder} удалена, так как она удалена из удалённого хранилища'.format(
+                    folder=folder.name,
+                ),
+            )
+
+    def _submit_downloads(
+        self,
+        downloads: List[Tuple[file_utils.FileInfo, Union[file_utils.FileInfo, None]]],
+    ):
+        """
+        Создать недостающие локальные папки и поставить скачивание файлов в очередь.
+
+        Файлы скачиваются параллельно в тех же очередях, что и загружаются.
+
+        Args:
+            downloads (List[Tuple[FileInfo, FileInfo]]): файлы хранилища и заменяемые
+                                                         ими локальные файлы, если они есть.
+        """
+        for remote_file, _ in sorted(downloads, key=lambda item: item[0].name.count('/')):
+            if remote_file.is_dir:
+                self._create_local_folder(remote_file)
+
+        for remote_file, replaced in downloads:
+            if not remote_file.is_dir and remote_file.name not in self._in_flight:
+                self._submit_transfer(self._download, remote_file, replaced)
+
+    def _synchronize_with_changes(
+        self,
+        local_files: Dict[str, file_utils.FileInfo],
+        remote_changes: List[file_utils.FileInfo],
+    ):
+        """
+        Синхронизировать файлы по сохранённому состоянию и ленте изменений хранилища.
+
+        Файлы из ленты сравниваются с записями о синхронизации: файлы, загруженные
+        самой программой, совпадают с ними и пропускаются. В режиме direction='both'
+        изменённые в хранилище файлы скачиваются так же, как при полной сверке.
+        Иначе они перезаписываются локальными версиями, а отсутствующие локально -
+        удаляются. Остальные файлы сравниваются с сохранённым состоянием.
+        """
+        files_to_delete = []
+        downloads = []
+        unverified = []
+        handled = set()
+        for remote_file in remote_changes:
+            file = remote_file.name
+            record = self.state.get(file)
+            if record is not None and not self._is_changed_remotely(record, remote_file):
+                continue
+
+            local_file = local_files.get(file)
+            if local_file is not None and local_file.is_dir:
+                # Файл на месте локальной папки обнаружит полная сверка
+                continue
+
+            if self.direction == self.DIRECTION_BOTH:
+                handled.add(file)
+                local_files.pop(file, None)
+                if local_file is not None:
+                    conflict_copy = self._compare_both_ways(
+                        record,
+                        local_file,
+                        remote_file,
+                        downloads,
+                        unverified,
+                    )
+                    if conflict_copy is not None:
+                        local_files[conflict_copy.name] = conflict_copy
+                    continue
+
+                message = 'Файл {file} изменён в удалённом хранилище'
+                if record is None:
+                    message = 'Новый файл {file} обнаружен в удалённом хранилище'
+                logger.info(message.format(file=file))
+                downloads.append((remote_file, None))
+            elif local_file is not None:
+                handled.add(file)
+                local_files.pop(file)
                 logger.info(
                     'Устаревший файл {file} обнаружен в удалённом хранилище'.format(
                         file=file
                     ),
                 )
-                self.synchronizer.update(local_files[file].path)
+                self._submit_update(local_file)
+            elif record is None:
+                logger.info(
+                    'Подлежащий удалению файл {file} обнаружен в удалённом хранилище'.format(
+                        file=file
+                    ),
+                )
+                files_to_delete.append(self._get_deleted_record(remote_file))
+
+        for conflict_copy in self._verify_contents(unverified, downloads):
+            local_files[conflict_copy.name] = conflict_copy
+        self._synchronize_with_state(local_files, handled, files_to_delete)
+        self._submit_downloads(downloads)
+
+    def _synchronize_with_state(
+        self,
+        local_files: Dict[str, file_utils.FileInfo],
+        skipped: Union[Set[str], None] = None,
+        files_to_delete: Union[List[SyncRecord], None] = None,
+    ):
+        """
+        Синхронизировать файлы, сравнивая их с сохранённым состоянием.
+
+        Args:
+            local_files (Dict[str, FileInfo]): локальные файлы.
+            skipped (Set[str]): файлы, уже обработанные в этом цикле.
+            files_to_delete (List[SyncRecord]): уже найденные файлы хранилища, подлежащие удалению.
+        """
+        skipped = skipped or set()
+        files_to_delete = list(files_to_delete or [])
+        for record in self.state.records():
+            file = record.name
+            if file in skipped:
+                continue
+            local_file = local_files.pop(file, None)
+            if local_file is None or local_file.is_dir != record.is_dir:
+                logger.info(
+                    'Файл {file} удалён из локальной директории'.format(
+                        file=file
+                    ),
+                )
+                files_to_delete.append(record)
+                if local_file is not None:
+                    local_files[file] = local_file
+                continue
+
+            self._compare_with_record(record, local_file)
+
+        self._submit_remaining(
+            files_to_delete,
+            local_files,
+            'Новый файл {file} обнаружен в локальной директории',
+        )
+
+    def _compare_with_record(self, record: SyncRecord, local_file: file_utils.FileInfo):
+        """ Поставить обновление файла в очередь, если он изменился с момента синхронизации. """
+        if record.is_dir or record.matches(local_file):
+            return
+
+        if (
+            self.compare_mode == self.COMPARE_BY_HASH and
+            record.md5 and
+            record.size == local_file.size
+        ):
+            self._check_content(local_file, record.md5)
+            return
+
+        logger.info(
+            'Файл {file} изменён в локальной директории'.format(
+                file=local_file.name
+            ),
+        )
+        self._submit_update(local_file)
+
+    def _get_deleted_record(self, remote_file: file_utils.FileInfo) -> SyncRecord:
+        """
+        Получить запись о подлежащем удалению файле хранилища.
+
+        inode и время изменения локального файла, нужные для поиска
+        перемещений, берутся из записи о синхронизации той же версии файла.
+        """
+        deleted_record = SyncRecord.from_file_info(remote_file)
+        if self.state is not None:
+            record = self.state.get(remote_file.name)
+            if record is not None:
+                deleted_record.inode = record.inode
+                if record.size == remote_file.size:
+                    deleted_record.modified_at = record.modified_at
+        return deleted_record
+
+    def _submit_remaining(
+        self,
+        deleted_records: List[SyncRecord],
+        new_files: Dict[str, file_utils.FileInfo],
+        new_file_message: str,
+    ):
+        """
+        Поставить в очередь создание папок, перемещения, удаления и загрузки.
+
+        Сначала создаются новые папки, затем пары из удалённого и нового
+        файла с одинаковым содержимым заменяются перемещением файла на
+        стороне хранилища. Только после этого удаляются исчезнувшие файлы
+        и папки; содержимое удаляемой папки отдельно не удаляется.
+
+        Args:
+            deleted_records (List[SyncRecord]): файлы и папки, отсутствующие локально.
+            new_files (Dict[str, FileInfo]): файлы и папки, отсутствующие в хранилище.
+            new_file_message (str): сообщение журнала о новом файле.
+        """
+        new_folders = [local_file for local_file in new_files.values() if local_file.is_dir]
+        for folder in new_folders:
+            del new_files[folder.name]
+        self._create_folders(new_folders)
+
+        # Файлы, передача которых продолжается в фоне, будут проверены позже
+        deleted_records = [
+            record for record in deleted_records if record.name not in self._in_flight
+        ]
+        for name in self._in_flight.intersection(new_files):
+            del new_files[name]
+        moved = set()
+        for record, local_file in self._find_moves(deleted_records, new_files):
+            logger.info(
+                'Файл {source} переименован в {file}'.format(
+                    source=record.name,
+                    file=local_file.name,
+                ),
+            )
+            moved.add(record.name)
+            del new_files[local_file.name]
+            self._batch.submit(local_file.name, self._move, record.name, local_file)
+        if moved:
+            self._batch.wait()
+
+        deleted_folders = {record.name for record in deleted_records if record.is_dir}
+        for record in deleted_records:
+            if record.name in moved or any(
+                folder in deleted_folders
+                for folder in file_utils.get_parent_names(record.name)
+            ):
+                continue
+
+            self._batch.submit(
+                record.name,
+                self._delete,
+                record.name,
+                lane=TransferScheduler.LANE_DELETE,
+            )
+
+        for file, local_file in new_files.items():
+            logger.info(new_file_message.format(file=file))
+            self._submit_upload(local_file)
+
+    def _create_folders(self, folders: List[file_utils.FileInfo]):
+        """
+        Создать папки в хранилище.
+
+        Папки одного уровня вложенности создаются параллельно,
+        следующий уровень - после завершения предыдущего.
+        """
+        levels = defaultdict(list)
+        for folder in folders:
+            levels[folder.name.count('/')].append(folder)
+
+        for depth in sorted(levels):
+            for folder in levels[depth]:
+                logger.info(
+                    'Новая папка {folder} обнаружена в локальной директории'.format(
+                        folder=folder.name,
+                    ),
+                )
+                self._batch.submit(folder.name, self._create_folder, folder)
+            self._batch.wait()
+
+    def _find_moves(
+        self,
+        deleted_records: List[SyncRecord],
+        new_files: Dict[str, file_utils.FileInfo],
+    ) -> List[Tuple[SyncRecord, file_utils.FileInfo]]:
+        """
+        Сопоставить удалённые и новые файлы.
+
+        Файлы сопоставляются по размеру и контрольной сумме, а если её
+        сравнить нельзя - по размеру, inode и времени изменения. Контрольные
+        суммы вычисляются только для новых файлов, размер которых совпал
+        с размером удалённого. Несопоставленные файлы удаляются и загружаются.
+
+        Returns:
+            List[Tuple[SyncRecord, FileInfo]]: пары из удалённого и нового файла.
+        """
+        records_by_size = defaultdict(list)
+        for record in deleted_records:
+            if not record.is_dir:
+                records_by_size[record.size].append(record)
+
+        candidates = [
+            (local_file, records_by_size[local_file.size])
+            for local_file in new_files.values()
+            if local_file.size in records_by_size
+        ]
+        hashes = {}
+        if self.hash_cache is not None:
+            for local_file, records in candidates:
+                if any(record.md5 for record in records):
+                    hashes[local_file.name] = self.hash_cache.submit(local_file)
+
+        moves = []
+        matched = set()
+        for local_file, records in candidates:
+            md5 = None
+            future = hashes.get(local_file.name)
+            if future is not None and future.exception() is None:
+                md5 = future.result()[0]
+
+            for record in records:
+                if record.name in matched:
+                    continue
+
+                if md5 is not None and record.md5 is not None:
+                    is_same = md5 == record.md5
+                else:
+                    # Освободившийся inode сразу достаётся новому файлу,
+                    # а переименование сохраняет время изменения
+                    is_same = (
+                        local_file.inode is not None and
+                        local_file.inode == record.inode and
+                        local_file.modified_at.timestamp() == record.modified_at
+                    )
+
+                if is_same:
+                    moves.append((record, local_file))
+                    matched.add(record.name)
+                    break
+
+        return moves
+
+    def _submit_update(self, local_file: file_utils.FileInfo):
+        """ Поставить обновление файла в очередь. """
+        if local_file.name in self._in_flight:
+            return
+
+        self._submit_transfer(self._update, local_file)
+
+    def _submit_transfer(self, operation: Callable, local_file: file_utils.FileInfo, *args):
+        """
+        Поставить передачу файла в очередь согласно правилам priority.
+
+        Скачивание передаёт сюда информацию о файле в хранилище, а в args -
+        заменяемый локальный файл. Остальные аргументы операции передаются после local_file.
+        Крупные файлы передаются в фоновой группе, завершения которой
+        цикл синхронизации не ожидает. Загрузки и обновления файлов меньше
+        bundle_threshold байт, если он не 0, собираются в архивы.
+        """
+        if (
+            self.bundle_threshold and
+            local_file.size < self.bundle_threshold and
+            operation in (self._upload, self._update)
+        ):
+            self._add_to_bundle(local_file, replaced=operation == self._update)
+            return
+
+        lane = self.priority.get_lane(local_file)
+        if lane == TransferScheduler.LANE_LARGE:
+            if self._background is None:
+                self._background = self.scheduler.batch(self._key_prefix)
+            batch = self._background
+        else:
+            batch = self._batch
+
+        batch.submit(
+            local_file.name,
+            operation,
+            local_file,
+            *args,
+            size=local_file.size,
+            lane=lane,
+            rank=self.priority.get_rank(local_file),
+        )
+
+    def _add_to_bundle(self, local_file: file_utils.FileInfo, replaced: bool):
+        """
+        Добавить мелкий файл в собираемый архив.
+
+        Архив ставится в очередь, когда размер его файлов достигает bundle_size байт.
+
+        Args:
+            local_file (FileInfo): информация о локальном файле.
+            replaced (bool): файл уже есть в хранилище.
+        """
+        with self._bundle_lock:
+            self._bundle.append((local_file, replaced))
+            self._bundle_bytes += local_file.size
+            if self._bundle_bytes < self.bundle_size:
+                return
+
+            files = self._take_bundle()
+        self._submit_bundle(files)
+
+    def _flush_bundle(self) -> bool:
+        """
+        Поставить в очередь собираемый архив, не дожидаясь его заполнения.
+
+        Returns:
+            bool: True, если в архиве были файлы.
+        """
+        with self._bundle_lock:
+            files = self._take_bundle()
+        if not files:
+            return False
+
+        self._submit_bundle(files)
+        return True
+
+    def _take_bundle(self) -> List[Tuple[file_utils.FileInfo, bool]]:
+        files = self._bundle
+        self._bundle = []
+        self._bundle_bytes = 0
+        return files
+
+    def _submit_bundle(self, files: List[Tuple[file_utils.FileInfo, bool]]):
+        """ Поставить загрузку архива в очередь. """
+        self._batch.submit(
+            files[0][0].name,
+            self._upload_bundle,
+            files,
+            size=sum(local_file.size for local_file, _ in files),
+            lane=TransferScheduler.LANE_SMALL,
+        )
+
+    def _submit_upload(self, local_file: file_utils.FileInfo):
+        """
+        Поставить загрузку файла в очередь.
+
+        При сравнении по контрольной сумме сначала проверяется, нет ли
+        в хранилище файла с тем же содержимым: такой файл копируется
+        на стороне хранилища без передачи данных.
+        """
+        if local_file.name in self._in_flight:
+            return
+
+        if (
+            self.hash_cache is None or
+            self.state is None or
+            not local_file.size or
+            not self.state.has_hashed_size(local_file.size)
+        ):
+            self._submit_transfer(self._upload, local_file)
+            return
+
+        def find_duplicate(future: Future):
+            record = None
+            if future.exception() is None:
+                md5, sha256 = future.result()
+                record = self.state.find_by_content(local_file.size, md5, sha256)
+
+            if record is None or record.name == local_file.name:
+                self._submit_transfer(self._upload, local_file)
+                return
+
+            self._batch.submit(local_file.name, self._copy, record.name, local_file)
+
+        self._batch.after(self.hash_cache.submit(local_file), find_duplicate)
+
+    def _check_content(self, local_file: file_utils.FileInfo, md5: str):
+        """
+        Сравнить содержимое файла с известной контрольной суммой.
+
+        Контрольная сумма локального файла вычисляется в фоне. Если она
+        совпадает, файл только запоминается как синхронизированный,
+        иначе обновление ставится в очередь.
+
+        Args:
+            local_file (FileInfo): информация о локальном файле.
+            md5 (str): контрольная сумма файла в хранилище.
+        """
+        def compare(future: Future):
+            if future.exception() is None and future.result()[0] == md5:
+                self._remember(SyncRecord.from_file_info(local_file))
+                return
+
+            logger.info(
+                'Содержимое файла {file} отличается от содержимого в удалённом хранилище'.format(
+                    file=local_file.name
+                ),
+            )
+            self._submit_update(local_file)
+
+        self._batch.after(self.hash_cache.submit(local_file), compare)
+
+    def _upload(self, local_file: file_utils.FileInfo) -> Union[bool, Future]:
+        """ Загрузить файл и запомнить результат. """
+        return self._when_done(
+            local_file.name,
+            self.synchronizer.upload(local_file.path),
+            lambda uploaded: self._on_sent(local_file, uploaded),
+        )
+
+    def _upload_bundle(self, files: List[Tuple[file_utils.FileInfo, bool]]) -> Union[bool, Future]:
+        """ Загрузить файлы архивом и запомнить результат. """
+        return self._when_done(
+            files[0][0].name,
+            self.synchronizer.upload_bundle(
+                [local_file.path for local_file, _ in files],
+                [local_file.name for local_file, replaced in files if replaced],
+            ),
+            lambda uploaded: self._on_bundle_sent(files, uploaded),
+        )
+
+    def _on_bundle_sent(self, files: List[Tuple[file_utils.FileInfo, bool]], sent: bool) -> bool:
+        if sent:
+            for local_file, _ in files:
+                self._remember(SyncRecord.from_file_info(local_file))
+            return True
+
+        self._invalidate_state()
+        return False
+
+    def _copy(self, source_filename: str, local_file: file_utils.FileInfo) -> Union[bool, Future]:
+        """ Получить файл копированием в хранилище, а при неудаче - загрузить. """
+        return self._when_done(
+            local_file.name,
+            self.synchronizer.copy(source_filename, local_file.name),
+            lambda copied: self._on_copied(local_file, copied),
+        )
+
+    def _on_copied(self, local_file: file_utils.FileInfo, copied: bool) -> Union[bool, Future]:
+        if not copied:
+            return self._upload(local_file)
+
+        self._remember(SyncRecord.from_file_info(local_file))
+        self._get_current_batch().add_saved(local_file.size)
+        return True
+
+    def _move(self, source_filename: str, local_file: file_utils.FileInfo) -> Union[bool, Future]:
+        """ Переместить файл в хранилище, а при неудаче - загрузить новый и удалить старый. """
+        return self._when_done(
+            local_file.name,
+            self.synchronizer.move(source_filename, local_file.name),
+            lambda moved: self._on_moved(source_filename, local_file, moved),
+        )
+
+    def _on_moved(
+        self,
+        source_filename: str,
+        local_file: file_utils.FileInfo,
+        moved: bool,
+    ) -> Union[bool, Future]:
+        if not moved:
+            return self._when_done(
+                local_file.name,
+                self._upload(local_file),
+                lambda uploaded: uploaded and self._delete(source_filename),
+            )
+
+        if self.state is not None:
+            self.state.remove(source_filename)
+        self._remember(SyncRecord.from_file_info(local_file))
+        self._get_current_batch().add_saved(local_file.size)
+        return True
+
+    def _update(self, local_file: file_utils.FileInfo) -> Union[bool, Future]:
+        """ Обновить файл и запомнить результат. """
+        return self._when_done(
+            local_file.name,
+            self.synchronizer.update(local_file.path),
+            lambda updated: self._on_sent(local_file, updated),
+        )
+
+    def _on_sent(self, local_file: file_utils.FileInfo, sent: bool) -> bool:
+        if sent:
+            self._remember(SyncRecord.from_file_info(local_file))
+            return True
+
+        self._invalidate_state()
+        return False
+
+    def _download(
+        self,
+        remote_file: file_utils.FileInfo,
+        replaced: Union[file_utils.FileInfo, None] = None,
+    ) -> Union[bool, Future]:
+        """ Скачать файл, если локальный файл не изменился с момента сравнения, и запомнить результат. """
+        return self._when_done(
+            remote_file.name,
+            self.synchronizer.download(remote_file.name, remote_file.modified_at, replaced),
+            lambda downloaded: self._on_downloaded(remote_file, downloaded),
+        )
+
+    def _on_downloaded(self, remote_file: file_utils.FileInfo, downloaded: bool) -> bool:
+        local_file = None
+        if downloaded:
+            local_file = file_utils.get_file_info(self.local_file_folder, remote_file.name)
+
+        if local_file is not None:
+            self._remember(SyncRecord.from_file_info(local_file, remote_file))
+            return True
+
+        self._invalidate_state()
+        return False
+
+    def _create_local_folder(self, folder: file_utils.FileInfo):
+        """ Создать папку из хранилища в локальной директории и запомнить результат. """
+        try:
+            os.makedirs(
+                file_utils.get_local_path(self.local_file_folder, folder.name),
+                exist_ok=True,
+            )
+        except OSError as e:
+            logger.error(
+                'Не удалось создать папку {folder} в локальной директории: {error}'.format(
+                    folder=folder.name,
+                    error=e,
+                ),
+            )
+            self._invalidate_state()
+            return
+
+        local_folder = file_utils.get_file_info(self.local_file_folder, folder.name)
+        if local_folder is not None:
+            self._remember(SyncRecord.from_file_info(local_folder))
+
+    def _create_folder(self, folder: file_utils.FileInfo) -> bool:
+        """ Создать папку и запомнить результат. """
+        if self.synchronizer.create_remote_folder(folder.name):
+            self._remember(SyncRecord.from_file_info(folder))
+            return True
+
+        self._invalidate_state()
+        return False
+
+    def _delete(self, filename: str) -> Union[bool, Future]:
+        """ Удалить файл или папку и запомнить результат. """
+        return self._when_done(
+            filename,
+            self.synchronizer.delete(filename),
+            lambda deleted: self._on_deleted(filename, deleted),
+        )
+
+    def _on_deleted(self, filename: str, deleted: bool) -> bool:
+        if deleted:
+            if self.state is not None:
+                self.state.remove_tree(filename)
+            return True
+
+        self._invalidate_state()
+        return False
+
+    def _when_done(
+        self,
+        key: str,
+        result: Union[bool, Future],
+        callback: Callable[[bool], Union[bool, Future]],
+    ) -> Union[bool, Future]:
+        """
+        Обработать признак успеха операции, когда он станет известен.
+
+        Если хранилище выполняет операцию асинхронно, обработка ставится
+        в очередь с тем же ключом после подтверждения операции. До этого
+        файл считается находящимся в обработке, и другие операции с ним
+        не выполняются.
+
+        Args:
+            key (str): ключ упорядочивания операций, имя файла.
+            result (Union[bool, Future]): результат операции синхронизатора.
+            callback (Callable[[bool], Union[bool, Future]]): обработчик признака успеха.
+        Returns:
+            Union[bool, Future]: результат обработчика или Future с признаком успеха операции.
+        """
+        if not isinstance(result, Future):
+            return callback(result)
+
+        batch = self._get_current_batch()
+        confirmed = Future()
+
+        def on_done(future: Future):
+            success = future.exception() is None and bool(future.result())
+            # Операция уже учтена в итогах, обработчик результата не учитывается
+            batch.submit(key, callback, success, counted=False)
+            confirmed.set_result(success)
+
+        result.add_done_callback(on_done)
+        return confirmed
+
+    def _get_current_batch(self) -> TransferBatch:
+        """ Получить группу выполняемой операции: цикла синхронизации или фоновую. """
+        return self.scheduler.get_current_batch() or self._batch
+
+    def _remember(self, record: SyncRecord):
+        """ Сохранить запись о синхронизированном файле. """
+        if self.state is not None:
+            self.state.put(record)
+
+    def _invalidate_state(self):
+        """ Запросить полный список файлов хранилища в следующем цикле. """
+        self._state_is_suspect = True
@@ -0,0 +1,191 @@
+""" Отслеживание изменений файлов средствами inotify (только Linux). """
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Set, Union
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CREATE = 0x00000100
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_ATTRIB | IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_FROM | IN_MOVED_TO |
+    IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+FOLDER_LOST_MASK = IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc() -> Union[ctypes.CDLL, None]:
+    if not sys.platform.startswith('linux'):
+        return
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return
+
+    if not hasattr(libc, 'inotify_init1'):
+        return
+    return libc
+
+
+class InotifyWatcher:
+    """
+    Класс, собирающий имена изменённых файлов директории и её подпапок.
+
+    Наблюдение за новыми подпапками начинается автоматически. Файл считается
+    изменённым после закрытия на запись, переименования, удаления или смены
+    атрибутов, поэтому недописанные файлы не попадают в синхронизацию.
+    События накапливаются, пока поток изменений не затихнет на debounce секунд.
+    """
+    path: str
+    debounce: float
+
+    def __init__(self, path: str, debounce: float = 1.0):
+        self.path = path
+        self.debounce = debounce
+        self._libc = _load_libc()
+        if self._libc is None:
+            raise OSError('inotify недоступен на этой платформе')
+
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+
+        self._folders: Dict[int, str] = {}
+        try:
+            self._add_tree('')
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    @staticmethod
+    def is_supported() -> bool:
+        """ Проверить, доступен ли inotify на этой платформе. """
+        return _load_libc() is not None
+
+    def wait(self, timeout: float) -> Union[Set[str], None]:
+        """
+        Дождаться изменений.
+
+        Args:
+            timeout (float): максимальное время ожидания первого события, в секундах.
+        Returns:
+            Set[str]: имена изменённых файлов и папок относительно path; пустое множество, если изменений не было.
+                      Или None, если события были потеряны и нужна полная проверка.
+        """
+        changed = set()
+        if not self._poll(timeout):
+            return changed
+
+        rescan = False
+        deadline = time.monotonic() + self.debounce * 10
+        while True:
+            rescan = self._read(changed) or rescan
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._poll(min(self.debounce, remaining)):
+                break
+
+        return None if rescan else changed
+
+    def close(self):
+        os.close(self._fd)
+
+    def _poll(self, timeout: float) -> bool:
+        readable, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        return bool(readable)
+
+    def _read(self, changed: Set[str]) -> bool:
+        """ Прочитать доступные события. Возвращает True, если нужна полная проверка. """
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+
+        rescan = False
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+                continue
+
+            folder = self._folders.get(wd)
+            if folder is None:
+                continue
+
+            if mask & FOLDER_LOST_MASK:
+                if mask & IN_IGNORED:
+                    del self._folders[wd]
+                if not folder:
+                    rescan = True
+                continue
+
+            if not name or mask & IN_CREATE and not mask & IN_ISDIR:
+                continue
+
+            name = self._join(folder, os.fsdecode(name))
+            changed.add(name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(name)
+                elif mask & IN_MOVED_FROM:
+                    self._remove_tree(name)
+        return rescan
+
+    @staticmethod
+    def _join(folder: str, name: str) -> str:
+        return '{}/{}'.format(folder, name) if folder else name
+
+    def _add_watch(self, folder: str):
+        wd = self._libc.inotify_add_watch(
+            self._fd,
+            os.fsencode(os.path.join(self.path, folder)),
+            WATCH_MASK,
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch', folder or self.path)
+        self._folders[wd] = folder
+
+    def _add_tree(self, folder: str):
+        """ Начать наблюдение за папкой и всеми её подпапками. """
+        folders = [folder]
+        while folders:
+            current = folders.pop()
+            try:
+                self._add_watch(current)
+                with os.scandir(os.path.join(self.path, current)) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            folders.append(self._join(current, entry.name))
+            except OSError:
+                # Корневую папку обязательно нужно отслеживать,
+                # а подпапка могла быть удалена до начала наблюдения
+                if not current:
+                    raise
+
+    def _remove_tree(self, folder: str):
+        """ Прекратить наблюдение за перемещённой папкой и её подпапками. """
+        prefix = folder + '/'
+        for wd, name in list(self._folders.items()):
+            if name == folder or name.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._folders[wd]
@@ -0,0 +1,56 @@
+""" Выполнение нескольких заданий синхронизации в одном процессе. """
+import threading
+import time
+from typing import Dict, List
+
+from loguru import logger
+
+from file_monitor.file_monitor import FileMonitor
+
+
+class SyncDaemon:
+    """
+    Класс, запускающий мониторинг нескольких папок в отдельных потоках.
+
+    Каждое задание работает со своим интервалом синхронизации, а планировщик,
+    ограничения скорости и соединения задания получают при создании,
+    поэтому они могут быть общими. Задание, завершившееся непредвиденной
+    ошибкой, перезапускается через restart_delay секунд, не затрагивая остальные.
+    """
+    monitors: Dict[str, FileMonitor]
+    restart_delay: int
+
+    def __init__(self, monitors: Dict[str, FileMonitor], restart_delay: int = 60):
+        self.monitors = monitors
+        self.restart_delay = restart_delay
+
+    def start(self):
+        """ Запустить все задания и работать, пока они выполняются. """
+        logger.info(
+            'Запускается заданий синхронизации: {count}'.format(count=len(self.monitors)),
+        )
+        threads: List[threading.Thread] = []
+        for name, monitor in self.monitors.items():
+            thread = threading.Thread(
+                target=self._run,
+                args=(name, monitor),
+                name='job-{name}'.format(name=name),
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+    def _run(self, name: str, monitor: FileMonitor):
+        """ Выполнять задание, перезапуская его после непредвиденных ошибок. """
+        while True:
+            try:
+                monitor.start()
+            except Exception:
+                logger.exception(
+                    'Задание синхронизации {name} остановлено из-за ошибки, '
+                    'перезапуск через {delay} с.'.format(name=name, delay=self.restart_delay),
+                )
+            time.sleep(self.restart_delay)
@@ -1,11 +1,25 @@
+import configparser
+import os
+import re
 import sys
+from typing import Dict, List, Union
 
 from dotenv import dotenv_values
 from loguru import logger
 
 from file_monitor.file_monitor import FileMonitor
+from file_monitor.sync_daemon import SyncDaemon
+from synchronizer.http_session import HttpSession
+from synchronizer.rate_limiter import ConcurrencyGovernor
+from synchronizer.transfer_priority import TransferPriority
+from synchronizer.transfer_scheduler import TransferScheduler
 from synchronizer.yandex_synchronizer import YandexSynchronizer
 from utils import file_utils
+from utils.bandwidth_limiter import BandwidthLimiter
+from utils.file_scanner import FileScanner
+from utils.hash_cache import HashCache
+from utils.metrics import Metrics
+from utils.sync_state import SyncState
 
 
 def configure_logger(log_directory: str):
@@ -19,25 +33,115 @@ def configure_logger(log_directory: str):
     logger.configure(**log_cong)
 
 
+def get_int_option(config: dict, name: str, default: int) -> Union[int, None]:
+    """
+    Получить необязательный целочисленный параметр конфигурации.
+
+    Args:
+        config (dict): параметры из .env файла.
+        name (str): имя параметра.
+        default (int): значение по умолчанию.
+    Returns:
+        int: значение параметра. Или None, если значение некорректно.
+    """
+    value = config.get(name)
+    if not value:
+        return default
+
+    try:
+        return int(value)
+    except ValueError:
+        return
+
+
 def display_error_message(message: str):
     print(message)
     input('Нажмите любую клавишу для выхода.')
 
 
-def main():
-    config = dotenv_values(".env")
+class SyncJob:
+    """ Вспомогательный класс, содержащий параметры синхронизации одной папки. """
+    name: str
+    oauth_token: str
+    local_folder_path: str
+    remote_folder_name: str
+    synchronization_interval: int
+    remote_listing_interval: int
+    remote_change_mode: str
+    remote_full_listing_interval: int
+    resumable_upload_threshold: int
+    segmented_upload_threshold: int
+    bundle_threshold: int
+    bundle_size: int
+    compare_mode: str
+    watch_mode: str
+    sync_direction: str
+
+    def __init__(self, name: str, **options):
+        self.name = name
+        for option, value in options.items():
+            setattr(self, option, value)
+
+
+def load_jobs_config(config: dict) -> Union[Dict[str, dict], None]:
+    """
+    Получить параметры заданий синхронизации.
+
+    Если в .env файле указан jobs_file, каждая секция этого INI-файла описывает
+    отдельное задание: её параметры, а также параметры секции DEFAULT,
+    дополняют и переопределяют параметры .env файла. Иначе единственное
+    задание без имени описывается самим .env файлом.
+
+    Args:
+        config (dict): параметры из .env файла.
+    Returns:
+        Dict[str, dict]: параметры заданий по именам. Или None, если файл заданий не удалось прочитать.
+    """
+    jobs_file = config.get('jobs_file')
+    if not jobs_file:
+        return {'': config}
+
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        with open(jobs_file, encoding='utf-8') as file:
+            parser.read_file(file)
+    except (OSError, configparser.Error):
+        return
+
+    return {name: dict(config, **parser[name]) for name in parser.sections()}
 
+
+def read_job(name: str, config: dict, where: str) -> Union[SyncJob, None]:
+    """
+    Прочитать и проверить параметры задания синхронизации.
+
+    Args:
+        name (str): имя задания, '' - единственное задание из .env файла.
+        config (dict): параметры задания.
+        where (str): место, где задаются параметры, для сообщений об ошибках.
+    Returns:
+        SyncJob: параметры задания. Или None, если они некорректны, - сообщение уже выведено.
+    """
     oauth_token = config.get('oauth_token')
     local_folder_path = config.get('local_folder_path')
     remote_folder_name = config.get('remote_folder_name')
     synchronization_interval = config.get('synchronization_interval')
-    log_directory = config.get('log_directory')
+    remote_listing_interval = get_int_option(config, 'remote_listing_interval', 3600)
+    remote_change_mode = config.get('remote_change_mode') or FileMonitor.CHANGES_BY_LISTING
+    remote_full_listing_interval = get_int_option(config, 'remote_full_listing_interval', 24 * 3600)
+    resumable_upload_threshold = get_int_option(config, 'resumable_upload_threshold', 64)
+    segmented_upload_threshold = get_int_option(config, 'segmented_upload_threshold', 0)
+    bundle_threshold = get_int_option(config, 'bundle_threshold', 0)
+    bundle_size = get_int_option(config, 'bundle_size', 4)
+    compare_mode = config.get('compare_mode') or FileMonitor.COMPARE_BY_MTIME
+    watch_mode = config.get('watch_mode') or FileMonitor.WATCH_AUTO
+    sync_direction = config.get('sync_direction') or FileMonitor.DIRECTION_UPLOAD
 
     try:
         synchronization_interval = int(synchronization_interval)
     except (TypeError, ValueError):
         display_error_message(
-            'Необходимо указать synchronization_interval в секундах в .env файле',
+            'Необходимо указать synchronization_interval в секундах {where}'.format(where=where),
         )
         return
 
@@ -47,33 +151,351 @@ def main():
         file_utils.check_if_exists(local_folder_path)
     ):
         display_error_message(
-            'Необходимо указать абсолютный путь к существующей директории в local_folder_path в .env файле',
+            'Необходимо указать абсолютный путь к существующей директории в local_folder_path {where}'.format(
+                where=where,
+            ),
         )
         return
 
     if not remote_folder_name:
         display_error_message(
-            'Необходимо указать remote_folder_name в .env файле',
+            'Необходимо указать remote_folder_name {where}'.format(where=where),
         )
         return
 
     if not oauth_token:
         display_error_message(
-            'Необходимо указать oauth_token в .env файле',
+            'Необходимо указать oauth_token {where}'.format(where=where),
+        )
+        return
+
+    if remote_listing_interval is None:
+        display_error_message(
+            'Необходимо указать remote_listing_interval в секундах {where}'.format(where=where),
+        )
+        return
+
+    if remote_change_mode not in (FileMonitor.CHANGES_BY_LISTING, FileMonitor.CHANGES_BY_FEED):
+        display_error_message(
+            'Необходимо указать в remote_change_mode значение listing или feed {where}'.format(where=where),
+        )
+        return
+
+    if remote_full_listing_interval is None:
+        display_error_message(
+            'Необходимо указать remote_full_listing_interval в секундах {where}'.format(where=where),
+        )
+        return
+
+    if resumable_upload_threshold is None:
+        display_error_message(
+            'Необходимо указать resumable_upload_threshold в мегабайтах {where}'.format(where=where),
+        )
+        return
+
+    if segmented_upload_threshold is None or segmented_upload_threshold < 0:
+        display_error_message(
+            'Необходимо указать неотрицательное segmented_upload_threshold в мегабайтах {where}'.format(
+                where=where,
+            ),
+        )
+        return
+
+    if bundle_threshold is None or bundle_threshold < 0:
+        display_error_message(
+            'Необходимо указать неотрицательное bundle_threshold в КБ {where}'.format(where=where),
+        )
+        return
+
+    if not bundle_size or bundle_size < 1:
+        display_error_message(
+            'Необходимо указать положительное bundle_size в мегабайтах {where}'.format(where=where),
+        )
+        return
+
+    if compare_mode not in (FileMonitor.COMPARE_BY_MTIME, FileMonitor.COMPARE_BY_HASH):
+        display_error_message(
+            'Необходимо указать в compare_mode значение mtime или hash {where}'.format(where=where),
+        )
+        return
+
+    if watch_mode not in (
+        FileMonitor.WATCH_AUTO,
+        FileMonitor.WATCH_INOTIFY,
+        FileMonitor.WATCH_POLLING,
+    ):
+        display_error_message(
+            'Необходимо указать в watch_mode значение auto, inotify или polling {where}'.format(where=where),
+        )
+        return
+
+    if sync_direction not in (FileMonitor.DIRECTION_UPLOAD, FileMonitor.DIRECTION_BOTH):
+        display_error_message(
+            'Необходимо указать в sync_direction значение upload или both {where}'.format(where=where),
+        )
+        return
+
+    return SyncJob(
+        name,
+        oauth_token=oauth_token,
+        local_folder_path=local_folder_path,
+        remote_folder_name=remote_folder_name,
+        synchronization_interval=synchronization_interval,
+        remote_listing_interval=remote_listing_interval,
+        remote_change_mode=remote_change_mode,
+        remote_full_listing_interval=remote_full_listing_interval,
+        resumable_upload_threshold=resumable_upload_threshold,
+        segmented_upload_threshold=segmented_upload_threshold,
+        bundle_threshold=bundle_threshold,
+        bundle_size=bundle_size,
+        compare_mode=compare_mode,
+        watch_mode=watch_mode,
+        sync_direction=sync_direction,
+    )
+
+
+def read_jobs(config: dict) -> Union[List[SyncJob], None]:
+    """
+    Прочитать и проверить параметры всех заданий синхронизации.
+
+    Args:
+        config (dict): параметры из .env файла.
+    Returns:
+        List[SyncJob]: задания. Или None, если параметры некорректны, - сообщение уже выведено.
+    """
+    jobs_file = config.get('jobs_file')
+    jobs_config = load_jobs_config(config)
+    if not jobs_config:
+        display_error_message(
+            'Необходимо указать в jobs_file путь к INI-файлу с заданиями синхронизации в .env файле',
         )
         return
 
+    jobs = []
+    remote_folders = set()
+    for name, job_config in jobs_config.items():
+        if not jobs_file:
+            where = 'в .env файле'
+        elif re.fullmatch(r'[\w.-]+', name):
+            where = 'в секции [{name}] файла {jobs_file}'.format(name=name, jobs_file=jobs_file)
+        else:
+            display_error_message(
+                'Имя задания [{name}] в файле {jobs_file} может содержать только буквы, цифры, '
+                'точки, дефисы и подчёркивания'.format(name=name, jobs_file=jobs_file),
+            )
+            return
+
+        job = read_job(name, job_config, where)
+        if job is None:
+            return
+
+        if (job.oauth_token, job.remote_folder_name) in remote_folders:
+            display_error_message(
+                'Папка remote_folder_name {folder} уже используется другим заданием {where}'.format(
+                    folder=job.remote_folder_name,
+                    where=where,
+                ),
+            )
+            return
+
+        remote_folders.add((job.oauth_token, job.remote_folder_name))
+        jobs.append(job)
+    return jobs
+
+
+def main():
+    config = dotenv_values(".env")
+
+    log_directory = config.get('log_directory')
+    max_concurrent_transfers = get_int_option(config, 'max_concurrent_transfers', 4)
+    metadata_rate_limit = get_int_option(config, 'metadata_rate_limit', 20)
+    transfer_rate_limit = get_int_option(config, 'transfer_rate_limit', 10)
+    upload_bandwidth_limit = get_int_option(config, 'upload_bandwidth_limit', 0)
+    local_scan_workers = get_int_option(config, 'local_scan_workers', 4)
+    metrics_port = get_int_option(config, 'metrics_port', 0)
+    metrics_host = config.get('metrics_host') or '127.0.0.1'
+    metrics_dump_interval = get_int_option(config, 'metrics_dump_interval', 0)
+    profile_directory = config.get('profile_directory')
+    large_file_threshold = get_int_option(config, 'large_file_threshold', 64)
+    transfer_order = config.get('transfer_order') or TransferPriority.ORDER_BY_SIZE
+    priority_patterns = [
+        pattern.strip()
+        for pattern in (config.get('priority_patterns') or '').split(',')
+        if pattern.strip()
+    ]
+
+    jobs = read_jobs(config)
+    if jobs is None:
+        return
+
     if not (log_directory and file_utils.is_abs_path(log_directory)):
         display_error_message(
             'Необходимо указать абсолютный путь log_directory в .env файле',
         )
         return
 
+    if not max_concurrent_transfers or max_concurrent_transfers < 1:
+        display_error_message(
+            'Необходимо указать положительное max_concurrent_transfers в .env файле',
+        )
+        return
+
+    if metadata_rate_limit is None or metadata_rate_limit < 0:
+        display_error_message(
+            'Необходимо указать неотрицательное metadata_rate_limit в .env файле',
+        )
+        return
+
+    if transfer_rate_limit is None or transfer_rate_limit < 0:
+        display_error_message(
+            'Необходимо указать неотрицательное transfer_rate_limit в .env файле',
+        )
+        return
+
+    if upload_bandwidth_limit is None or upload_bandwidth_limit < 0:
+        display_error_message(
+            'Необходимо указать неотрицательное upload_bandwidth_limit в КБ/с в .env файле',
+        )
+        return
+
+    try:
+        bandwidth_schedule = BandwidthLimiter.parse_schedule(
+            config.get('bandwidth_schedule') or '',
+        )
+    except ValueError:
+        display_error_message(
+            'Необходимо указать bandwidth_schedule в формате ЧЧ:ММ-ЧЧ:ММ=КБ/с через запятую в .env файле',
+        )
+        return
+
+    if any(window.rate is not None and window.rate < 0 for window in bandwidth_schedule):
+        display_error_message(
+            'Скорость в bandwidth_schedule не может быть отрицательной',
+        )
+        return
+
+    if large_file_threshold is None or large_file_threshold < 0:
+        display_error_message(
+            'Необходимо указать large_file_threshold в мегабайтах в .env файле',
+        )
+        return
+
+    if transfer_order not in (TransferPriority.ORDER_BY_SIZE, TransferPriority.ORDER_BY_AGE):
+        display_error_message(
+            'Необходимо указать в transfer_order значение size или age в .env файле',
+        )
+        return
+
+    if not local_scan_workers or local_scan_workers < 1:
+        display_error_message(
+            'Необходимо указать положительное local_scan_workers в .env файле',
+        )
+        return
+
+    if metrics_port is None or not 0 <= metrics_port <= 65535:
+        display_error_message(
+            'Необходимо указать в metrics_port номер порта от 0 до 65535 в .env файле',
+        )
+        return
+
+    if metrics_dump_interval is None or metrics_dump_interval < 0:
+        display_error_message(
+            'Необходимо указать неотрицательное metrics_dump_interval в секундах в .env файле',
+        )
+        return
+
+    if profile_directory and not (
+        file_utils.is_abs_path(profile_directory) and
+        file_utils.check_if_exists(profile_directory)
+    ):
+        display_error_message(
+            'Необходимо указать абсолютный путь к существующей директории в profile_directory в .env файле',
+        )
+        return
+
     configure_logger(log_directory)
 
-    ys = YandexSynchronizer(oauth_token, local_folder_path, remote_folder_name)
-    fm = FileMonitor(local_folder_path, int(synchronization_interval), ys)
-    fm.start()
+    metrics = Metrics(profile_directory=profile_directory or None)
+    if metrics_port:
+        try:
+            metrics.start_server(metrics_host, metrics_port)
+        except OSError as e:
+            display_error_message(
+                'Не удалось открыть порт metrics_port для публикации метрик: {error}'.format(error=e),
+            )
+            return
+    if metrics_dump_interval:
+        metrics.start_dump(os.path.join(log_directory, 'metrics.json'), metrics_dump_interval)
+
+    # Планировщик, ограничения скорости и количества операций общие для всех заданий
+    governor = ConcurrencyGovernor(max_concurrent_transfers)
+    bandwidth = None
+    if upload_bandwidth_limit or bandwidth_schedule:
+        bandwidth = BandwidthLimiter(upload_bandwidth_limit * 1024, bandwidth_schedule)
+    scheduler = TransferScheduler(
+        max_concurrent_transfers,
+        governor=governor,
+        bandwidth=bandwidth,
+        metrics=metrics,
+    )
+    priority = TransferPriority(
+        large_file_threshold=large_file_threshold * 1024 * 1024,
+        order=transfer_order,
+        patterns=priority_patterns,
+    )
+    hash_cache = None
+    sessions: Dict[str, HttpSession] = {}
+    monitors: Dict[str, FileMonitor] = {}
+    for job in jobs:
+        state_file = SyncState.FILE_NAME
+        if job.name:
+            state_file = 'sync_state-{name}.sqlite3'.format(name=job.name)
+        state = SyncState(os.path.join(log_directory, state_file))
+        ys = YandexSynchronizer(
+            job.oauth_token,
+            job.local_folder_path,
+            job.remote_folder_name,
+            state=state,
+            resumable_threshold=job.resumable_upload_threshold * 1024 * 1024,
+            max_connections=max_concurrent_transfers,
+            metadata_rate_limit=metadata_rate_limit,
+            transfer_rate_limit=transfer_rate_limit,
+            governor=governor,
+            bandwidth=bandwidth,
+            segment_threshold=job.segmented_upload_threshold * 1024 * 1024,
+            metrics=metrics,
+            session=sessions.get(job.oauth_token),
+        )
+        # Соединения и ограничение частоты запросов общие для заданий с одним токеном
+        sessions.setdefault(job.oauth_token, ys.session)
+
+        if job.compare_mode == FileMonitor.COMPARE_BY_HASH and hash_cache is None:
+            hash_cache = HashCache()
+        monitors[job.name] = FileMonitor(
+            job.local_folder_path,
+            job.synchronization_interval,
+            ys,
+            state=state,
+            listing_interval=job.remote_listing_interval,
+            scheduler=scheduler,
+            compare_mode=job.compare_mode,
+            hash_cache=hash_cache if job.compare_mode == FileMonitor.COMPARE_BY_HASH else None,
+            watch_mode=job.watch_mode,
+            scanner=FileScanner(job.local_folder_path, local_scan_workers),
+            metrics=metrics,
+            priority=priority,
+            direction=job.sync_direction,
+            bundle_threshold=job.bundle_threshold * 1024,
+            bundle_size=job.bundle_size * 1024 * 1024,
+            remote_change_mode=job.remote_change_mode,
+            full_listing_interval=job.remote_full_listing_interval,
+            job_name=job.name,
+        )
+
+    if len(monitors) == 1:
+        next(iter(monitors.values())).start()
+    else:
+        SyncDaemon(monitors).start()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,296 @@
+""" Общая HTTP-сессия с пулом постоянных соединений. """
+import threading
+import time
+from typing import Union
+from urllib.parse import urlsplit
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
+from requests.exceptions import ConnectionError, Timeout
+
+from synchronizer.rate_limiter import ConcurrencyGovernor, TokenBucket
+from synchronizer.retry_policy import CircuitBreaker, RetryPolicy
+from utils.metrics import Metrics
+
+
+class ConnectionStats:
+    """ Вспомогательный класс, содержащий статистику использования соединений. """
+    opened: int
+    requests: int
+
+    def __init__(self, opened: int = 0, requests: int = 0):
+        self.opened = opened
+        self.requests = requests
+
+    @property
+    def reused(self) -> int:
+        """ Количество запросов, выполненных в уже открытых соединениях. """
+        return max(0, self.requests - self.opened)
+
+    @property
+    def reuse_rate(self) -> float:
+        return self.reused / self.requests if self.requests else 0.0
+
+    def __str__(self):
+        return f'{self.opened} connections opened, {self.reused} of {self.requests} requests reused'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class _HostAuth(AuthBase):
+    """ Авторизация, добавляемая только к запросам на указанный хост. """
+
+    def __init__(self, oauth_token: str, host: str):
+        self.oauth_token = oauth_token
+        self.host = host
+
+    def __call__(self, request: requests.PreparedRequest) -> requests.PreparedRequest:
+        if urlsplit(request.url).netloc == self.host:
+            request.headers['Authorization'] = self.oauth_token
+        return request
+
+
+class _CountingAdapter(HTTPAdapter):
+    """ Адаптер, сохраняющий статистику пулов соединений после их вытеснения. """
+
+    def __init__(self, **kwargs):
+        self._lock = threading.Lock()
+        self._disposed = ConnectionStats()
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pools.dispose_func = self._dispose
+
+    def _dispose(self, pool):
+        with self._lock:
+            self._disposed.opened += pool.num_connections
+            self._disposed.requests += pool.num_requests
+        pool.close()
+
+    def get_stats(self) -> ConnectionStats:
+        pools = self.poolmanager.pools
+        with self._lock:
+            stats = ConnectionStats(self._disposed.opened, self._disposed.requests)
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                stats.opened += pool.num_connections
+                stats.requests += pool.num_requests
+        return stats
+
+
+class HttpSession(requests.Session):
+    """
+    Сессия, переиспользующая TCP- и TLS-соединения между запросами.
+
+    Заголовок Authorization добавляется только к запросам на хост API,
+    поэтому токен не передаётся на адреса загрузки и скачивания.
+    Одновременно к одному хосту держится не более pool_size соединений.
+
+    Запросы, завершившиеся ошибкой соединения, таймаутом или кодами
+    429 и 5xx, повторяются по правилам retry_policy. Пока circuit_breaker
+    считает хранилище недоступным, все запросы сессии ожидают.
+
+    Частота запросов к API ограничивается metadata_limiter, а запросов
+    передачи данных - transfer_limiter. Задержка ответов API и ответы 429
+    сообщаются governor, подбирающему количество одновременных операций.
+
+    Длительность и результат каждой попытки, а также повторы учитываются
+    в metrics по методу API; запросы передачи данных учитываются как transfer.
+    """
+    pool_size: int
+    timeout: float
+    retry_policy: RetryPolicy
+    circuit_breaker: CircuitBreaker
+    metadata_limiter: Union[TokenBucket, None]
+    transfer_limiter: Union[TokenBucket, None]
+    governor: Union[ConcurrencyGovernor, None]
+    metrics: Metrics
+
+    def __init__(
+        self,
+        oauth_token: str,
+        api_url: str,
+        pool_size: int = 4,
+        timeout: float = 10,
+        retry_policy: Union[RetryPolicy, None] = None,
+        circuit_breaker: Union[CircuitBreaker, None] = None,
+        metadata_limiter: Union[TokenBucket, None] = None,
+        transfer_limiter: Union[TokenBucket, None] = None,
+        governor: Union[ConcurrencyGovernor, None] = None,
+        metrics: Union[Metrics, None] = None,
+    ):
+        super().__init__()
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.metadata_limiter = metadata_limiter
+        self.transfer_limiter = transfer_limiter
+        self.governor = governor
+        self.metrics = metrics or Metrics()
+        self.api_host = urlsplit(api_url).netloc
+        self.auth = _HostAuth(oauth_token, self.api_host)
+        self._adapter = _CountingAdapter(pool_maxsize=self.pool_size)
+        self.mount('https://', self._adapter)
+        self.mount('http://', self._adapter)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *args,
+        retry: bool = True,
+        deadline: Union[float, None] = None,
+        operation: Union[str, None] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Выполнить запрос, повторяя его при временных ошибках.
+
+        Передаваемые данные с методом rewind, например FileReader,
+        перед повторной попыткой читаются заново.
+
+        Args:
+            method (str): HTTP-метод.
+            url (str): адрес.
+            retry (bool): повторять ли запрос. Без повторов запрос всё равно
+                          ожидает восстановления связи с хранилищем.
+            deadline (float): время на все попытки в секундах, по умолчанию
+                              retry_policy.deadline.
+            operation (str): вид запроса, задержка которого сравнивается governor
+                             с задержкой запросов того же вида. По умолчанию -
+                             HTTP-метод и метод API.
+            **kwargs: аргументы requests.Session.request.
+        Returns:
+            requests.Response: ответ последней попытки.
+        Raises:
+            ConnectionError, Timeout: если последняя попытка не получила ответа.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        attempts = self.retry_policy.attempts if retry else 1
+        deadline_at = time.monotonic() + (
+            self.retry_policy.deadline if deadline is None else deadline
+        )
+
+        is_api_request = urlsplit(url).netloc == self.api_host
+        limiter = self.metadata_limiter if is_api_request else self.transfer_limiter
+        endpoint = self._get_endpoint(url) if is_api_request else 'transfer'
+        operation = operation or '{method} {endpoint}'.format(method=method.upper(), endpoint=endpoint)
+
+        attempt = 0
+        while True:
+            deadline_at += self.circuit_breaker.wait()
+            if limiter is not None:
+                deadline_at += limiter.acquire()
+            if attempt:
+                data = kwargs.get('data')
+                if hasattr(data, 'rewind'):
+                    data.rewind()
+
+            retry_after = None
+            started_at = time.monotonic()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                self.circuit_breaker.record_failure()
+                reason = e.__class__.__name__
+                self._record(method, endpoint, started_at, reason)
+                if not self._should_retry(attempt, attempts, deadline_at, None):
+                    raise
+            except Exception:
+                self.circuit_breaker.release()
+                raise
+            else:
+                self._record(method, endpoint, started_at, str(response.status_code))
+                if self.governor is not None:
+                    # Длительность передачи файла зависит от его размера,
+                    # поэтому о нагрузке судим по задержке запросов к API
+                    self.governor.record(
+                        time.monotonic() - started_at if is_api_request else None,
+                        throttled=response.status_code == 429,
+                        kind=operation,
+                    )
+                if response.status_code not in self.retry_policy.RETRY_STATUSES:
+                    self.circuit_breaker.record_success()
+                    return response
+
+                if response.status_code != 429:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+                reason = str(response.status_code)
+                retry_after = self.retry_policy.parse_retry_after(
+                    response.headers.get('Retry-After'),
+                )
+                if not self._should_retry(attempt, attempts, deadline_at, retry_after):
+                    return response
+                response.close()
+
+            delay = min(
+                self.retry_policy.get_delay(attempt, retry_after),
+                max(0.0, deadline_at - time.monotonic()),
+            )
+            self.metrics.increment('retries_total', endpoint=endpoint, reason=reason)
+            logger.warning(
+                'Запрос {method} {url} не выполнен ({reason}), повтор через {delay:.1f} с.'.format(
+                    method=method.upper(),
+                    url=urlsplit(url).path,
+                    reason='код ' + reason if reason.isdigit() else reason,
+                    delay=delay,
+                ),
+            )
+            time.sleep(delay)
+            attempt += 1
+
+    def _record(self, method: str, endpoint: str, started_at: float, status: str):
+        """ Учесть длительность и результат попытки запроса. """
+        self.metrics.observe(
+            'api_request_seconds',
+            time.monotonic() - started_at,
+            method=method.upper(),
+            endpoint=endpoint,
+        )
+        self.metrics.increment(
+            'api_requests_total',
+            method=method.upper(),
+            endpoint=endpoint,
+            status=status,
+        )
+
+    @staticmethod
+    def _get_endpoint(url: str) -> str:
+        """ Получить метод API по адресу запроса, без идентификаторов операций. """
+        parts = [part for part in urlsplit(url).path.split('/') if part]
+        if parts[:2] == ['v1', 'disk']:
+            parts = parts[2:]
+        if parts[:1] == ['operations']:
+            parts = parts[:1]
+        return '/' + '/'.join(parts)
+
+    def _should_retry(
+        self,
+        attempt: int,
+        attempts: int,
+        deadline_at: float,
+        retry_after: Union[float, None],
+    ) -> bool:
+        """ Проверить, остались ли попытки и время на повтор запроса. """
+        if attempt + 1 >= attempts:
+            return False
+
+        remaining = deadline_at - time.monotonic()
+        return remaining > 0 and (retry_after is None or retry_after <= remaining)
+
+    def get_stats(self) -> ConnectionStats:
+        """
+        Получить статистику соединений.
+
+        Returns:
+            ConnectionStats: количество открытых соединений и выполненных запросов.
+        """
+        return self._adapter.get_stats()
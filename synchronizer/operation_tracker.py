@@ -0,0 +1,146 @@
+""" Отслеживание операций, которые удалённое хранилище выполняет асинхронно. """
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List
+
+from loguru import logger
+from requests.exceptions import ConnectionError, Timeout
+
+from synchronizer.http_session import HttpSession
+
+
+class _Operation:
+    """ Операция, ожидающая подтверждения. """
+
+    def __init__(self, href: str, description: str, interval: float, started_at: float):
+        self.href = href
+        self.description = description
+        self.interval = interval
+        self.started_at = started_at
+        self.poll_at = started_at + interval
+        self.future = Future()
+
+
+class OperationTracker:
+    """
+    Класс, опрашивающий статус асинхронных операций в фоновом потоке.
+
+    За один проход опрашиваются все операции, время проверки которых
+    наступило. Интервал опроса каждой операции удваивается от poll_interval
+    до max_poll_interval секунд. Операция, не завершившаяся за timeout
+    секунд, считается неудавшейся.
+    """
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILED = 'failed'
+
+    poll_interval: float
+    max_poll_interval: float
+    timeout: float
+
+    def __init__(
+        self,
+        session: HttpSession,
+        poll_interval: float = 0.5,
+        max_poll_interval: float = 10.0,
+        timeout: float = 3600.0,
+    ):
+        self.session = session
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._operations: Dict[str, _Operation] = {}
+        self._thread = None
+
+    @property
+    def pending_count(self) -> int:
+        """ Количество операций, ожидающих подтверждения. """
+        with self._condition:
+            return len(self._operations)
+
+    def track(self, href: str, description: str) -> Future:
+        """
+        Начать отслеживание операции.
+
+        Args:
+            href (str): ссылка на статус операции.
+            description (str): описание операции для журнала.
+        Returns:
+            Future: True, если операция выполнена успешно, иначе False.
+        """
+        with self._condition:
+            operation = self._operations.get(href)
+            if operation is None:
+                operation = _Operation(href, description, self.poll_interval, time.monotonic())
+                self._operations[href] = operation
+                self._start()
+                self._condition.notify()
+            return operation.future
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, daemon=True)
+            self._thread.start()
+
+    def _work(self):
+        while True:
+            for operation in self._get_due_operations():
+                self._poll(operation)
+
+    def _get_due_operations(self) -> List[_Operation]:
+        """ Дождаться операций, которые пора проверить. """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                due = [
+                    operation for operation in self._operations.values()
+                    if operation.poll_at <= now
+                ]
+                if due:
+                    return due
+
+                next_poll_at = min(
+                    (operation.poll_at for operation in self._operations.values()),
+                    default=None,
+                )
+                self._condition.wait(None if next_poll_at is None else next_poll_at - now)
+
+    def _poll(self, operation: _Operation):
+        """ Проверить статус операции и завершить её, если статус окончательный. """
+        status = None
+        try:
+            response = self.session.get(operation.href)
+            if response.status_code == 200:
+                status = response.json().get('status')
+            elif response.status_code == 404:
+                status = self.STATUS_FAILED
+        except (ConnectionError, Timeout, ValueError):
+            pass
+
+        if status == self.STATUS_SUCCESS:
+            self._finish(operation, True)
+        elif status == self.STATUS_FAILED:
+            logger.error(
+                '{description}: хранилище сообщило о неудачном завершении операции.'.format(
+                    description=operation.description,
+                ),
+            )
+            self._finish(operation, False)
+        elif time.monotonic() - operation.started_at > self.timeout:
+            logger.error(
+                '{description}: операция не завершилась за {timeout:.0f} с.'.format(
+                    description=operation.description,
+                    timeout=self.timeout,
+                ),
+            )
+            self._finish(operation, False)
+        else:
+            with self._condition:
+                operation.interval = min(operation.interval * 2, self.max_poll_interval)
+                operation.poll_at = time.monotonic() + operation.interval
+
+    def _finish(self, operation: _Operation, success: bool):
+        with self._condition:
+            self._operations.pop(operation.href, None)
+        operation.future.set_result(success)
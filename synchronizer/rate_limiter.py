@@ -0,0 +1,150 @@
+""" Ограничение частоты запросов и подбор количества одновременных операций. """
+import threading
+import time
+from typing import Dict, Union
+
+from loguru import logger
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов по алгоритму token bucket.
+
+    Запас пополняется на rate запросов в секунду и не превышает burst,
+    поэтому после простоя можно сразу выполнить burst запросов.
+    """
+    rate: float
+    burst: float
+
+    def __init__(self, rate: float, burst: Union[float, None] = None):
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Дождаться разрешения на запрос.
+
+        Args:
+            tokens (float): стоимость запроса.
+        Returns:
+            float: время ожидания в секундах.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+
+class ConcurrencyGovernor:
+    """
+    Подбор количества одновременных операций по принципу AIMD.
+
+    Пока хранилище отвечает быстро, лимит растёт на единицу за каждые
+    limit успешных запросов. При ответе 429 или росте задержки более чем
+    в latency_tolerance раз от наименьшей наблюдавшейся лимит уменьшается
+    вдвое. Задержка отслеживается отдельно для каждого вида запросов:
+    страница списка файлов всегда отвечает дольше запроса метаданных
+    и не должна считаться признаком перегрузки. Лимит меняется не чаще
+    раза в cooldown секунд, чтобы ответы на запросы, отправленные
+    до изменения, не влияли на новый лимит.
+    """
+    min_limit: int
+    max_limit: int
+    latency_tolerance: float
+    cooldown: float
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        latency_tolerance: float = 3.0,
+        cooldown: float = 2.0,
+    ):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._limit = self.max_limit
+        self._successes = 0
+        self._latency: Dict[str, float] = {}
+        self._best_latency: Dict[str, float] = {}
+        self._changed_at = 0.0
+
+    @property
+    def limit(self) -> int:
+        """ Текущее допустимое количество одновременных операций. """
+        return self._limit
+
+    def record(self, latency: Union[float, None], throttled: bool = False, kind: str = ''):
+        """
+        Учесть результат запроса.
+
+        Args:
+            latency (float): длительность запроса в секундах, если её стоит учитывать.
+            throttled (bool): хранилище ответило 429.
+            kind (str): вид запроса, задержка которого сравнивается
+                        только с задержкой запросов того же вида.
+        """
+        with self._lock:
+            overloaded = throttled or self._is_slow(latency, kind)
+            if overloaded:
+                self._decrease()
+                return
+
+            self._successes += 1
+            if (
+                self._successes >= self._limit and
+                self._limit < self.max_limit and
+                time.monotonic() - self._changed_at >= self.cooldown
+            ):
+                self._successes = 0
+                self._change_limit(self._limit + 1)
+
+    def _is_slow(self, latency: Union[float, None], kind: str) -> bool:
+        if latency is None:
+            return False
+
+        average = self._latency.get(kind)
+        average = latency if average is None else 0.8 * average + 0.2 * latency
+        self._latency[kind] = average
+        best = self._best_latency.get(kind)
+        if best is None or average < best:
+            best = self._best_latency[kind] = average
+        return average > best * self.latency_tolerance
+
+    def _decrease(self):
+        if time.monotonic() - self._changed_at < self.cooldown:
+            return
+
+        self._successes = 0
+        # Задержка после уменьшения лимита сравнивается с новым уровнем
+        self._best_latency = dict(self._latency)
+        self._change_limit(max(self.min_limit, self._limit // 2))
+
+    def _change_limit(self, limit: int):
+        if limit == self._limit:
+            return
+
+        # Уменьшение лимита означает перегрузку хранилища, а рост - штатный подбор
+        log = logger.info if limit < self._limit else logger.debug
+        log(
+            'Количество одновременных операций изменено с {old} на {new}.'.format(
+                old=self._limit,
+                new=limit,
+            ),
+        )
+        self._changed_at = time.monotonic()
+        self._limit = limit
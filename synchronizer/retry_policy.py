@@ -0,0 +1,164 @@
+""" Повторение неудачных запросов и приостановка работы при недоступности хранилища. """
+import datetime
+import email.utils
+import random
+import threading
+import time
+from typing import Union
+
+from loguru import logger
+
+
+class RetryPolicy:
+    """
+    Правила повторения запросов.
+
+    Паузы между попытками растут экспоненциально от backoff до max_backoff
+    секунд со случайным разбросом, чтобы параллельные запросы не повторялись
+    одновременно. Запрос не повторяется дольше deadline секунд с первой попытки.
+    """
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    attempts: int
+    backoff: float
+    max_backoff: float
+    deadline: float
+
+    def __init__(
+        self,
+        attempts: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        deadline: float = 120.0,
+    ):
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+
+    def get_delay(self, attempt: int, retry_after: Union[float, None] = None) -> float:
+        """
+        Получить паузу перед повторной попыткой.
+
+        Args:
+            attempt (int): номер неудавшейся попытки, начиная с 0.
+            retry_after (float): пауза, запрошенная сервером в заголовке Retry-After.
+        Returns:
+            float: пауза в секундах.
+        """
+        if retry_after is not None:
+            return retry_after
+
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    @staticmethod
+    def parse_retry_after(value: Union[str, None]) -> Union[float, None]:
+        """
+        Разобрать заголовок Retry-After.
+
+        Args:
+            value (str): количество секунд или дата в формате HTTP.
+        Returns:
+            float: пауза в секундах. Или None, если заголовка нет или он некорректен.
+        """
+        if not value:
+            return
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return
+
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return max(0.0, (retry_at - now).total_seconds())
+
+
+class CircuitBreaker:
+    """
+    Автомат, приостанавливающий запросы при недоступности хранилища.
+
+    После threshold неудачных запросов подряд новые запросы ожидают
+    cooldown секунд, затем выполняется один пробный запрос. Если он тоже
+    неудачен, пауза удваивается, но не превышает max_cooldown секунд.
+    """
+    threshold: int
+    cooldown: float
+    max_cooldown: float
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 300.0):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._condition = threading.Condition()
+        self._failures = 0
+        self._current_cooldown = cooldown
+        self._opened_until = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        with self._condition:
+            return self._opened_until is not None
+
+    def wait(self) -> float:
+        """
+        Дождаться разрешения на выполнение запроса.
+
+        Returns:
+            float: время ожидания в секундах.
+        """
+        started_at = time.monotonic()
+        with self._condition:
+            while self._opened_until is not None:
+                remaining = self._opened_until - time.monotonic()
+                if remaining <= 0 and not self._probing:
+                    self._probing = True
+                    break
+                self._condition.wait(remaining if remaining > 0 else None)
+        return time.monotonic() - started_at
+
+    def record_success(self):
+        """ Учесть запрос, на который хранилище ответило. """
+        with self._condition:
+            if self._opened_until is not None:
+                logger.info('Связь с удалённым хранилищем восстановлена, работа продолжается.')
+            self._failures = 0
+            self._current_cooldown = self.cooldown
+            self._opened_until = None
+            self._probing = False
+            self._condition.notify_all()
+
+    def record_failure(self):
+        """ Учесть запрос, не выполненный из-за недоступности хранилища. """
+        with self._condition:
+            self._failures += 1
+            if self._probing:
+                self._probing = False
+                self._current_cooldown = min(self._current_cooldown * 2, self.max_cooldown)
+                self._open()
+            elif self._opened_until is None and self._failures >= self.threshold:
+                self._open()
+
+    def release(self):
+        """ Завершить пробный запрос, не давший результата, например из-за ошибки чтения файла. """
+        with self._condition:
+            if self._probing:
+                self._probing = False
+                self._condition.notify_all()
+
+    def _open(self):
+        self._opened_until = time.monotonic() + self._current_cooldown
+        logger.warning(
+            'Удалённое хранилище недоступно, запросы приостановлены на {cooldown:.0f} с.'.format(
+                cooldown=self._current_cooldown,
+            ),
+        )
+        self._condition.notify_all()
@@ -1,11 +1,24 @@
+import datetime
 from abc import ABC
-from typing import Dict
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Union
 
 
+from synchronizer.http_session import ConnectionStats
 from utils.file_utils import FileInfo
 
+
+class SynchronizationError(Exception):
+    """ Ошибка взаимодействия с удалённым хранилищем. """
+
+
 class Synchronizer(ABC):
-    """ Базовый класс-синхронизатор файлов в удалённом хранилище. """
+    """
+    Базовый класс-синхронизатор файлов в удалённом хранилище.
+
+    Операции с файлами возвращают признак успеха. Если хранилище выполняет
+    операцию асинхронно, вместо него возвращается Future с этим признаком.
+    """
     oauth_token: str
     local_folder_path: str
     remote_folder_name: str
@@ -20,14 +33,56 @@ class Synchronizer(ABC):
         self.local_folder_path = local_folder_path
         self.remote_folder_name = remote_folder_name
 
-    def upload(self, path: str):
+    def upload(self, path: str) -> Union[bool, Future]:
         """ Загрузить файл в хранилище. """
 
-    def update(self, path: str):
+    def update(self, path: str) -> Union[bool, Future]:
         """ Обновить файл в хранилище. """
 
-    def delete(self, filename: str):
+    def upload_bundle(self, paths: List[str], replaced: Union[List[str], None] = None) -> Union[bool, Future]:
+        """ Загрузить несколько файлов одним архивом. """
+
+    def delete(self, filename: str) -> Union[bool, Future]:
         """ Удалить файл из хранилища. """
 
+    def copy(self, source_filename: str, filename: str) -> Union[bool, Future]:
+        """ Скопировать файл внутри хранилища. """
+
+    def move(self, source_filename: str, filename: str) -> Union[bool, Future]:
+        """ Переместить файл внутри хранилища. """
+
+    def download(
+        self,
+        filename: str,
+        modified_at: Union[datetime.datetime, None] = None,
+        replaced: Union[FileInfo, None] = None,
+    ) -> Union[bool, Future]:
+        """ Скачать файл из хранилища в локальную директорию, если локальный файл не изменился. """
+
+    def create_remote_folder(self, name: Union[str, None] = None) -> bool:
+        """ Создать папку в хранилище. """
+
+    def get_connection_stats(self) -> Union[ConnectionStats, None]:
+        """ Получить статистику использования соединений, если она ведётся. """
+
     def get_info(self) -> Dict[str, FileInfo]:
         """ Получить информации о файлах в хранилище. """
+
+    def iter_info(self) -> Iterator[FileInfo]:
+        """
+        Получать информацию о файлах в хранилище по мере её загрузки.
+
+        Raises:
+            SynchronizationError: если получить информацию не удалось.
+        """
+
+    def get_changes(self, since: datetime.datetime) -> Union[List[FileInfo], None]:
+        """
+        Получить файлы, загруженные в хранилище после указанного момента.
+
+        Returns:
+            List[FileInfo]: загруженные файлы. Или None, если хранилище не может
+                            перечислить все изменения и нужен полный список файлов.
+        Raises:
+            SynchronizationError: если получить информацию не удалось.
+        """
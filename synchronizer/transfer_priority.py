@@ -0,0 +1,48 @@
+""" Правила распределения передач файлов по очередям планировщика. """
+import fnmatch
+from typing import List, Union
+
+from synchronizer.transfer_scheduler import TransferScheduler
+from utils.file_utils import FileInfo
+
+
+class TransferPriority:
+    """
+    Класс, определяющий очередь и порядок передачи файла.
+
+    Файлы от large_file_threshold байт передаются в очереди крупных файлов,
+    остальные - в очереди мелких. Внутри очереди первыми передаются файлы,
+    имена которых подходят под один из шаблонов patterns (например *.docx),
+    затем остальные: при order='size' - от меньших к большим,
+    при order='age' - от недавно изменённых к давно изменённым.
+    """
+    ORDER_BY_SIZE = 'size'
+    ORDER_BY_AGE = 'age'
+
+    large_file_threshold: int
+    order: str
+    patterns: List[str]
+
+    def __init__(
+        self,
+        large_file_threshold: int = 64 * 1024 * 1024,
+        order: str = ORDER_BY_SIZE,
+        patterns: Union[List[str], None] = None,
+    ):
+        self.large_file_threshold = large_file_threshold
+        self.order = order
+        self.patterns = patterns or []
+
+    def get_lane(self, file: FileInfo) -> str:
+        """ Получить очередь передачи файла. """
+        if file.size >= self.large_file_threshold:
+            return TransferScheduler.LANE_LARGE
+        return TransferScheduler.LANE_SMALL
+
+    def get_rank(self, file: FileInfo) -> tuple:
+        """ Получить порядок передачи файла внутри очереди, меньшие значения передаются раньше. """
+        base_name = file.name.rsplit('/', 1)[-1]
+        preferred = any(fnmatch.fnmatch(base_name, pattern) for pattern in self.patterns)
+        if self.order == self.ORDER_BY_AGE:
+            return 0 if preferred else 1, -file.modified_at.timestamp()
+        return 0 if preferred else 1, file.size
@@ -0,0 +1,404 @@
+""" Параллельное выполнение операций с файлами в удалённом хранилище. """
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, Set, Tuple, Union
+
+from loguru import logger
+
+from synchronizer.rate_limiter import ConcurrencyGovernor
+from utils.bandwidth_limiter import BandwidthLimiter
+from utils.metrics import Metrics
+
+
+class TransferStats:
+    """ Вспомогательный класс, содержащий итоги выполнения группы операций. """
+    operations: int
+    failed: int
+    bytes: int
+    bytes_saved: int
+    elapsed: float
+
+    def __init__(self):
+        self.operations = 0
+        self.failed = 0
+        self.bytes = 0
+        self.bytes_saved = 0
+        self.elapsed = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.operations / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes / self.elapsed / 2 ** 20 if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f'{self.operations} operations, {self.failed} failed, '
+            f'{self.bytes} bytes in {self.elapsed:.1f} s'
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class _Transfer:
+    """ Операция, ожидающая выполнения. """
+
+    def __init__(
+        self,
+        batch: 'TransferBatch',
+        key: str,
+        operation: Callable[..., bool],
+        args: tuple,
+        size: int,
+        lane: str,
+        rank: tuple,
+        counted: bool = True,
+    ):
+        self.batch = batch
+        self.key = key
+        self.operation = operation
+        self.args = args
+        self.size = size
+        self.lane = lane
+        self.rank = rank
+        self.counted = counted
+
+
+class TransferBatch:
+    """
+    Группа операций, выполнение которых нужно дождаться, например цикл синхронизации.
+
+    Ключи операций группы дополняются префиксом prefix, поэтому группы
+    разных заданий синхронизации, использующих общий планировщик,
+    не упорядочивают операции друг друга.
+    """
+
+    def __init__(self, scheduler: 'TransferScheduler', prefix: str = ''):
+        self._scheduler = scheduler
+        self.prefix = prefix
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._started_at = time.monotonic()
+        self.stats = TransferStats()
+
+    def submit(
+        self,
+        key: str,
+        operation: Callable[..., bool],
+        *args,
+        size: int = 0,
+        lane: Union[str, None] = None,
+        rank: tuple = (),
+        counted: bool = True,
+    ):
+        """
+        Поставить операцию в очередь.
+
+        Операции с одинаковым ключом выполняются строго в порядке постановки.
+
+        Args:
+            key (str): ключ упорядочивания, например имя файла.
+            operation (Callable[..., bool]): операция, возвращающая признак успеха
+                                             или Future с ним.
+            *args: аргументы операции.
+            size (int): объём передаваемых данных в байтах.
+            lane (str): очередь операции, одна из TransferScheduler.LANES,
+                        по умолчанию - очередь мелких файлов.
+            rank (tuple): порядок внутри очереди, меньшие значения выполняются раньше.
+            counted (bool): учитывать ли операцию в итогах группы. Не учитываются,
+                            например, обработчики результата уже учтённой операции.
+        """
+        with self._condition:
+            self._pending += 1
+        self._scheduler.enqueue(
+            _Transfer(self, self.prefix + key, operation, args, size, lane, rank, counted),
+        )
+
+    def add_saved(self, size: int):
+        """ Учесть объём данных, который не пришлось передавать. """
+        with self._condition:
+            self.stats.bytes_saved += size
+        self._scheduler.metrics.increment('saved_bytes_total', size)
+
+    def after(self, future: Future, callback: Callable[[Future], None]):
+        """
+        Выполнить callback по готовности future.
+
+        Группа не считается выполненной, пока callback не завершится,
+        поэтому из него можно ставить в очередь новые операции.
+
+        Args:
+            future (Future): ожидаемый результат, например контрольная сумма.
+            callback (Callable[[Future], None]): обработчик результата.
+        """
+        with self._condition:
+            self._pending += 1
+
+        def done(result: Future):
+            try:
+                callback(result)
+            except Exception:
+                logger.exception('Непредвиденная ошибка при обработке результата.')
+            finally:
+                with self._condition:
+                    self._pending -= 1
+                    self._condition.notify_all()
+
+        future.add_done_callback(done)
+
+    @property
+    def pending(self) -> int:
+        """ Количество невыполненных операций группы. """
+        with self._condition:
+            return self._pending
+
+    def wait(self) -> TransferStats:
+        """
+        Дождаться выполнения всех операций группы.
+
+        Returns:
+            TransferStats: итоги выполнения.
+        """
+        with self._condition:
+            while self._pending:
+                self._condition.wait()
+            self.stats.elapsed = time.monotonic() - self._started_at
+        return self.stats
+
+    def _complete(self, transfer: _Transfer, success: bool):
+        with self._condition:
+            if transfer.counted:
+                self.stats.operations += 1
+                if success:
+                    self.stats.bytes += transfer.size
+                else:
+                    self.stats.failed += 1
+            self._pending -= 1
+            self._condition.notify_all()
+
+
+class TransferScheduler:
+    """
+    Планировщик, выполняющий операции в пуле потоков.
+
+    Количество одновременно выполняемых операций ограничено max_workers,
+    а если задан governor - его текущим лимитом.
+    Операции с одним ключом не выполняются параллельно: следующая
+    запускается только после завершения предыдущей. Операция может вернуть
+    Future - тогда она считается завершённой, когда Future будет выполнен,
+    но поток освобождается сразу.
+
+    Операции распределяются по очередям: мелкие файлы и служебные операции,
+    крупные файлы и удаления. Очереди обслуживаются по очереди пропорционально
+    их весам, а крупные файлы никогда не занимают последние reserved_workers
+    потоков, поэтому мелкие файлы не ждут окончания долгих передач.
+
+    Пока bandwidth приостанавливает передачу данных, запускаются только
+    операции без передачи данных (size=0): удаления, перемещения и другие.
+
+    В metrics учитываются выполненные операции и переданные байты по очередям,
+    а также длина очередей и количество выполняемых операций.
+    """
+    GOVERNOR_POLL_INTERVAL = 0.5
+
+    LANE_SMALL = 'small'
+    LANE_LARGE = 'large'
+    LANE_DELETE = 'delete'
+    LANES = (LANE_SMALL, LANE_LARGE, LANE_DELETE)
+    LANE_WEIGHTS = {LANE_SMALL: 4, LANE_LARGE: 1, LANE_DELETE: 1}
+
+    max_workers: int
+    reserved_workers: int
+    governor: Union[ConcurrencyGovernor, None]
+    lane_weights: Dict[str, float]
+    bandwidth: Union[BandwidthLimiter, None]
+    metrics: Metrics
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        governor: Union[ConcurrencyGovernor, None] = None,
+        reserved_workers: Union[int, None] = None,
+        lane_weights: Union[Dict[str, float], None] = None,
+        bandwidth: Union[BandwidthLimiter, None] = None,
+        metrics: Union[Metrics, None] = None,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.governor = governor
+        self.bandwidth = bandwidth
+        self.metrics = metrics or Metrics()
+        self.metrics.add_collector(self._collect_metrics)
+        if reserved_workers is None:
+            reserved_workers = max(1, self.max_workers // 4)
+        self.reserved_workers = reserved_workers
+        self.lane_weights = dict(self.LANE_WEIGHTS, **(lane_weights or {}))
+        self._condition = threading.Condition()
+        self._active = 0
+        self._active_large = 0
+        self._sequence = itertools.count()
+        self._ready: Dict[str, List[Tuple[tuple, int, _Transfer]]] = {
+            lane: [] for lane in self.LANES
+        }
+        self._served = {lane: 0.0 for lane in self.LANES}
+        self._waiting: Dict[str, Deque[_Transfer]] = {}
+        self._workers: List[threading.Thread] = []
+        self._local = threading.local()
+
+    def batch(self, prefix: str = '') -> TransferBatch:
+        """ Создать новую группу операций с префиксом ключей prefix. """
+        return TransferBatch(self, prefix)
+
+    def enqueue(self, transfer: _Transfer):
+        """ Поставить операцию в очередь с учётом порядка по ключу. """
+        with self._condition:
+            self._start_workers()
+            if transfer.key in self._waiting:
+                self._waiting[transfer.key].append(transfer)
+                return
+
+            self._waiting[transfer.key] = deque()
+            self._push(transfer)
+            self._condition.notify_all()
+
+    def get_pending_keys(self, prefix: str = '') -> Set[str]:
+        """ Получить ключи незавершённых операций с префиксом prefix, без этого префикса. """
+        with self._condition:
+            return {key[len(prefix):] for key in self._waiting if key.startswith(prefix)}
+
+    def get_current_batch(self) -> Union[TransferBatch, None]:
+        """ Получить группу операции, выполняемой в текущем потоке. """
+        return getattr(self._local, 'batch', None)
+
+    def get_queue_sizes(self) -> Dict[str, int]:
+        """ Получить количество операций, готовых к выполнению, в каждой очереди. """
+        with self._condition:
+            return {lane: len(ready) for lane, ready in self._ready.items()}
+
+    def _push(self, transfer: _Transfer):
+        if transfer.lane not in self._ready:
+            transfer.lane = self.LANE_SMALL
+        ready = self._ready[transfer.lane]
+        if not ready:
+            # Простаивавшая очередь не получает преимущества за время простоя
+            busy = [self._served[lane] for lane in self.LANES if self._ready[lane]]
+            if busy:
+                self._served[transfer.lane] = max(self._served[transfer.lane], min(busy))
+        heapq.heappush(ready, (transfer.rank, next(self._sequence), transfer))
+
+    def _pop(self) -> Union[_Transfer, None]:
+        """ Выбрать операцию из очереди, обслуженной меньше других с учётом веса. """
+        limit = self._get_limit()
+        if self._active >= limit:
+            return
+
+        lanes = [lane for lane in self.LANES if self._ready[lane]]
+        if self._active_large >= max(1, limit - self.reserved_workers):
+            lanes = [lane for lane in lanes if lane != self.LANE_LARGE]
+        if self.bandwidth is not None and self.bandwidth.is_paused():
+            # Операции без передачи данных стоят в начале очередей
+            lanes = [lane for lane in lanes if not self._ready[lane][0][2].size]
+        if not lanes:
+            return
+
+        lane = min(lanes, key=lambda name: self._served[name])
+        self._served[lane] += 1 / self.lane_weights.get(lane, 1)
+        _, _, transfer = heapq.heappop(self._ready[lane])
+        return transfer
+
+    def _start_workers(self):
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._work,
+                name='transfer-{index}'.format(index=len(self._workers)),
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            with self._condition:
+                transfer = self._pop()
+                while transfer is None:
+                    # Лимит governor может вырасти без уведомления планировщика
+                    has_ready = any(self._ready.values())
+                    self._condition.wait(self.GOVERNOR_POLL_INTERVAL if has_ready else None)
+                    transfer = self._pop()
+                self._active += 1
+                if transfer.lane == self.LANE_LARGE:
+                    self._active_large += 1
+
+            self._local.batch = transfer.batch
+            try:
+                result = transfer.operation(*transfer.args)
+            except Exception:
+                logger.exception(
+                    'Непредвиденная ошибка при обработке файла {file}.'.format(
+                        file=transfer.key,
+                    ),
+                )
+                result = False
+            finally:
+                self._local.batch = None
+
+            with self._condition:
+                self._active -= 1
+                if transfer.lane == self.LANE_LARGE:
+                    self._active_large -= 1
+                self._condition.notify_all()
+
+            if isinstance(result, Future):
+                # Поток освобождается, а ключ остаётся занятым до подтверждения операции
+                result.add_done_callback(
+                    lambda future, transfer=transfer: self._finish(
+                        transfer,
+                        future.exception() is None and bool(future.result()),
+                    ),
+                )
+            else:
+                self._finish(transfer, bool(result))
+
+    def _finish(self, transfer: _Transfer, success: bool):
+        self._release(transfer)
+        if not transfer.counted:
+            transfer.batch._complete(transfer, success)
+            return
+
+        self.metrics.increment(
+            'transfers_total',
+            lane=transfer.lane,
+            result='success' if success else 'failure',
+        )
+        if success and transfer.size:
+            self.metrics.increment('transferred_bytes_total', transfer.size, lane=transfer.lane)
+        transfer.batch._complete(transfer, success)
+
+    def _release(self, transfer: _Transfer):
+        """ Запустить следующую операцию с тем же ключом, если она есть. """
+        with self._condition:
+            waiting = self._waiting[transfer.key]
+            if waiting:
+                self._push(waiting.popleft())
+                self._condition.notify_all()
+            else:
+                del self._waiting[transfer.key]
+
+    def _collect_metrics(self, metrics: Metrics):
+        """ Сообщить длину очередей и количество выполняемых операций. """
+        for lane, size in self.get_queue_sizes().items():
+            metrics.set_gauge('queue_depth', size, lane=lane)
+        with self._condition:
+            metrics.set_gauge('active_transfers', self._active)
+            metrics.set_gauge('concurrency_limit', self._get_limit())
+
+    def _get_limit(self) -> int:
+        if self.governor is None:
+            return self.max_workers
+        return min(self.max_workers, self.governor.limit)
@@ -1,18 +1,38 @@
 import datetime
-from typing import Dict, Union
+import hashlib
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterator, List, Union
 
 import requests
-from requests.exceptions import ConnectionError, Timeout
+from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
 from loguru import logger
 
 from utils import file_utils
-from synchronizer.synchronizer import Synchronizer
+from synchronizer.http_session import ConnectionStats, HttpSession
+from synchronizer.operation_tracker import OperationTracker
+from synchronizer.rate_limiter import ConcurrencyGovernor, TokenBucket
+from synchronizer.synchronizer import SynchronizationError, Synchronizer
+from utils.bandwidth_limiter import BandwidthLimiter
+from utils.metrics import Metrics
+from utils.sync_state import BundledFile, FileSegment, SyncState, UploadCheckpoint
 
 
 class YandexSynchronizer(Synchronizer):
     """ Класс, отвечающий за синхронизацию с Яндекс Диском. """
     BASE_URL = 'https://cloud-api.yandex.net/v1/disk/resources'
-    BASE_ARGS = '?path=app:/'
+    INFO_FIELDS = ('name', 'path', 'type', 'modified', 'size', 'md5', 'sha256')
+    SEGMENTS_FOLDER = '.yadisk-segments'
+    BUNDLES_FOLDER = '.yadisk-bundles'
+    MANIFEST_NAME = 'manifest.json'
 
     def __init__(
         self,
@@ -20,134 +40,991 @@ class YandexSynchronizer(Synchronizer):
         local_folder_path: str,
         remote_folder_name: str,
         timeout: int = 10,
+        upload_timeout: int = 60,
+        page_size: int = 1000,
+        chunk_size: int = file_utils.FileReader.CHUNK_SIZE,
+        state: Union[SyncState, None] = None,
+        resumable_threshold: int = 64 * 1024 * 1024,
+        resumable_chunk_size: int = 16 * 1024 * 1024,
+        listing_workers: int = 4,
+        max_connections: int = 4,
+        metadata_rate_limit: float = 0,
+        transfer_rate_limit: float = 0,
+        governor: Union[ConcurrencyGovernor, None] = None,
+        bandwidth: Union[BandwidthLimiter, None] = None,
+        segment_threshold: int = 0,
+        segment_size: int = 64 * 1024 * 1024,
+        metrics: Union[Metrics, None] = None,
+        session: Union[HttpSession, None] = None,
     ):
         super().__init__(oauth_token, local_folder_path, remote_folder_name)
         self.timeout = timeout
+        self.upload_timeout = upload_timeout
+        self.page_size = page_size
+        self.chunk_size = chunk_size
+        self.state = state
+        self.resumable_threshold = resumable_threshold
+        self.resumable_chunk_size = resumable_chunk_size
+        self.listing_workers = listing_workers
+        self.bandwidth = bandwidth
+        self.segment_threshold = segment_threshold
+        self.segment_size = segment_size
+        # Соединения нужны и передачам файлов, и параллельному получению списка файлов.
+        # Синхронизаторы папок с одним токеном могут использовать общую сессию
+        self.session = session or HttpSession(
+            oauth_token,
+            self.BASE_URL,
+            pool_size=max_connections + listing_workers,
+            timeout=timeout,
+            metadata_limiter=TokenBucket(metadata_rate_limit) if metadata_rate_limit > 0 else None,
+            transfer_limiter=TokenBucket(transfer_rate_limit) if transfer_rate_limit > 0 else None,
+            governor=governor,
+            metrics=metrics,
+        )
+        self.operations = OperationTracker(self.session)
+        self._root_path: Union[str, None] = None
+        self._upload_operations: Dict[str, str] = {}
+        if state is not None and not state.bind(self._get_state_root(oauth_token)):
+            logger.warning(
+                'Состояние синхронизации сохранено для другой папки хранилища или другого токена '
+                'и сброшено, файлы будут сверены заново.',
+            )
 
-    def upload(self, path: str):
+    def get_connection_stats(self) -> ConnectionStats:
+        """ Получить статистику использования соединений. """
+        return self.session.get_stats()
+
+    def upload(self, path: str) -> Union[bool, Future]:
         """
         Загрузить файл в хранилище.
 
         Args:
             path (str): путь к файлу.
+        Returns:
+            bool: True, если файл успешно передан.
+                  Или Future с этим признаком, если хранилище обрабатывает файл асинхронно.
+        """
+        return self._send_file(path, overwrite=False)
+
+    def update(self, path: str) -> Union[bool, Future]:
+        """
+        Обновить файл в хранилище.
+
+        Args:
+            path (str): путь к файлу.
+        Returns:
+            bool: True, если файл успешно передан.
+                  Или Future с этим признаком, если хранилище обрабатывает файл асинхронно.
+        """
+        return self._send_file(path, overwrite=True)
+
+    def _send_file(self, path: str, overwrite: bool) -> Union[bool, Future]:
+        """
+        Передать содержимое файла в хранилище.
+
+        Файл читается порциями по chunk_size байт по мере отправки,
+        поэтому расход памяти не зависит от размера файла.
+        Пустые файлы передаются как пустые файлы. Если задано хранилище
+        состояния, файлы от segment_threshold байт (если он не 0) передаются
+        сегментами, а файлы от resumable_threshold байт - с возможностью
+        возобновления.
+
+        Args:
+            path (str): путь к файлу.
+            overwrite (bool): перезаписать существующий файл.
+        Returns:
+            bool: True, если файл успешно передан.
         """
         if not file_utils.check_if_exists(path):
-            return
+            return False
+
+        filename = file_utils.get_relative_name(path, self.local_folder_path)
+        result = 'обновлён' if overwrite else 'загружен'
+
+        size = file_utils.get_stat(path).st_size
+        if self.state is not None and self.segment_threshold and size >= self.segment_threshold:
+            return self._send_segmented(path, filename, overwrite, result)
 
-        filename = file_utils.get_base_name(path)
+        if self.state is not None and self.state.get_segments(filename):
+            # Файл уменьшился и снова хранится целиком
+            self._delete_segments(filename)
 
-        upload_url = self.get_upload_url(filename)
+        if self.state is not None and self.state.get_bundled(filename) is not None:
+            # Файл вырос и больше не передаётся в архиве
+            self.state.remove_bundled(filename)
+            self._delete_unused_bundles()
+
+        if self.state is not None and size >= self.resumable_threshold:
+            return self._send_resumable(path, filename, overwrite, result)
+
+        upload_url = self.get_upload_url(filename, overwrite)
         if not upload_url:
-            return
+            return False
 
-        payload = file_utils.get_file_bytes(path)
-        if not payload:
-            return
+        return self._put_file(upload_url, path, filename, result)
+
+    def _put_file(self, upload_url: str, path: str, filename: str, result: str) -> Union[bool, Future]:
+        """
+        Передать файл целиком одним запросом.
+
+        Args:
+            upload_url (str): ссылка для загрузки.
+            path (str): путь к файлу.
+            filename (str): имя файла.
+            result (str): описание операции для журнала.
+        Returns:
+            bool: True, если файл успешно передан. Или Future, если файл обрабатывается асинхронно.
+        """
+        operation_id = self._upload_operations.pop(upload_url, None)
         try:
-            response = requests.put(
-                upload_url,
-                data=payload,
+            with file_utils.FileReader(path, self.chunk_size, limiter=self.bandwidth) as payload:
+                response = self.session.put(
+                    upload_url,
+                    data=payload if len(payload) else b'',
+                    timeout=self.upload_timeout,
+                )
+        except FileNotFoundError:
+            logger.error(
+                'Файл {file} не {result}. Файл удалён до начала передачи.'.format(
+                    file=filename,
+                    result=result,
+                ),
             )
+            return False
         except ConnectionError:
             logger.error(
-                'Файл {file} не загружен. Ошибка соединения.'.format(
+                'Файл {file} не {result}. Ошибка соединения.'.format(
                     file=filename,
+                    result=result,
                 ),
             )
-            return
+            return False
         except Timeout:
             logger.error(
-                'Файл {file} не загружен. Таймаут.'.format(
+                'Файл {file} не {result}. Таймаут.'.format(
                     file=filename,
+                    result=result,
                 ),
             )
-            return
+            return False
 
-        if response.status_code == 201 or response.status_code == 202:
+        if response.status_code == 201:
             logger.info(
-                'Файл {file} успешно загружен.'.format(
+                'Файл {file} успешно {result}.'.format(
                     file=filename,
+                    result=result,
                 ),
             )
-            return
+            return True
+
+        if response.status_code == 202:
+            return self._track_operation(
+                self._get_operation_url(operation_id) if operation_id else None,
+                'Файл {file} не {result}'.format(file=filename, result=result),
+                'Файл {file} успешно {result}.'.format(file=filename, result=result),
+            )
 
         error = response.json().get('error')
         logger.error(
-            'Файл {file} не загружен. Причина: {error}.'.format(
+            'Файл {file} не {result}. Причина: {error}.'.format(
                 file=filename,
+                result=result,
                 error=error
             ),
         )
+        return False
 
-    def update(self, path: str):
+    def _send_resumable(self, path: str, filename: str, overwrite: bool, result: str) -> Union[bool, Future]:
         """
-        Обновить файл в хранилище.
+        Передать файл фрагментами с сохранением контрольных точек.
+
+        После каждого подтверждённого фрагмента ссылка для загрузки и
+        количество принятых байт сохраняются в хранилище состояния.
+        Прерванная передача продолжается с последнего подтверждённого байта.
+        Если сервер не поддерживает передачу фрагментами, файл передаётся целиком.
 
         Args:
             path (str): путь к файлу.
+            filename (str): имя файла.
+            overwrite (bool): перезаписать существующий файл.
+            result (str): описание операции для журнала.
+        Returns:
+            bool: True, если файл успешно передан.
         """
-        if not file_utils.check_if_exists(path):
-            return
+        stat = file_utils.get_stat(path)
+        checkpoint = self.state.get_checkpoint(filename)
+        offset = None
+        if (
+            checkpoint is not None and
+            checkpoint.size == stat.st_size and
+            checkpoint.modified_at == stat.st_mtime
+        ):
+            offset = self._get_upload_offset(checkpoint.href)
 
-        filename = file_utils.get_base_name(path)
+        if offset is None:
+            self.state.remove_checkpoint(filename)
+            upload_url = self.get_upload_url(filename, overwrite)
+            if not upload_url:
+                return False
 
-        upload_url = self.get_upload_url(filename, True)
-        if not upload_url:
+            offset = self._get_upload_offset(upload_url)
+            if offset is None:
+                return self._put_file(upload_url, path, filename, result)
+
+            # Передача фрагментами завершается кодом 201, статус операции не нужен
+            self._upload_operations.pop(upload_url, None)
+
+            checkpoint = UploadCheckpoint(
+                name=filename,
+                href=upload_url,
+                size=stat.st_size,
+                modified_at=stat.st_mtime,
+                offset=offset,
+            )
+            self.state.save_checkpoint(checkpoint)
+        elif offset:
+            logger.info(
+                'Передача файла {file} возобновлена с {offset} байт из {size}.'.format(
+                    file=filename,
+                    offset=offset,
+                    size=stat.st_size,
+                ),
+            )
+
+        retry_policy = self.session.retry_policy
+        failures = 0
+        while offset < checkpoint.size:
+            end = min(offset + self.resumable_chunk_size, checkpoint.size) - 1
+            try:
+                with file_utils.FileReader(
+                    path,
+                    self.chunk_size,
+                    offset=offset,
+                    length=end - offset + 1,
+                    limiter=self.bandwidth,
+                ) as payload:
+                    response = self.session.put(
+                        checkpoint.href,
+                        data=payload,
+                        headers={
+                            'Content-Range': 'bytes {start}-{end}/{total}'.format(
+                                start=offset,
+                                end=end,
+                                total=checkpoint.size,
+                            ),
+                        },
+                        timeout=self.upload_timeout,
+                        retry=False,
+                    )
+            except (ConnectionError, Timeout, FileNotFoundError) as e:
+                confirmed = None
+                if not isinstance(e, FileNotFoundError) and failures + 1 < retry_policy.attempts:
+                    time.sleep(retry_policy.get_delay(failures))
+                    failures += 1
+                    confirmed = self._get_upload_offset(checkpoint.href)
+
+                if confirmed is not None:
+                    logger.warning(
+                        'Передача файла {file} прервана на {offset} байт из {size}, '
+                        'повтор с {confirmed} байт.'.format(
+                            file=filename,
+                            offset=offset,
+                            size=checkpoint.size,
+                            confirmed=confirmed,
+                        ),
+                    )
+                    offset = checkpoint.offset = confirmed
+                    self.state.save_checkpoint(checkpoint)
+                    continue
+
+                logger.error(
+                    'Передача файла {file} прервана на {offset} байт из {size}. '
+                    'Она будет продолжена при следующей синхронизации.'.format(
+                        file=filename,
+                        offset=offset,
+                        size=checkpoint.size,
+                    ),
+                )
+                return False
+
+            if response.status_code == 201 or response.status_code == 200:
+                self.state.remove_checkpoint(filename)
+                logger.info(
+                    'Файл {file} успешно {result}.'.format(
+                        file=filename,
+                        result=result,
+                    ),
+                )
+                return True
+
+            if response.status_code != 308:
+                self.state.remove_checkpoint(filename)
+                logger.error(
+                    'Файл {file} не {result}. Сервер вернул код {status} при передаче фрагмента.'.format(
+                        file=filename,
+                        result=result,
+                        status=response.status_code,
+                    ),
+                )
+                return False
+
+            failures = 0
+            offset = self._parse_confirmed_offset(response, end + 1)
+            checkpoint.offset = offset
+            self.state.save_checkpoint(checkpoint)
+
+        self.state.remove_checkpoint(filename)
+        logger.error(
+            'Файл {file} не {result}. Сервер не подтвердил завершение передачи.'.format(
+                file=filename,
+                result=result,
+            ),
+        )
+        return False
+
+    def _get_upload_offset(self, upload_url: str) -> Union[int, None]:
+        """
+        Узнать, сколько байт файла уже принято по ссылке для загрузки.
+
+        Сервер, поддерживающий передачу фрагментами, отвечает на HEAD-запрос
+        заголовком Accept-Ranges: bytes и, если часть файла уже принята,
+        заголовком Range: bytes=0-N.
+
+        Args:
+            upload_url (str): ссылка для загрузки.
+        Returns:
+            int: количество принятых байт. Или None, если ссылка недействительна
+                 или сервер не поддерживает передачу фрагментами.
+        """
+        try:
+            response = self.session.head(upload_url, timeout=self.timeout)
+        except (ConnectionError, Timeout):
             return
 
-        payload = file_utils.get_file_bytes(path)
-        if not payload:
+        if response.status_code not in (200, 204, 308):
             return
 
+        if response.headers.get('Accept-Ranges') != 'bytes':
+            return
+
+        return self._parse_confirmed_offset(response, 0)
+
+    @staticmethod
+    def _parse_confirmed_offset(response: requests.Response, default: int) -> int:
+        """ Получить количество принятых байт из заголовка Range ответа. """
+        confirmed = response.headers.get('Range', '')
+        if not confirmed.startswith('bytes=0-'):
+            return default
+
+        try:
+            return int(confirmed[len('bytes=0-'):]) + 1
+        except ValueError:
+            return default
+
+    def _send_segmented(self, path: str, filename: str, overwrite: bool, result: str) -> bool:
+        """
+        Передать файл сегментами, пропуская не изменившиеся сегменты.
+
+        В хранилище файл хранится в папке SEGMENTS_FOLDER как сегменты по
+        segment_size байт и манифест с их размерами и контрольными суммами.
+        Контрольные суммы переданных сегментов сохраняются в хранилище
+        состояния. Передача начинается с первого сегмента, содержимое которого
+        изменилось, поэтому при дописывании в конец файла передаются только
+        новые данные и последний неполный сегмент. Файл, хранившийся целиком,
+        удаляется только после передачи манифеста, чтобы прерванная передача
+        не оставила хранилище без единой копии.
+
+        Args:
+            path (str): путь к файлу.
+            filename (str): имя файла.
+            overwrite (bool): файл уже есть в хранилище.
+            result (str): описание операции для журнала.
+        Returns:
+            bool: True, если файл успешно передан.
+        """
+        stat = file_utils.get_stat(path)
+        size = stat.st_size
+        segments = self.state.get_segments(filename)
+        # Сегменты прерванной передачи могут быть сохранены, а манифест - ещё нет
+        is_stored_whole = overwrite and not any(
+            record.name == filename for record in self.state.get_segmented_files(filename)
+        )
+
+        try:
+            unchanged = self._count_unchanged_segments(path, segments, size)
+            offset = unchanged * self.segment_size
+            index = unchanged
+            while offset < size:
+                length = min(self.segment_size, size - offset)
+                segment = FileSegment(
+                    name=filename,
+                    index=index,
+                    offset=offset,
+                    size=length,
+                    sha256=self._hash_range(path, offset, length),
+                )
+                if not self._put_segment(path, segment, result):
+                    return False
+
+                self.state.save_segment(segment)
+                offset += length
+                index += 1
+        except FileNotFoundError:
+            logger.error(
+                'Файл {file} не {result}. Файл удалён во время передачи.'.format(
+                    file=filename,
+                    result=result,
+                ),
+            )
+            return False
+
+        for segment in [segment for segment in segments if segment.index >= index]:
+            self._delete_resource(self._get_segment_name(filename, segment.index))
+
+        segments = self.state.get_segments(filename)[:index]
+        if not self._put_manifest(filename, segments, size, result):
+            return False
+
+        if is_stored_whole:
+            # Файл, хранившийся целиком, заменён сегментами
+            self._delete_resource(filename)
+        self.state.finish_segments(filename, index, size, stat.st_mtime)
+        logger.info(
+            'Файл {file} успешно {result}, передано {sent} из {size} байт.'.format(
+                file=filename,
+                result=result,
+                sent=size - unchanged * self.segment_size,
+                size=size,
+            ),
+        )
+        return True
+
+    def _count_unchanged_segments(self, path: str, segments: List[FileSegment], size: int) -> int:
+        """
+        Подсчитать сегменты от начала файла, содержимое которых не изменилось.
+
+        Неполный последний сегмент всегда передаётся заново вместе с дописанными данными.
+        """
+        unchanged = 0
+        for segment in segments:
+            if (
+                segment.offset != unchanged * self.segment_size or
+                segment.size != self.segment_size or
+                segment.offset + segment.size > size or
+                self._hash_range(path, segment.offset, segment.size) != segment.sha256
+            ):
+                break
+            unchanged += 1
+        return unchanged
+
+    def _hash_range(self, path: str, offset: int, length: int) -> str:
+        """ Вычислить контрольную сумму SHA-256 части файла. """
+        sha256 = hashlib.sha256()
+        with file_utils.FileReader(path, self.chunk_size, offset=offset, length=length) as reader:
+            for chunk in reader:
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def _put_segment(self, path: str, segment: FileSegment, result: str) -> bool:
+        """ Передать сегмент файла. """
+        upload_url = self.get_upload_url(
+            self._get_segment_name(segment.name, segment.index),
+            overwrite=True,
+        )
+        if not upload_url:
+            return False
+
+        # Сегмент считается переданным, как только хранилище его приняло
+        self._upload_operations.pop(upload_url, None)
+        try:
+            with file_utils.FileReader(
+                path,
+                self.chunk_size,
+                offset=segment.offset,
+                length=segment.size,
+                limiter=self.bandwidth,
+            ) as payload:
+                response = self.session.put(
+                    upload_url,
+                    data=payload,
+                    timeout=self.upload_timeout,
+                )
+        except (ConnectionError, Timeout):
+            logger.error(
+                'Файл {file} не {result}. Передача прервана на {offset} байт.'.format(
+                    file=segment.name,
+                    result=result,
+                    offset=segment.offset,
+                ),
+            )
+            return False
+
+        if response.status_code in (201, 202):
+            return True
+
+        logger.error(
+            'Файл {file} не {result}. Сервер вернул код {status} при передаче сегмента.'.format(
+                file=segment.name,
+                result=result,
+                status=response.status_code,
+            ),
+        )
+        return False
+
+    def _put_manifest(self, filename: str, segments: List[FileSegment], size: int, result: str) -> bool:
+        """ Передать манифест с перечнем сегментов файла. """
+        manifest = {
+            'size': size,
+            'segment_size': self.segment_size,
+            'segments': [
+                {
+                    'name': self._get_segment_name(filename, segment.index).rsplit('/', 1)[-1],
+                    'offset': segment.offset,
+                    'size': segment.size,
+                    'sha256': segment.sha256,
+                }
+                for segment in segments
+            ],
+        }
+        upload_url = self.get_upload_url(
+            '{folder}/{filename}/{manifest}'.format(
+                folder=self.SEGMENTS_FOLDER,
+                filename=filename,
+                manifest=self.MANIFEST_NAME,
+            ),
+            overwrite=True,
+        )
+        if not upload_url:
+            return False
+
+        self._upload_operations.pop(upload_url, None)
         try:
-            response = requests.put(
+            response = self.session.put(
                 upload_url,
-                data=payload,
+                data=json.dumps(manifest).encode(),
+                timeout=self.upload_timeout,
             )
-        except ConnectionError:
+        except (ConnectionError, Timeout):
             logger.error(
-                'Файл {file} не обновлён. Ошибка соединения.'.format(
+                'Файл {file} не {result}. Не удалось передать манифест сегментов.'.format(
                     file=filename,
+                    result=result,
                 ),
             )
-            return
+            return False
+
+        if response.status_code in (201, 202):
+            return True
+
+        logger.error(
+            'Файл {file} не {result}. Сервер вернул код {status} при передаче манифеста сегментов.'.format(
+                file=filename,
+                result=result,
+                status=response.status_code,
+            ),
+        )
+        return False
+
+    def _get_segment_name(self, filename: str, index: int) -> str:
+        """ Получить имя сегмента файла относительно папки синхронизации. """
+        return '{folder}/{filename}/{index:06d}'.format(
+            folder=self.SEGMENTS_FOLDER,
+            filename=filename,
+            index=index,
+        )
+
+    def _delete_segments(self, filename: str) -> bool:
+        """
+        Удалить сегменты файла или всех файлов папки из хранилища.
+
+        Args:
+            filename (str): имя файла или папки.
+        Returns:
+            bool: True, если сегменты удалены или хранилище приняло их удаление.
+        """
+        deleted = self._delete_resource(
+            '{folder}/{filename}'.format(folder=self.SEGMENTS_FOLDER, filename=filename),
+        )
+        if deleted:
+            self.state.remove_segments(filename)
+        return deleted
+
+    def _delete_resource(self, filename: str) -> bool:
+        """
+        Удалить служебный файл или папку из хранилища без записи в журнал.
+
+        Returns:
+            bool: True, если ресурс удалён, его удаление принято или его не было.
+        """
+        try:
+            response = self.session.delete(
+                self.BASE_URL,
+                params={'path': self._remote_path(filename)},
+                timeout=self.timeout,
+            )
+        except (ConnectionError, Timeout):
+            return False
+
+        return response.status_code in (202, 204, 404)
+
+    def upload_bundle(self, paths: List[str], replaced: Union[List[str], None] = None) -> bool:
+        """
+        Загрузить мелкие файлы одним сжатым архивом.
+
+        Архив ZIP собирается во временном файле и загружается в папку
+        BUNDLES_FOLDER одним запросом ссылки и одной передачей на все файлы.
+        В хранилище состояния запоминается, в каком архиве находится каждый
+        файл. Архивы, все файлы которых заменены или удалены, удаляются
+        из хранилища.
+
+        Args:
+            paths (List[str]): пути к файлам.
+            replaced (List[str]): имена файлов, целые копии которых уже есть
+                                  в хранилище и удаляются после загрузки архива.
+        Returns:
+            bool: True, если архив успешно загружен.
+        """
+        bundle = '{folder}/{name}.zip'.format(folder=self.BUNDLES_FOLDER, name=uuid.uuid4().hex)
+        files = []
+        with tempfile.TemporaryDirectory() as temp_folder:
+            archive_path = os.path.join(temp_folder, 'bundle.zip')
+            with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for path in paths:
+                    filename = file_utils.get_relative_name(path, self.local_folder_path)
+                    try:
+                        stat = file_utils.get_stat(path)
+                        archive.write(path, arcname=filename)
+                    except OSError:
+                        continue
+                    files.append(
+                        BundledFile(
+                            name=filename,
+                            bundle=bundle,
+                            member=filename,
+                            size=stat.st_size,
+                            modified_at=stat.st_mtime,
+                        ),
+                    )
+
+            if not files:
+                return False
+
+            upload_url = self.get_upload_url(bundle, overwrite=True)
+            if not upload_url:
+                return False
+
+            self._upload_operations.pop(upload_url, None)
+            try:
+                with file_utils.FileReader(archive_path, self.chunk_size, limiter=self.bandwidth) as payload:
+                    compressed_size = len(payload)
+                    response = self.session.put(
+                        upload_url,
+                        data=payload,
+                        timeout=self.upload_timeout,
+                    )
+            except (ConnectionError, Timeout):
+                logger.error(
+                    'Архив из {count} файлов не загружен. Ошибка соединения.'.format(
+                        count=len(files),
+                    ),
+                )
+                return False
+
+        if response.status_code not in (201, 202):
+            logger.error(
+                'Архив из {count} файлов не загружен. Сервер вернул код {status}.'.format(
+                    count=len(files),
+                    status=response.status_code,
+                ),
+            )
+            return False
+
+        # Целые копии есть только у файлов, которые ещё не передавались в архивах
+        replaced = [
+            filename for filename in replaced or []
+            if self.state.get_bundled(filename) is None
+        ]
+        self.state.save_bundle(bundle, files)
+        bundled_names = {f.name for f in files}
+        for filename in replaced:
+            if filename in bundled_names:
+                self._delete_resource(filename)
+        self._delete_unused_bundles()
+
+        logger.info(
+            'Файлы ({count}) успешно загружены архивом {bundle}: '
+            'передано {compressed} байт вместо {size}.'.format(
+                count=len(files),
+                bundle=bundle,
+                compressed=compressed_size,
+                size=sum(f.size for f in files),
+            ),
+        )
+        return True
+
+    def _delete_unused_bundles(self):
+        """ Удалить из хранилища архивы, в которых не осталось актуальных файлов. """
+        for bundle in self.state.get_unused_bundles():
+            if self._delete_resource(bundle):
+                self.state.remove_bundle(bundle)
+
+    def download(
+        self,
+        filename: str,
+        modified_at: Union[datetime.datetime, None] = None,
+        replaced: Union[file_utils.FileInfo, None] = None,
+    ) -> bool:
+        """
+        Скачать файл из хранилища в локальную директорию.
+
+        Содержимое записывается порциями по chunk_size байт во временный файл
+        в той же папке, который после завершения передачи атомарно заменяет
+        локальный файл. Прерванное скачивание не повреждает локальный файл.
+        Недостающие папки создаются. Файл, переданный сегментами, собирается
+        из сегментов по порядку, а файл, переданный в архиве, извлекается из него.
+
+        Перед заменой локальный файл проверяется ещё раз: если он создан,
+        изменён или удалён с момента сравнения, скачанное содержимое
+        не записывается, чтобы не потерять локальные изменения.
+
+        Args:
+            filename (str): имя файла.
+            modified_at (datetime): время изменения файла в хранилище,
+                                    которое устанавливается скачанному файлу.
+            replaced (FileInfo): заменяемый локальный файл в том виде, в каком
+                                 его видело сравнение. None, если файла не было.
+        Returns:
+            bool: True, если файл успешно скачан.
+        """
+        path = file_utils.get_local_path(self.local_folder_path, filename)
+        folder = os.path.dirname(path)
+        try:
+            os.makedirs(folder, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(
+                prefix='.',
+                suffix=file_utils.DOWNLOAD_SUFFIX,
+                dir=folder,
+            )
+        except OSError as e:
+            logger.error(
+                'Файл {file} не скачан. Не удалось создать временный файл: {error}.'.format(
+                    file=filename,
+                    error=e,
+                ),
+            )
+            return False
+
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                if not self._download_content(filename, file):
+                    return False
+
+            if modified_at is not None:
+                timestamp = modified_at.timestamp()
+                os.utime(temp_path, (timestamp, timestamp))
+            if not self._is_unchanged_locally(filename, replaced):
+                logger.warning(
+                    'Файл {file} не скачан: он изменён в локальной директории '
+                    'во время скачивания и будет сверен заново.'.format(
+                        file=filename,
+                    ),
+                )
+                return False
+            os.replace(temp_path, path)
+        except (ConnectionError, ChunkedEncodingError):
+            logger.error(
+                'Файл {file} не скачан. Ошибка соединения.'.format(
+                    file=filename,
+                ),
+            )
+            return False
         except Timeout:
             logger.error(
-                'Файл {file} не обновлён. Таймаут.'.format(
+                'Файл {file} не скачан. Таймаут.'.format(
                     file=filename,
                 ),
             )
-            return
+            return False
+        except OSError as e:
+            logger.error(
+                'Файл {file} не скачан. Ошибка записи: {error}.'.format(
+                    file=filename,
+                    error=e,
+                ),
+            )
+            return False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
-        if response.status_code == 201 or response.status_code == 202:
-            logger.info(
-                'Файл {file} успешно обновлён.'.format(
+        logger.info(
+            'Файл {file} успешно скачан.'.format(
+                file=filename,
+            ),
+        )
+        return True
+
+    def _is_unchanged_locally(self, filename: str, replaced: Union[file_utils.FileInfo, None]) -> bool:
+        """ Проверить, что локальный файл остался таким, каким его видело сравнение. """
+        local_file = file_utils.get_file_info(self.local_folder_path, filename)
+        if local_file is None or replaced is None:
+            return local_file is None and replaced is None
+
+        return (
+            local_file.is_dir == replaced.is_dir and
+            local_file.size == replaced.size and
+            local_file.modified_at == replaced.modified_at and
+            local_file.inode == replaced.inode
+        )
+
+    def _download_content(self, filename: str, file: BinaryIO) -> bool:
+        """ Записать содержимое файла хранилища в открытый файл. """
+        if self.state is None:
+            return self._download_part(filename, filename, file)
+
+        bundled = self.state.get_bundled(filename)
+        if bundled is not None:
+            return self._extract_bundled(bundled, file)
+
+        segments = self.state.get_segments(filename)
+        if not segments:
+            return self._download_part(filename, filename, file)
+
+        return all(
+            self._download_part(self._get_segment_name(filename, segment.index), filename, file)
+            for segment in segments
+        )
+
+    def _extract_bundled(self, bundled: BundledFile, file: BinaryIO) -> bool:
+        """ Скачать архив и записать из него содержимое файла в открытый файл. """
+        with tempfile.TemporaryFile() as archive_file:
+            if not self._download_part(bundled.bundle, bundled.name, archive_file):
+                return False
+
+            try:
+                with zipfile.ZipFile(archive_file) as archive, archive.open(bundled.member) as member:
+                    shutil.copyfileobj(member, file, self.chunk_size)
+            except (zipfile.BadZipFile, KeyError):
+                logger.error(
+                    'Файл {file} не скачан. Архив {bundle} повреждён.'.format(
+                        file=bundled.name,
+                        bundle=bundled.bundle,
+                    ),
+                )
+                return False
+        return True
+
+    def _download_part(self, part: str, filename: str, file: BinaryIO) -> bool:
+        """
+        Дописать содержимое файла хранилища в открытый файл.
+
+        Args:
+            part (str): имя скачиваемого файла или сегмента.
+            filename (str): имя файла для журнала.
+            file (BinaryIO): файл, в который записывается содержимое.
+        Returns:
+            bool: True, если содержимое получено полностью.
+        """
+        download_url = self.get_download_url(part)
+        if not download_url:
+            return False
+
+        with self.session.get(
+            download_url,
+            stream=True,
+            timeout=self.upload_timeout,
+        ) as response:
+            if response.status_code != 200:
+                logger.error(
+                    'Файл {file} не скачан. Сервер вернул код {status}.'.format(
+                        file=filename,
+                        status=response.status_code,
+                    ),
+                )
+                return False
+
+            for chunk in response.iter_content(self.chunk_size):
+                file.write(chunk)
+        return True
+
+    def get_download_url(self, filename: str) -> Union[str, None]:
+        """ Получить ссылку для скачивания файла. """
+        try:
+            response = self.session.get(
+                '{base_url}/download'.format(base_url=self.BASE_URL),
+                params={'path': self._remote_path(filename)},
+                timeout=self.timeout,
+            )
+        except ConnectionError:
+            logger.error(
+                'Не удалось получить ссылку для скачивания файла {file}. Ошибка соединения.'.format(
+                    file=filename,
+                ),
+            )
+            return
+        except Timeout:
+            logger.error(
+                'Не удалось получить ссылку для скачивания файла {file}. Таймаут.'.format(
                     file=filename,
                 ),
             )
             return
 
+        if response.status_code == 200:
+            return response.json().get('href')
+
         error = response.json().get('error')
         logger.error(
-            'Файл {file} не обновлён. Причина: {error}.'.format(
+            'Не удалось получить ссылку для скачивания файла {file}. Причина: {error}.'.format(
                 file=filename,
-                error=error
+                error=error,
             ),
         )
 
-    def delete(self, filename: str):
-        """ Удалить файл из хранилища. """
-        url = '{base_url}{base_args}{folder}/{filename}'.format(
-            base_url=self.BASE_URL,
-            base_args=self.BASE_ARGS,
-            folder=self.remote_folder_name,
-            filename=filename,
-        )
+    def delete(self, filename: str) -> Union[bool, Future]:
+        """
+        Удалить файл или папку со всем содержимым из хранилища.
+
+        Args:
+            filename (str): имя файла или папки.
+        Returns:
+            bool: True, если файл успешно удалён.
+                  Или Future с этим признаком, если хранилище удаляет его асинхронно.
+        """
+        bundled_files = [] if self.state is None else self.state.get_bundled_files(filename)
+        if bundled_files:
+            self.state.remove_bundled(filename)
+            self._delete_unused_bundles()
+            if any(record.name == filename for record in bundled_files):
+                logger.info(
+                    'Файл {file} успешно удалён.'.format(
+                        file=filename,
+                    ),
+                )
+                return True
+
+        segmented_files = [] if self.state is None else self.state.get_segmented_files(filename)
+        if segmented_files:
+            if not self._delete_segments(filename):
+                logger.error(
+                    'Файл {file} не удалён. Не удалось удалить сегменты.'.format(
+                        file=filename,
+                    ),
+                )
+                return False
+
+            if any(record.name == filename for record in segmented_files):
+                logger.info(
+                    'Файл {file} успешно удалён.'.format(
+                        file=filename,
+                    ),
+                )
+                return True
 
         try:
-            response = requests.delete(
-                url,
-                headers={'Authorization': self.oauth_token},
+            response = self.session.delete(
+                self.BASE_URL,
+                params={'path': self._remote_path(filename)},
                 timeout=self.timeout,
             )
         except ConnectionError:
@@ -156,28 +1033,35 @@ class YandexSynchronizer(Synchronizer):
                     file=filename,
                 ),
             )
-            return
+            return False
         except Timeout:
             logger.error(
                 'Файл {file} не удалён. Таймаут.'.format(
                     file=filename,
                 ),
             )
-            return
+            return False
 
         if response.status_code == 401:
             logger.error(
                 'Файл {file} не удалён. Недействительный oauth token.',
             )
-            return
+            return False
 
-        if response.status_code == 204 or response.status_code == 202:
+        if response.status_code == 204:
             logger.info(
                 'Файл {file} успешно удалён.'.format(
                     file=filename,
                 ),
             )
-            return
+            return True
+
+        if response.status_code == 202:
+            return self._track_operation(
+                response.json().get('href'),
+                'Файл {file} не удалён'.format(file=filename),
+                'Файл {file} успешно удалён.'.format(file=filename),
+            )
 
         error = response.json().get('error')
         logger.error(
@@ -186,53 +1070,484 @@ class YandexSynchronizer(Synchronizer):
                 error=error
             ),
         )
+        return False
+
+    def copy(self, source_filename: str, filename: str) -> Union[bool, Future]:
+        """
+        Скопировать файл внутри хранилища без передачи содержимого.
+
+        Args:
+            source_filename (str): имя существующего файла в хранилище.
+            filename (str): имя копии.
+        Returns:
+            bool: True, если файл успешно скопирован.
+                  Или Future с этим признаком, если хранилище копирует его асинхронно.
+                  False для файла, переданного сегментами или в архиве: его нужно загрузить.
+        """
+        if self.state is not None and (
+            self.state.get_segments(source_filename) or
+            self.state.get_bundled(source_filename) is not None
+        ):
+            return False
+
+        return self._relocate('copy', source_filename, filename)
+
+    def move(self, source_filename: str, filename: str) -> Union[bool, Future]:
+        """
+        Переместить (переименовать) файл внутри хранилища без передачи содержимого.
+
+        Args:
+            source_filename (str): имя существующего файла в хранилище.
+            filename (str): новое имя файла.
+        Returns:
+            bool: True, если файл успешно перемещён.
+                  Или Future с этим признаком, если хранилище перемещает его асинхронно.
+        """
+        if self.state is not None and self.state.get_segments(source_filename):
+            return self._move_segments(source_filename, filename)
+
+        if self.state is not None and self.state.get_bundled(source_filename) is not None:
+            # Файл остаётся в том же архиве, меняется только его имя в хранилище состояния
+            self.state.move_bundled(source_filename, filename)
+            logger.info(
+                'Файл {source} успешно перемещён в {file} без передачи содержимого.'.format(
+                    source=source_filename,
+                    file=filename,
+                ),
+            )
+            return True
+
+        return self._relocate('move', source_filename, filename)
+
+    def _move_segments(self, source_filename: str, filename: str) -> Union[bool, Future]:
+        """ Переместить сегменты файла вместе с манифестом. """
+        target = '{folder}/{filename}'.format(folder=self.SEGMENTS_FOLDER, filename=filename)
+        if not all(
+            self.create_remote_folder(folder)
+            for folder in file_utils.get_parent_names(target)
+        ):
+            return False
+
+        result = self._relocate(
+            'move',
+            '{folder}/{filename}'.format(folder=self.SEGMENTS_FOLDER, filename=source_filename),
+            target,
+        )
+        if isinstance(result, Future):
+            result.add_done_callback(
+                lambda moved: moved.result() and self.state.move_segments(source_filename, filename),
+            )
+        elif result:
+            self.state.move_segments(source_filename, filename)
+        return result
+
+    def _relocate(self, action: str, source_filename: str, filename: str) -> Union[bool, Future]:
+        """
+        Скопировать или переместить файл внутри хранилища.
+
+        Args:
+            action (str): 'copy' или 'move'.
+            source_filename (str): имя существующего файла в хранилище.
+            filename (str): имя результирующего файла.
+        Returns:
+            bool: True, если операция выполнена успешно. Или Future, если она выполняется асинхронно.
+        """
+        result = 'скопирован' if action == 'copy' else 'перемещён'
+        params = {
+            'from': self._remote_path(source_filename),
+            'path': self._remote_path(filename),
+            'overwrite': 'true',
+        }
+
+        try:
+            response = self.session.post(
+                '{base_url}/{action}'.format(base_url=self.BASE_URL, action=action),
+                params=params,
+                timeout=self.timeout,
+            )
+        except ConnectionError:
+            logger.error(
+                'Файл {source} не {result} в {file}. Ошибка соединения.'.format(
+                    source=source_filename,
+                    result=result,
+                    file=filename,
+                ),
+            )
+            return False
+        except Timeout:
+            logger.error(
+                'Файл {source} не {result} в {file}. Таймаут.'.format(
+                    source=source_filename,
+                    result=result,
+                    file=filename,
+                ),
+            )
+            return False
+
+        message = 'Файл {source} успешно {result} в {file} без передачи содержимого.'.format(
+            source=source_filename,
+            result=result,
+            file=filename,
+        )
+        if response.status_code == 201:
+            logger.info(message)
+            return True
+
+        if response.status_code == 202:
+            return self._track_operation(
+                response.json().get('href'),
+                'Файл {source} не {result} в {file}'.format(
+                    source=source_filename,
+                    result=result,
+                    file=filename,
+                ),
+                message,
+            )
+
+        error = response.json().get('error')
+        logger.error(
+            'Файл {source} не {result} в {file}. Причина: {error}.'.format(
+                source=source_filename,
+                result=result,
+                file=filename,
+                error=error,
+            ),
+        )
+        return False
+
+    def _track_operation(
+        self,
+        href: Union[str, None],
+        description: str,
+        message: str,
+    ) -> Union[bool, Future]:
+        """
+        Дождаться подтверждения операции, принятой хранилищем к выполнению (код 202).
+
+        Args:
+            href (str): ссылка на статус операции.
+            description (str): описание неудавшейся операции для журнала.
+            message (str): сообщение журнала об успешном завершении.
+        Returns:
+            Future: True, если операция завершилась успешно.
+                    Или True, если статус операции узнать нельзя.
+        """
+        if not href:
+            logger.info(message)
+            return True
+
+        future = self.operations.track(href, description)
+        future.add_done_callback(lambda result: result.result() and logger.info(message))
+        return future
+
+    def _get_operation_url(self, operation_id: str) -> str:
+        """ Получить ссылку на статус операции по её идентификатору. """
+        return '{base_url}/operations/{operation_id}'.format(
+            base_url=self.BASE_URL.rsplit('/', 1)[0],
+            operation_id=operation_id,
+        )
+
+    def _get_state_root(self, oauth_token: str) -> str:
+        """ Получить идентификатор папки синхронизации и аккаунта, не раскрывающий токен. """
+        return '{path} {token}'.format(
+            path=self._remote_path(),
+            token=hashlib.sha256(oauth_token.encode()).hexdigest()[:16],
+        )
+
+    def _remote_path(self, filename: Union[str, None] = None) -> str:
+        """ Получить путь к файлу или папке синхронизации в хранилище. """
+        if filename is None:
+            return 'app:/{folder}'.format(folder=self.remote_folder_name)
+
+        return 'app:/{folder}/{filename}'.format(
+            folder=self.remote_folder_name,
+            filename=filename,
+        )
 
     def get_info(self) -> Union[Dict[str, file_utils.FileInfo], None]:
         """ Получить информации о файлах в хранилище. """
-        url = '{base_url}{base_args}{folder}'.format(
-            base_url=self.BASE_URL,
-            base_args=self.BASE_ARGS,
-            folder=self.remote_folder_name,
+        try:
+            return {f.name: f for f in self.iter_info() if not f.is_dir}
+        except SynchronizationError:
+            return
+
+    def iter_info(self) -> Iterator[file_utils.FileInfo]:
+        """
+        Получать информацию о файлах и папках хранилища рекурсивно.
+
+        Папки обходятся параллельно в listing_workers потоках, каждая папка -
+        постранично. Страницы передаются потребителю через ограниченную
+        очередь по мере загрузки, поэтому в памяти одновременно находится
+        лишь несколько страниц, каким бы большим ни было дерево.
+
+        Служебные папки сегментов и архивов не перебираются: файлы,
+        переданные сегментами или в архивах, перечисляются по сведениям
+        хранилища состояния после остальных файлов.
+
+        Yields:
+            FileInfo: информация об очередном файле или папке.
+        Raises:
+            SynchronizationError: если не удалось получить очередную страницу.
+        """
+        pages = queue.Queue(maxsize=self.listing_workers * 2)
+        stopped = threading.Event()
+        lock = threading.Lock()
+        pending = [1]
+        executor = ThreadPoolExecutor(
+            max_workers=self.listing_workers,
+            thread_name_prefix='listing',
         )
 
+        def put(page: Union[list, SynchronizationError, None]):
+            while not stopped.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def list_folder(folder: str):
+            try:
+                offset = 0
+                while not stopped.is_set():
+                    items = self._get_info_page(folder, offset)
+                    page = []
+                    for f in items:
+                        if not folder and f['name'] in (self.SEGMENTS_FOLDER, self.BUNDLES_FOLDER):
+                            continue
+                        info = self._make_file_info(folder, f)
+                        page.append(info)
+                        if info.is_dir and not stopped.is_set():
+                            with lock:
+                                pending[0] += 1
+                            executor.submit(list_folder, info.name)
+                    put(page)
+
+                    if len(items) < self.page_size:
+                        break
+                    offset += len(items)
+            except SynchronizationError as e:
+                put(e)
+            except RuntimeError:
+                # Обход прерван, новые папки уже не принимаются
+                pass
+            finally:
+                with lock:
+                    pending[0] -= 1
+                    is_last = pending[0] == 0
+                if is_last:
+                    put(None)
+
+        stored_files = {}
+        if self.state is not None:
+            for record in self.state.get_bundled_files() + self.state.get_segmented_files():
+                stored_files[record.name] = record
+
+        executor.submit(list_folder, '')
+        try:
+            while True:
+                page = pages.get()
+                if page is None:
+                    break
+                if isinstance(page, SynchronizationError):
+                    raise page
+                for info in page:
+                    # Целиком хранившаяся копия файла заменяется сегментами или архивом
+                    if info.name not in stored_files:
+                        yield info
+
+        finally:
+            stopped.set()
+            executor.shutdown(wait=False)
+
+        for record in stored_files.values():
+            yield file_utils.FileInfo(
+                name=record.name,
+                path=self._remote_path(record.name),
+                modified_at=datetime.datetime.fromtimestamp(
+                    record.modified_at,
+                    tz=datetime.timezone.utc,
+                ),
+                size=record.size,
+            )
+
+    @staticmethod
+    def _make_file_info(folder: str, item: dict) -> file_utils.FileInfo:
+        """ Создать информацию о файле по элементу списка содержимого папки. """
+        is_dir = item['type'] == 'dir'
+        return file_utils.FileInfo(
+            name='{folder}/{name}'.format(folder=folder, name=item['name']) if folder else item['name'],
+            path=item['path'],
+            modified_at=datetime.datetime.fromisoformat(item['modified']),
+            size=0 if is_dir else item['size'],
+            md5=item.get('md5'),
+            sha256=item.get('sha256'),
+            is_dir=is_dir,
+        )
+
+    def get_changes(self, since: datetime.datetime) -> Union[List[file_utils.FileInfo], None]:
+        """
+        Получить файлы папки синхронизации, загруженные в хранилище после since.
+
+        Используется лента последних загруженных файлов Я.Диска, поэтому
+        независимо от размера папки выполняется один запрос. Лента содержит
+        только загруженные файлы: удаления и перемещения в ней не видны.
+        Лента общая для всего хранилища, поэтому файлы других папок
+        и служебные папки сегментов и архивов отбрасываются.
+
+        Args:
+            since (datetime.datetime): момент, начиная с которого нужны изменения.
+        Returns:
+            List[FileInfo]: загруженные файлы. Или None, если в ленту из page_size
+                            файлов не поместились все загруженные после since.
+        Raises:
+            SynchronizationError: если получить ленту не удалось.
+        """
+        root_path = self._get_root_path()
+        items = self._get_last_uploaded()
+
+        if len(items) >= self.page_size and (
+            datetime.datetime.fromisoformat(items[-1]['modified']) >= since
+        ):
+            return
+
+        changes = []
+        for item in items:
+            if datetime.datetime.fromisoformat(item['modified']) < since:
+                continue
+
+            if not item['path'].startswith(root_path + '/'):
+                continue
+
+            name = item['path'][len(root_path) + 1:]
+            if name.split('/', 1)[0] in (self.SEGMENTS_FOLDER, self.BUNDLES_FOLDER):
+                continue
+
+            folder = name.rpartition('/')[0]
+            changes.append(self._make_file_info(folder, item))
+        return changes
+
+    def _get_root_path(self) -> str:
+        """
+        Получить полный путь папки синхронизации в том виде, в каком его возвращает API.
+
+        Raises:
+            SynchronizationError: если получить путь не удалось.
+        """
+        if self._root_path is not None:
+            return self._root_path
+
+        try:
+            response = self.session.get(
+                self.BASE_URL,
+                params={'path': self._remote_path(), 'limit': 0, 'fields': 'path'},
+                timeout=self.timeout,
+            )
+        except (ConnectionError, Timeout):
+            logger.error(
+                'Не удалось получить информацию о папке в удалённом хранилище. Ошибка соединения.',
+            )
+            raise SynchronizationError
+
+        if response.status_code != 200:
+            logger.error(
+                'Не удалось получить информацию о папке в удалённом хранилище. Причина: {error}.'.format(
+                    error=response.json().get('error'),
+                ),
+            )
+            raise SynchronizationError
+
+        self._root_path = response.json()['path']
+        return self._root_path
+
+    def _get_last_uploaded(self) -> List[dict]:
+        """
+        Получить ленту последних загруженных файлов, от новых к старым.
+
+        Raises:
+            SynchronizationError: если получить ленту не удалось.
+        """
+        try:
+            response = self.session.get(
+                self.BASE_URL + '/last-uploaded',
+                params={
+                    'limit': self.page_size,
+                    'fields': ','.join(
+                        'items.{field}'.format(field=field)
+                        for field in self.INFO_FIELDS
+                    ),
+                },
+                timeout=self.timeout,
+            )
+        except (ConnectionError, Timeout):
+            logger.error(
+                'Не удалось получить список изменений в удалённом хранилище. Ошибка соединения.',
+            )
+            raise SynchronizationError
+
+        if response.status_code != 200:
+            logger.error(
+                'Не удалось получить список изменений в удалённом хранилище. Причина: {error}.'.format(
+                    error=response.json().get('error'),
+                ),
+            )
+            raise SynchronizationError
+
+        return response.json().get('items', [])
+
+    def _get_info_page(self, folder: str, offset: int) -> List[dict]:
+        """
+        Получить страницу содержимого папки в хранилище.
+
+        Args:
+            folder (str): относительный путь папки, '' - корневая папка синхронизации.
+            offset (int): смещение от начала списка.
+        Returns:
+            List[dict]: элементы страницы.
+        Raises:
+            SynchronizationError: если получить страницу не удалось.
+        """
+        params = {
+            'path': self._remote_path(folder or None),
+            'limit': self.page_size,
+            'offset': offset,
+            'fields': ','.join(
+                '_embedded.items.{field}'.format(field=field)
+                for field in self.INFO_FIELDS
+            ),
+        }
+
         try:
-            response = requests.get(
-                url,
-                headers={'Authorization': self.oauth_token},
+            response = self.session.get(
+                self.BASE_URL,
+                params=params,
                 timeout=self.timeout,
+                operation='listing',
             )
         except ConnectionError:
             logger.error(
                 'Не удалось получить информацию об удалённом хранилище. Ошибка соединения.',
             )
-            return
+            raise SynchronizationError
         except Timeout:
             logger.error(
                 'Не удалось получить информацию об удалённом хранилище. Таймаут.',
             )
-            return
+            raise SynchronizationError
 
         if response.status_code == 401:
             logger.error(
                 'Не удалось получить информацию об удалённом хранилище. Недействительный oauth token.',
             )
-            return
+            raise SynchronizationError
 
-        if response.status_code == 404:
-            if self.create_remote_folder():
-                return self.get_info()
+        if response.status_code == 404 and offset == 0:
+            # Вложенная папка могла быть удалена во время обхода
+            if folder or self.create_remote_folder():
+                return []
 
         if response.status_code == 200:
-            return {
-                f['name']: file_utils.FileInfo(
-                    name=f['name'],
-                    path=f['path'],
-                    modified_at=datetime.datetime.fromisoformat(f['modified']),
-                    size=f['size'],
-                )
-                for f in response.json()['_embedded']['items']
-                if f['type'] == 'file'
-            }
+            return response.json().get('_embedded', {}).get('items', [])
 
         error = response.json().get('error')
         logger.error(
@@ -240,27 +1555,28 @@ class YandexSynchronizer(Synchronizer):
                 error=error
             ),
         )
+        raise SynchronizationError
 
     def get_upload_url(
             self,
             filename: str,
             overwrite: bool = False,
+            create_folders: bool = True,
     ) -> Union[str, None]:
-        """ Получить ссылку для загрузки файла. """
+        """
+        Получить ссылку для загрузки файла.
 
-        url = '{base_url}/upload{base_args}{folder}/{filename}'.format(
-            base_url=self.BASE_URL,
-            base_args=self.BASE_ARGS,
-            folder=self.remote_folder_name,
-            filename=filename,
-        )
+        Если папки, в которой должен находиться файл, нет в хранилище,
+        она создаётся вместе со всеми родительскими папками.
+        """
+        params = {'path': self._remote_path(filename)}
         if overwrite:
-            url += '&overwrite=true'
+            params['overwrite'] = 'true'
 
         try:
-            response = requests.get(
-                url,
-                headers={'Authorization': self.oauth_token},
+            response = self.session.get(
+                '{base_url}/upload'.format(base_url=self.BASE_URL),
+                params=params,
                 timeout=self.timeout,
             )
         except ConnectionError:
@@ -288,15 +1604,21 @@ class YandexSynchronizer(Synchronizer):
 
         # Согласно документации, при отсутствии указанной папки
         # должен возвращаться код 404, но на практике возвращается 409
-        if response.status_code == 404 or (
+        if create_folders and (response.status_code == 404 or (
             response.status_code == 409 and
             response.json()['error'] == 'DiskPathDoesntExistsError'
-        ):
-            if self.create_remote_folder():
-                return self.get_upload_url(filename, overwrite)
+        )):
+            if all(
+                self.create_remote_folder(folder)
+                for folder in [None] + file_utils.get_parent_names(filename)
+            ):
+                return self.get_upload_url(filename, overwrite, create_folders=False)
 
         if response.status_code == 200:
-            return response.json()['href']
+            link = response.json()
+            if link.get('operation_id'):
+                self._upload_operations[link['href']] = link['operation_id']
+            return link['href']
 
         error = response.json().get('error')
         logger.error(
@@ -307,32 +1629,34 @@ class YandexSynchronizer(Synchronizer):
             ),
         )
 
-    def create_remote_folder(self) -> bool:
-        """ Создать папку в удалённом хранилище. """
+    def create_remote_folder(self, name: Union[str, None] = None) -> bool:
+        """
+        Создать папку в удалённом хранилище.
 
-        url = '{base_url}{base_args}{folder}'.format(
-            base_url=self.BASE_URL,
-            base_args=self.BASE_ARGS,
-            folder=self.remote_folder_name,
-        )
+        Args:
+            name (str): относительный путь вложенной папки, по умолчанию - корневая папка синхронизации.
+        Returns:
+            bool: True, если папка создана или уже существует.
+        """
+        directory = self.remote_folder_name if name is None else name
 
         try:
-            response = requests.put(
-                url,
-                headers={'Authorization': self.oauth_token},
+            response = self.session.put(
+                self.BASE_URL,
+                params={'path': self._remote_path(name)},
                 timeout=self.timeout,
             )
         except ConnectionError:
             logger.error(
                 'Не удалось создать папку {directory} в удалённом хранилище. Ошибка соединения.'.format(
-                    directory=self.remote_folder_name,
+                    directory=directory,
                 ),
             )
             return False
         except Timeout:
             logger.error(
                 'Не удалось создать папку {directory} в удалённом хранилище. Таймаут.'.format(
-                    directory=self.remote_folder_name,
+                    directory=directory,
                 ),
             )
             return False
@@ -342,5 +1666,7 @@ class YandexSynchronizer(Synchronizer):
                 'Не удалось создать папку {directory} в удалённом хранилище. Недействительный oauth token.',
             )
 
-        return response.status_code == 201
+        if response.status_code == 409:
+            return response.json().get('error') == 'DiskPathPointsToExistentDirectoryError'
 
+        return response.status_code == 201
@@ -0,0 +1,50 @@
+""" Общие фикстуры тестов: имитация хранилища и синхронизатор, подключённый к ней. """
+import os
+from typing import Callable
+
+import pytest
+
+from synchronizer.yandex_synchronizer import YandexSynchronizer
+from tests.mock_disk import MockDisk
+from utils.sync_state import SyncState
+
+REMOTE_FOLDER = 'sync'
+
+
+@pytest.fixture
+def disk(monkeypatch) -> MockDisk:
+    """ Запущенная имитация хранилища, на которую указывает YandexSynchronizer.BASE_URL. """
+    with MockDisk() as disk:
+        monkeypatch.setattr(YandexSynchronizer, 'BASE_URL', disk.api_url)
+        yield disk
+
+
+@pytest.fixture
+def local_folder(tmp_path) -> str:
+    path = tmp_path / 'local'
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def state(tmp_path) -> SyncState:
+    return SyncState(str(tmp_path / 'state.db'))
+
+
+@pytest.fixture
+def make_synchronizer(disk, local_folder, state) -> Callable[..., YandexSynchronizer]:
+    """ Фабрика синхронизаторов папки local_folder с папкой хранилища REMOTE_FOLDER. """
+    def make(**kwargs) -> YandexSynchronizer:
+        kwargs.setdefault('state', state)
+        return YandexSynchronizer('token', local_folder, REMOTE_FOLDER, **kwargs)
+
+    return make
+
+
+def write_file(folder: str, name: str, content: bytes) -> str:
+    """ Создать файл с содержимым content и вернуть путь к нему. """
+    path = os.path.join(folder, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+    return path
@@ -0,0 +1,545 @@
+""" Имитация REST API Яндекс Диска для тестов и замеров производительности. """
+import datetime
+import hashlib
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Set, Tuple, Union
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+API_PREFIX = '/v1/disk'
+ROOT_PATH = 'disk:/Приложения/yadisk-sync'
+
+
+class Upload:
+    """ Вспомогательный класс, содержащий сведения о выданной ссылке для загрузки. """
+    path: str
+    received: bytearray
+    operation_id: str
+
+    def __init__(self, path: str, operation_id: str):
+        self.path = path
+        self.received = bytearray()
+        self.operation_id = operation_id
+
+
+class MockDisk:
+    """
+    Имитация хранилища, запускаемая в том же процессе.
+
+    Запросы к API принимает один HTTP-сервер, а передачу данных по ссылкам
+    загрузки и скачивания - другой, поэтому клиент отличает их по адресу,
+    как и при работе с настоящим хранилищем. Поддерживаются сведения о файлах
+    и постраничный список содержимого папок, создание папок, удаление,
+    перемещение и копирование, ссылки для загрузки и скачивания, лента
+    последних загруженных файлов, асинхронные операции с ответом 202
+    и загрузка фрагментами с заголовком Content-Range.
+
+    Для проверки поведения при сбоях можно задать задержку ответов API
+    (latency), ответы с заданным кодом (fail_requests) и обрыв соединения
+    посреди загрузки или скачивания (drop_uploads, drop_downloads).
+    Все запросы сохраняются в calls.
+
+    Пути хранятся без префикса app:/, корень приложения - пустая строка.
+    """
+    latency: float
+    supports_ranges: bool
+    async_operations: bool
+    operation_polls: int
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        supports_ranges: bool = True,
+        async_operations: bool = False,
+        operation_polls: int = 2,
+    ):
+        self.latency = latency
+        self.supports_ranges = supports_ranges
+        self.async_operations = async_operations
+        self.operation_polls = operation_polls
+        self.files: Dict[str, bytes] = {}
+        self.modified: Dict[str, str] = {}
+        self.folders: Set[str] = {''}
+        self.calls: List[Tuple[str, str, Dict[str, str]]] = []
+        self.uploaded_bytes = 0
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._uploads: Dict[str, Upload] = {}
+        self._operations: Dict[str, List] = {}
+        self._failures: List[Tuple[str, str, int, Union[float, None]]] = []
+        self._drops: List[int] = []
+        self._download_drops: List[int] = []
+        self._servers: List[ThreadingHTTPServer] = []
+
+    def start(self) -> 'MockDisk':
+        """ Запустить серверы API и передачи данных на свободных портах. """
+        for handler in (self._make_handler(is_api=True), self._make_handler(is_api=False)):
+            server = _Server(('127.0.0.1', 0), handler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        return self
+
+    def stop(self):
+        """ Остановить серверы. """
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def __enter__(self) -> 'MockDisk':
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def api_url(self) -> str:
+        """ Адрес ресурсов API, который подставляется в YandexSynchronizer.BASE_URL. """
+        return 'http://127.0.0.1:{port}{prefix}/resources'.format(
+            port=self._servers[0].server_address[1],
+            prefix=API_PREFIX,
+        )
+
+    @property
+    def transfer_url(self) -> str:
+        return 'http://127.0.0.1:{port}'.format(port=self._servers[1].server_address[1])
+
+    def put_file(self, path: str, content: bytes, modified: Union[datetime.datetime, None] = None):
+        """ Положить файл в хранилище, создав недостающие папки. """
+        with self._lock:
+            parts = path.split('/')
+            for depth in range(1, len(parts)):
+                self.folders.add('/'.join(parts[:depth]))
+            self.files[path] = content
+            self.modified[path] = (modified or _now()).isoformat()
+
+    def fail_requests(
+        self,
+        status: int,
+        count: int = 1,
+        endpoint: str = '',
+        retry_after: Union[float, None] = None,
+        path: str = '',
+    ):
+        """
+        Ответить кодом status на следующие count запросов к API.
+
+        Args:
+            status (int): код ответа, например 429 или 503.
+            count (int): количество запросов.
+            endpoint (str): начало пути метода API после /v1/disk, например /resources/upload.
+                            По умолчанию - любой метод.
+            retry_after (float): значение заголовка Retry-After в секундах.
+            path (str): окончание параметра path запроса, например manifest.json.
+                        По умолчанию - любой путь.
+        """
+        with self._lock:
+            self._failures.extend([(endpoint, path, status, retry_after)] * count)
+
+    def drop_uploads(self, after_bytes: int, count: int = 1):
+        """ Обрывать соединение после приёма after_bytes байт в следующих count загрузках. """
+        with self._lock:
+            self._drops.extend([after_bytes] * count)
+
+    def drop_downloads(self, after_bytes: int, count: int = 1):
+        """ Обрывать соединение после отправки after_bytes байт в следующих count скачиваниях. """
+        with self._lock:
+            self._download_drops.extend([after_bytes] * count)
+
+    def count_calls(self, method: Union[str, None] = None, endpoint: Union[str, None] = None) -> int:
+        """ Подсчитать запросы с указанным методом и путём метода API. """
+        with self._lock:
+            return sum(
+                1 for call_method, call_endpoint, _ in self.calls
+                if (method is None or call_method == method) and
+                (endpoint is None or call_endpoint == endpoint)
+            )
+
+    def _make_handler(self, is_api: bool) -> type:
+        disk = self
+
+        class Handler(_Handler):
+            pass
+
+        Handler.disk = disk
+        Handler.is_api = is_api
+        return Handler
+
+    # Методы API. Каждый возвращает код, тело ответа и дополнительные заголовки.
+
+    def _get_resource(self, params: Dict[str, str]) -> tuple:
+        path = _normalize(params['path'])
+        if path in self.files:
+            return 200, self._describe(path), {}
+        if path not in self.folders:
+            return 404, {'error': 'DiskNotFoundError'}, {}
+
+        children = sorted(
+            name for name in itertools.chain(self.files, self.folders)
+            if name and name.rpartition('/')[0] == path
+        )
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 20))
+        body = self._describe(path)
+        body['_embedded'] = {
+            'items': [self._describe(name) for name in children[offset:offset + limit]],
+            'limit': limit,
+            'offset': offset,
+            'total': len(children),
+            'path': body['path'],
+        }
+        return 200, body, {}
+
+    def _create_folder(self, params: Dict[str, str]) -> tuple:
+        path = _normalize(params['path'])
+        if path in self.folders:
+            return 409, {'error': 'DiskPathPointsToExistentDirectoryError'}, {}
+        if path.rpartition('/')[0] not in self.folders:
+            return 409, {'error': 'DiskPathDoesntExistsError'}, {}
+        self.folders.add(path)
+        return 201, {'href': '', 'method': 'GET'}, {}
+
+    def _delete(self, params: Dict[str, str]) -> tuple:
+        path = _normalize(params['path'])
+        if path not in self.files and path not in self.folders:
+            return 404, {'error': 'DiskNotFoundError'}, {}
+        return self._run(lambda: self._remove_tree(path), 204)
+
+    def _relocate(self, params: Dict[str, str], keep_source: bool) -> tuple:
+        source = _normalize(params['from'])
+        target = _normalize(params['path'])
+        if source not in self.files and source not in self.folders:
+            return 404, {'error': 'DiskNotFoundError'}, {}
+        if target.rpartition('/')[0] not in self.folders:
+            return 409, {'error': 'DiskPathDoesntExistsError'}, {}
+        if (target in self.files or target in self.folders) and params.get('overwrite') != 'true':
+            return 409, {'error': 'DiskResourceAlreadyExistsError'}, {}
+
+        def relocate():
+            for name in [name for name in self.files if _is_within(name, source)]:
+                new_name = target + name[len(source):]
+                self.files[new_name] = self.files[name]
+                self.modified[new_name] = self.modified[name]
+            for name in [name for name in self.folders if _is_within(name, source)]:
+                self.folders.add(target + name[len(source):])
+            if not keep_source:
+                self._remove_tree(source)
+
+        return self._run(relocate, 201)
+
+    def _get_upload_link(self, params: Dict[str, str]) -> tuple:
+        path = _normalize(params['path'])
+        if path.rpartition('/')[0] not in self.folders:
+            return 409, {'error': 'DiskPathDoesntExistsError'}, {}
+        if path in self.files and params.get('overwrite') != 'true':
+            return 409, {'error': 'DiskResourceAlreadyExistsError'}, {}
+
+        upload_id = str(next(self._ids))
+        operation_id = 'upload-' + upload_id
+        self._uploads[upload_id] = Upload(path, operation_id)
+        return 200, {
+            'href': '{url}/upload/{id}'.format(url=self.transfer_url, id=upload_id),
+            'method': 'PUT',
+            'operation_id': operation_id,
+        }, {}
+
+    def _get_download_link(self, params: Dict[str, str]) -> tuple:
+        path = _normalize(params['path'])
+        if path not in self.files:
+            return 404, {'error': 'DiskNotFoundError'}, {}
+        return 200, {
+            'href': '{url}/download/{path}'.format(url=self.transfer_url, path=quote(path)),
+            'method': 'GET',
+        }, {}
+
+    def _get_last_uploaded(self, params: Dict[str, str]) -> tuple:
+        limit = int(params.get('limit', 20))
+        names = sorted(self.files, key=lambda name: self.modified[name], reverse=True)
+        return 200, {'items': [self._describe(name) for name in names[:limit]], 'limit': limit}, {}
+
+    def _get_operation(self, operation_id: str) -> tuple:
+        operation = self._operations.get(operation_id)
+        if operation is None:
+            return 404, {'error': 'DiskNotFoundError'}, {}
+        if operation[0] > 0:
+            operation[0] -= 1
+            return 200, {'status': 'in-progress'}, {}
+        if operation[1] is not None:
+            operation[1]()
+            operation[1] = None
+        return 200, {'status': 'success'}, {}
+
+    def _run(self, action: Callable[[], None], status: int) -> tuple:
+        """ Выполнить изменение сразу или, если включены асинхронные операции, после опроса статуса. """
+        if not self.async_operations:
+            action()
+            return status, {} if status != 204 else None, {}
+
+        operation_id = str(next(self._ids))
+        self._operations[operation_id] = [self.operation_polls, action]
+        return 202, {
+            'href': '{api}/operations/{id}'.format(api=self.api_url.rsplit('/', 1)[0], id=operation_id),
+            'method': 'GET',
+        }, {}
+
+    def _remove_tree(self, path: str):
+        for name in [name for name in self.files if _is_within(name, path)]:
+            del self.files[name]
+            del self.modified[name]
+        self.folders.difference_update([name for name in self.folders if _is_within(name, path)])
+        self.folders.add('')
+
+    def _describe(self, path: str) -> dict:
+        full_path = ROOT_PATH + ('/' + path if path else '')
+        name = path.rpartition('/')[2]
+        if path in self.folders:
+            return {
+                'name': name,
+                'path': full_path,
+                'type': 'dir',
+                'modified': '2020-01-01T00:00:00+00:00',
+            }
+
+        content = self.files[path]
+        return {
+            'name': name,
+            'path': full_path,
+            'type': 'file',
+            'modified': self.modified[path],
+            'size': len(content),
+            'md5': hashlib.md5(content).hexdigest(),
+            'sha256': hashlib.sha256(content).hexdigest(),
+        }
+
+    def _take_failure(self, endpoint: str, path: str) -> Union[Tuple[int, Union[float, None]], None]:
+        for i, (prefix, suffix, status, retry_after) in enumerate(self._failures):
+            if endpoint.startswith(prefix) and path.endswith(suffix):
+                del self._failures[i]
+                return status, retry_after
+
+    def _take_drop(self) -> Union[int, None]:
+        if self._drops:
+            return self._drops.pop(0)
+
+    def _receive_upload(self, upload_id: str, data: bytes, content_range: Union[str, None]) -> tuple:
+        """ Принять данные загрузки целиком или фрагментом. """
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            return 404, {'error': 'DiskNotFoundError'}, {}
+        if content_range and not self.supports_ranges:
+            return 501, {'error': 'NotImplemented'}, {}
+
+        total = len(data)
+        if content_range:
+            span, _, total = content_range.split(' ', 1)[1].partition('/')
+            start = int(span.split('-', 1)[0])
+            total = int(total)
+            if start != len(upload.received):
+                return 416, {'error': 'RangeNotSatisfiable'}, {}
+        upload.received += data
+        self.uploaded_bytes += len(data)
+        if len(upload.received) < total:
+            return 308, None, {'Range': 'bytes=0-{end}'.format(end=len(upload.received) - 1)}
+
+        del self._uploads[upload_id]
+        path, content = upload.path, bytes(upload.received)
+
+        def store():
+            self.files[path] = content
+            self.modified[path] = _now().isoformat()
+
+        if self.async_operations and not content_range:
+            self._operations[upload.operation_id] = [self.operation_polls, store]
+            return 202, None, {}
+        store()
+        return 201, None, {}
+
+
+class _Server(ThreadingHTTPServer):
+    """ Сервер, не выводящий в журнал обрывы соединений клиентом. """
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """ Обработчик запросов к MockDisk. """
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело ответа отправляются отдельно: с алгоритмом Нейгла
+    # и отложенным подтверждением каждый ответ задерживался бы на ~40 мс
+    disable_nagle_algorithm = True
+    disk: MockDisk
+    is_api: bool
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_HEAD(self):
+        self._handle('HEAD')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _handle(self, method: str):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        endpoint = url.path[len(API_PREFIX):] if self.is_api else url.path.rsplit('/', 1)[0]
+        disk = self.disk
+        with disk._lock:
+            disk.calls.append((method, endpoint, params))
+
+        if not self.is_api:
+            self._handle_transfer(method, url.path)
+            return
+
+        if disk.latency:
+            time.sleep(disk.latency)
+        self._read_body()
+        with disk._lock:
+            failure = disk._take_failure(endpoint, params.get('path', ''))
+            if failure is not None:
+                status, retry_after = failure
+                headers = {} if retry_after is None else {'Retry-After': str(retry_after)}
+                self._respond(status, {'error': 'Injected'}, headers)
+                return
+
+            route = {
+                ('GET', '/resources'): lambda: disk._get_resource(params),
+                ('PUT', '/resources'): lambda: disk._create_folder(params),
+                ('DELETE', '/resources'): lambda: disk._delete(params),
+                ('POST', '/resources/move'): lambda: disk._relocate(params, keep_source=False),
+                ('POST', '/resources/copy'): lambda: disk._relocate(params, keep_source=True),
+                ('GET', '/resources/upload'): lambda: disk._get_upload_link(params),
+                ('GET', '/resources/download'): lambda: disk._get_download_link(params),
+                ('GET', '/resources/last-uploaded'): lambda: disk._get_last_uploaded(params),
+            }.get((method, endpoint))
+            if route is None and method == 'GET' and endpoint.startswith('/operations/'):
+                route = lambda: disk._get_operation(endpoint.rsplit('/', 1)[1])  # noqa: E731
+            if route is None:
+                self._respond(404, {'error': 'NotFound'})
+                return
+            self._respond(*route())
+
+    def _handle_transfer(self, method: str, path: str):
+        disk = self.disk
+        kind, _, key = path.lstrip('/').partition('/')
+        if kind == 'download' and method == 'GET':
+            with disk._lock:
+                content = disk.files.get(unquote(key))
+                drop_after = disk._download_drops.pop(0) if disk._download_drops else None
+            if content is None:
+                self._respond(404, {'error': 'DiskNotFoundError'})
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            if drop_after is None:
+                self.wfile.write(content)
+                return
+            self.wfile.write(content[:drop_after])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.close()
+            return
+
+        if kind != 'upload':
+            self._respond(404, {'error': 'NotFound'})
+            return
+
+        if method == 'HEAD':
+            with disk._lock:
+                upload = disk._uploads.get(key)
+                received = len(upload.received) if upload is not None else 0
+            if upload is None:
+                self._respond(404, None)
+                return
+            headers = {}
+            if disk.supports_ranges:
+                headers['Accept-Ranges'] = 'bytes'
+                if received:
+                    headers['Range'] = 'bytes=0-{end}'.format(end=received - 1)
+            self._respond(200, None, headers)
+            return
+
+        with disk._lock:
+            drop_after = disk._take_drop()
+        body, is_complete = self._read_body(drop_after)
+        content_range = self.headers.get('Content-Range')
+        with disk._lock:
+            if is_complete:
+                self._respond(*disk._receive_upload(key, body, content_range))
+                return
+            # Соединение оборвано посреди тела запроса, принятая часть фрагмента сохраняется
+            if content_range:
+                disk._receive_upload(key, body, content_range)
+        self.close_connection = True
+        self.connection.close()
+
+    def _read_body(self, drop_after: Union[int, None] = None) -> Tuple[bytes, bool]:
+        """
+        Прочитать тело запроса.
+
+        Args:
+            drop_after (int): оборвать соединение после приёма указанного количества байт.
+        Returns:
+            Tuple[bytes, bool]: принятые данные и признак того, что тело принято целиком.
+        """
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            body = bytearray()
+            while True:
+                length = int(self.rfile.readline().strip(), 16)
+                if not length:
+                    self.rfile.readline()
+                    return bytes(body), True
+                if drop_after is not None and len(body) + length > drop_after:
+                    body += self.rfile.read(drop_after - len(body))
+                    return bytes(body), False
+                body += self.rfile.read(length)
+                self.rfile.readline()
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if drop_after is not None and length > drop_after:
+            return self.rfile.read(drop_after), False
+        return self.rfile.read(length), True
+
+    def _respond(self, status: int, body: Union[dict, None], headers: Union[Dict[str, str], None] = None):
+        data = b'' if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+
+def _normalize(path: str) -> str:
+    """ Получить путь без префикса app:/ и завершающей косой черты. """
+    if path.startswith('app:/'):
+        path = path[len('app:/'):]
+    return path.strip('/')
+
+
+def _is_within(name: str, folder: str) -> bool:
+    return name == folder or name.startswith(folder + '/')
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
@@ -0,0 +1,109 @@
+""" Тесты расписания скорости передачи данных и приостановки передачи. """
+import datetime
+import os
+import threading
+import time
+
+from file_monitor.file_monitor import FileMonitor
+from synchronizer.transfer_scheduler import TransferScheduler
+from tests.conftest import REMOTE_FOLDER, write_file
+from utils.bandwidth_limiter import BandwidthLimiter
+
+PAUSED_AT = datetime.datetime(2024, 1, 1, 12, 30)
+RESUMED_AT = datetime.datetime(2024, 1, 1, 14, 0)
+
+
+class Clock:
+    """ Часы, время которых задаётся тестом. """
+    def __init__(self, now: datetime.datetime):
+        self.now = now
+
+    def __call__(self) -> datetime.datetime:
+        return self.now
+
+
+def make_monitor(local_folder, make_synchronizer, state, bandwidth: BandwidthLimiter) -> FileMonitor:
+    synchronizer = make_synchronizer(bandwidth=bandwidth)
+    scheduler = TransferScheduler(2, bandwidth=bandwidth)
+    return FileMonitor(local_folder, 1, synchronizer, state=state, scheduler=scheduler)
+
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def test_parse_schedule():
+    windows = BandwidthLimiter.parse_schedule('09:00-18:00=512, 23:00-07:00=pause')
+
+    assert [(window.start, window.end, window.rate) for window in windows] == [
+        (datetime.time(9), datetime.time(18), 512 * 1024),
+        (datetime.time(23), datetime.time(7), None),
+    ]
+    assert windows[1].contains(datetime.time(3))
+    assert not windows[1].contains(datetime.time(8))
+
+
+def test_upload_rate_stays_within_limit(disk, local_folder, make_synchronizer):
+    rate = 256 * 1024
+    content = os.urandom(3 * rate)
+    path = write_file(local_folder, 'big.bin', content)
+    synchronizer = make_synchronizer(bandwidth=BandwidthLimiter(rate), chunk_size=32 * 1024)
+
+    started_at = time.monotonic()
+    assert synchronizer.upload(path)
+    elapsed = time.monotonic() - started_at
+
+    assert disk.files[REMOTE_FOLDER + '/big.bin'] == content
+    # Без передачи может накопиться не больше, чем разрешено за одну секунду
+    burst = rate
+    assert elapsed >= (len(content) - burst) / rate
+
+
+def test_pause_holds_uploads_but_not_deletions(disk, local_folder, make_synchronizer, state):
+    clock = Clock(RESUMED_AT)
+    bandwidth = BandwidthLimiter(windows=BandwidthLimiter.parse_schedule('12:00-13:00=pause'), clock=clock)
+    monitor = make_monitor(local_folder, make_synchronizer, state, bandwidth)
+    write_file(local_folder, 'old.txt', b'old')
+    monitor.perform_synchronization()
+
+    clock.now = PAUSED_AT
+    os.remove(os.path.join(local_folder, 'old.txt'))
+    write_file(local_folder, 'new.txt', b'new')
+    thread = threading.Thread(target=monitor.perform_synchronization, daemon=True)
+    thread.start()
+
+    assert wait_for(lambda: REMOTE_FOLDER + '/old.txt' not in disk.files)
+    thread.join(1)
+    assert thread.is_alive()
+    assert REMOTE_FOLDER + '/new.txt' not in disk.files
+
+    clock.now = RESUMED_AT
+    thread.join(10)
+    assert not thread.is_alive()
+    assert disk.files == {REMOTE_FOLDER + '/new.txt': b'new'}
+
+
+def test_pause_lets_started_upload_finish(disk, local_folder, make_synchronizer, state):
+    clock = Clock(RESUMED_AT)
+    bandwidth = BandwidthLimiter(
+        rate=512 * 1024,
+        windows=BandwidthLimiter.parse_schedule('12:00-13:00=pause'),
+        clock=clock,
+    )
+    monitor = make_monitor(local_folder, make_synchronizer, state, bandwidth)
+    content = os.urandom(1024 * 1024)
+    write_file(local_folder, 'big.bin', content)
+    thread = threading.Thread(target=monitor.perform_synchronization, daemon=True)
+    thread.start()
+
+    assert wait_for(lambda: disk.count_calls('PUT', '/upload'))
+    clock.now = PAUSED_AT
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert disk.files[REMOTE_FOLDER + '/big.bin'] == content
@@ -0,0 +1,58 @@
+""" Тесты обнаружения переименованных локально файлов. """
+import datetime
+import os
+
+import pytest
+
+from file_monitor.file_monitor import FileMonitor
+from tests.conftest import REMOTE_FOLDER, write_file
+from utils.file_utils import FileInfo
+from utils.sync_state import SyncRecord
+
+
+@pytest.fixture(params=[FileMonitor.COMPARE_BY_MTIME, FileMonitor.COMPARE_BY_HASH])
+def monitor(request, local_folder, make_synchronizer, state) -> FileMonitor:
+    return FileMonitor(local_folder, 1, make_synchronizer(), state=state, compare_mode=request.param)
+
+
+@pytest.mark.parametrize('is_listed', [False, True], ids=['state', 'listing'])
+def test_renamed_file_is_moved_remotely(disk, local_folder, monitor, state, is_listed):
+    content = os.urandom(1000)
+    write_file(local_folder, 'a.bin', content)
+    write_file(local_folder, 'b.bin', os.urandom(1000))
+    monitor.perform_synchronization()
+    upload_links = disk.count_calls('GET', '/resources/upload')
+
+    os.rename(os.path.join(local_folder, 'a.bin'), os.path.join(local_folder, 'c.bin'))
+    if is_listed:
+        state.invalidate()
+    monitor.perform_synchronization()
+
+    assert disk.count_calls('POST', '/resources/move') == 1
+    assert disk.count_calls('GET', '/resources/upload') == upload_links
+    assert disk.files[REMOTE_FOLDER + '/c.bin'] == content
+    assert REMOTE_FOLDER + '/a.bin' not in disk.files
+
+
+def test_new_file_of_same_size_is_uploaded(disk, local_folder, monitor):
+    write_file(local_folder, 'a.bin', b'A' * 1000)
+    monitor.perform_synchronization()
+
+    os.remove(os.path.join(local_folder, 'a.bin'))
+    # Файловая система может сразу отдать освободившийся inode новому файлу
+    write_file(local_folder, 'b.bin', b'B' * 1000)
+    monitor.perform_synchronization()
+
+    assert disk.count_calls('POST', '/resources/move') == 0
+    assert disk.files == {REMOTE_FOLDER + '/b.bin': b'B' * 1000}
+
+
+def test_reused_inode_alone_is_not_a_move(local_folder, make_synchronizer):
+    monitor = FileMonitor(local_folder, 1, make_synchronizer())
+    modified_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    record = SyncRecord('a.bin', 1000, modified_at.timestamp(), inode=42)
+    new_file = FileInfo('b.bin', 'b.bin', modified_at + datetime.timedelta(seconds=5), 1000, inode=42)
+    renamed_file = FileInfo('c.bin', 'c.bin', modified_at, 1000, inode=42)
+
+    assert monitor._find_moves([record], {'b.bin': new_file}) == []
+    assert monitor._find_moves([record], {'c.bin': renamed_file}) == [(record, renamed_file)]
@@ -0,0 +1,64 @@
+""" Тесты передачи больших файлов с продолжением с места обрыва. """
+import os
+
+from synchronizer.retry_policy import RetryPolicy
+from tests.conftest import REMOTE_FOLDER, write_file
+
+CHUNK_SIZE = 256 * 1024
+
+
+def make_resumable(make_synchronizer, attempts: int = 5):
+    synchronizer = make_synchronizer(resumable_threshold=1, resumable_chunk_size=CHUNK_SIZE)
+    synchronizer.session.retry_policy = RetryPolicy(attempts=attempts, backoff=0.01)
+    return synchronizer
+
+
+def get_range_puts(disk) -> int:
+    return sum(
+        1 for method, endpoint, _ in disk.calls
+        if method == 'PUT' and endpoint == '/upload'
+    )
+
+
+def test_upload_resumes_from_confirmed_offset(disk, local_folder, make_synchronizer):
+    content = os.urandom(4 * CHUNK_SIZE + 100)
+    path = write_file(local_folder, 'big.bin', content)
+    disk.drop_uploads(after_bytes=CHUNK_SIZE // 2)
+
+    assert make_resumable(make_synchronizer).upload(path)
+
+    assert disk.files[REMOTE_FOLDER + '/big.bin'] == content
+    # Повторно передаётся только неподтверждённая часть фрагмента
+    assert disk.uploaded_bytes == len(content)
+    assert get_range_puts(disk) == 5
+
+
+def test_interrupted_upload_continues_in_next_synchronization(disk, local_folder, make_synchronizer, state):
+    content = os.urandom(4 * CHUNK_SIZE)
+    path = write_file(local_folder, 'big.bin', content)
+    disk.drop_uploads(after_bytes=CHUNK_SIZE // 2, count=2)
+
+    assert not make_resumable(make_synchronizer, attempts=2).upload(path)
+    checkpoint = state.get_checkpoint('big.bin')
+    assert checkpoint is not None
+    assert checkpoint.offset == CHUNK_SIZE // 2
+    upload_links = disk.count_calls('GET', '/resources/upload')
+
+    assert make_resumable(make_synchronizer).upload(path)
+
+    assert disk.files[REMOTE_FOLDER + '/big.bin'] == content
+    assert disk.count_calls('GET', '/resources/upload') == upload_links
+    assert disk.uploaded_bytes == len(content)
+    assert state.get_checkpoint('big.bin') is None
+
+
+def test_upload_without_range_support_sends_whole_file(disk, local_folder, make_synchronizer, state):
+    disk.supports_ranges = False
+    content = os.urandom(2 * CHUNK_SIZE)
+    path = write_file(local_folder, 'big.bin', content)
+
+    assert make_resumable(make_synchronizer).upload(path)
+
+    assert disk.files[REMOTE_FOLDER + '/big.bin'] == content
+    assert get_range_puts(disk) == 1
+    assert state.get_checkpoint('big.bin') is None
@@ -0,0 +1,64 @@
+""" Тесты передачи больших файлов сегментами. """
+import os
+
+from tests.conftest import REMOTE_FOLDER, write_file
+
+SEGMENT_SIZE = 64 * 1024
+SEGMENTS_FOLDER = REMOTE_FOLDER + '/.yadisk-segments/big.bin/'
+MANIFEST = SEGMENTS_FOLDER + 'manifest.json'
+
+
+def make_segmented(make_synchronizer):
+    return make_synchronizer(segment_threshold=2 * SEGMENT_SIZE, segment_size=SEGMENT_SIZE)
+
+
+def get_segments(disk) -> bytes:
+    names = sorted(name for name in disk.files if name.startswith(SEGMENTS_FOLDER) and name != MANIFEST)
+    return b''.join(disk.files[name] for name in names)
+
+
+def append(path: str, content: bytes):
+    with open(path, 'ab') as file:
+        file.write(content)
+
+
+def test_appended_file_sends_only_last_segment(disk, local_folder, make_synchronizer):
+    content = os.urandom(3 * SEGMENT_SIZE + 1000)
+    path = write_file(local_folder, 'big.bin', content)
+    synchronizer = make_segmented(make_synchronizer)
+    assert synchronizer.upload(path)
+    assert get_segments(disk) == content
+    uploaded_bytes = disk.uploaded_bytes
+
+    appended = os.urandom(2000)
+    append(path, appended)
+    assert synchronizer.update(path)
+
+    assert get_segments(disk) == content + appended
+    # Передаётся только последний неполный сегмент с дописанными данными
+    assert disk.uploaded_bytes - uploaded_bytes < 1000 + 2000 + 1024
+    assert REMOTE_FOLDER + '/big.bin' not in disk.files
+
+
+def test_whole_file_is_replaced_by_segments_after_manifest(disk, local_folder, make_synchronizer):
+    content = os.urandom(SEGMENT_SIZE)
+    path = write_file(local_folder, 'big.bin', content)
+    synchronizer = make_segmented(make_synchronizer)
+    assert synchronizer.upload(path)
+    assert disk.files[REMOTE_FOLDER + '/big.bin'] == content
+
+    append(path, os.urandom(2 * SEGMENT_SIZE))
+    disk.fail_requests(403, endpoint='/resources/upload', path='manifest.json')
+    assert not synchronizer.update(path)
+
+    # Без манифеста сегменты не заменяют файл, хранившийся целиком
+    assert disk.files[REMOTE_FOLDER + '/big.bin'] == content
+    assert MANIFEST not in disk.files
+
+    with open(path, 'rb') as file:
+        content = file.read()
+    assert synchronizer.update(path)
+
+    assert REMOTE_FOLDER + '/big.bin' not in disk.files
+    assert MANIFEST in disk.files
+    assert get_segments(disk) == content
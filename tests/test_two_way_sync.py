@@ -0,0 +1,118 @@
+""" Тесты двусторонней синхронизации: удаление и замена локальных файлов. """
+import datetime
+import os
+
+import pytest
+
+from file_monitor.file_monitor import FileMonitor
+from tests.conftest import REMOTE_FOLDER, write_file
+from utils import file_utils
+
+
+@pytest.fixture
+def monitor(local_folder, make_synchronizer, state) -> FileMonitor:
+    # Полная сверка в каждом цикле: изменения в хранилище видны сразу
+    return FileMonitor(
+        local_folder,
+        1,
+        make_synchronizer(),
+        state=state,
+        direction=FileMonitor.DIRECTION_BOTH,
+        listing_interval=0,
+    )
+
+
+def read_file(folder: str, name: str) -> bytes:
+    with open(os.path.join(folder, name), 'rb') as file:
+        return file.read()
+
+
+def list_local(folder: str):
+    return sorted(os.listdir(folder))
+
+
+def get_conflict_copies(folder: str):
+    return [name for name in os.listdir(folder) if '(conflict ' in name]
+
+
+def test_remote_delete_removes_local_file(disk, local_folder, monitor):
+    write_file(local_folder, 'a.txt', b'a')
+    write_file(local_folder, 'b.txt', b'b')
+    monitor.perform_synchronization()
+
+    del disk.files[REMOTE_FOLDER + '/a.txt']
+    monitor.perform_synchronization()
+
+    assert list_local(local_folder) == ['b.txt']
+    assert sorted(disk.files) == [REMOTE_FOLDER + '/b.txt']
+
+
+def test_empty_remote_folder_does_not_wipe_local_files(disk, local_folder, monitor):
+    write_file(local_folder, 'a.txt', b'a')
+    write_file(local_folder, 'docs/b.txt', b'b')
+    monitor.perform_synchronization()
+
+    disk.files.clear()
+    disk.folders.intersection_update({'', REMOTE_FOLDER})
+    monitor.perform_synchronization()
+
+    assert read_file(local_folder, 'a.txt') == b'a'
+    assert read_file(local_folder, 'docs/b.txt') == b'b'
+    assert disk.files == {
+        REMOTE_FOLDER + '/a.txt': b'a',
+        REMOTE_FOLDER + '/docs/b.txt': b'b',
+    }
+
+
+def test_change_on_both_sides_keeps_conflict_copy(disk, local_folder, monitor):
+    write_file(local_folder, 'a.txt', b'original')
+    monitor.perform_synchronization()
+
+    write_file(local_folder, 'a.txt', b'local version')
+    disk.put_file(REMOTE_FOLDER + '/a.txt', b'remote version')
+    monitor.perform_synchronization()
+
+    assert read_file(local_folder, 'a.txt') == b'remote version'
+    copies = get_conflict_copies(local_folder)
+    assert len(copies) == 1
+    assert read_file(local_folder, copies[0]) == b'local version'
+    assert disk.files[REMOTE_FOLDER + '/a.txt'] == b'remote version'
+    assert disk.files[REMOTE_FOLDER + '/' + copies[0]] == b'local version'
+
+
+def test_failed_download_keeps_local_file(disk, local_folder, monitor):
+    write_file(local_folder, 'a.txt', b'original')
+    monitor.perform_synchronization()
+
+    disk.put_file(REMOTE_FOLDER + '/a.txt', b'remote version, longer')
+    disk.drop_downloads(after_bytes=5)
+    monitor.perform_synchronization()
+
+    assert read_file(local_folder, 'a.txt') == b'original'
+    assert list_local(local_folder) == ['a.txt']
+
+    monitor.perform_synchronization()
+
+    assert read_file(local_folder, 'a.txt') == b'remote version, longer'
+    assert not any(name.endswith(file_utils.DOWNLOAD_SUFFIX) for name in os.listdir(local_folder))
+
+
+def test_first_run_compares_content_of_files_of_same_size(disk, local_folder, monitor):
+    modified = datetime.datetime.now(datetime.timezone.utc)
+    disk.put_file(REMOTE_FOLDER + '/same.txt', b'same', modified)
+    disk.put_file(REMOTE_FOLDER + '/differs.txt', b'BBBB', modified)
+    for name, content in (('same.txt', b'same'), ('differs.txt', b'AAAA')):
+        path = write_file(local_folder, name, content)
+        timestamp = (modified - datetime.timedelta(hours=1)).timestamp()
+        os.utime(path, (timestamp, timestamp))
+
+    monitor.perform_synchronization()
+
+    assert read_file(local_folder, 'same.txt') == b'same'
+    assert read_file(local_folder, 'differs.txt') == b'BBBB'
+    copies = get_conflict_copies(local_folder)
+    assert len(copies) == 1
+    assert copies[0].startswith('differs (conflict ')
+    assert read_file(local_folder, copies[0]) == b'AAAA'
+    assert disk.files[REMOTE_FOLDER + '/' + copies[0]] == b'AAAA'
+    assert disk.count_calls('GET', '/resources/upload') == 1
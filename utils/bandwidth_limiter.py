@@ -0,0 +1,133 @@
+""" Ограничение скорости передачи данных с расписанием по времени суток. """
+import datetime
+import threading
+import time
+from typing import Callable, List, Union
+
+
+class BandwidthWindow:
+    """ Вспомогательный класс, содержащий ограничение скорости на интервал времени суток. """
+    start: datetime.time
+    end: datetime.time
+    rate: Union[int, None]
+
+    def __init__(self, start: datetime.time, end: datetime.time, rate: Union[int, None]):
+        self.start = start
+        self.end = end
+        self.rate = rate
+
+    def contains(self, moment: datetime.time) -> bool:
+        """ Проверить, попадает ли время в интервал. Интервал может переходить через полночь. """
+        if self.start <= self.end:
+            return self.start <= moment < self.end
+        return moment >= self.start or moment < self.end
+
+    def __str__(self):
+        return f'{self.start:%H:%M}-{self.end:%H:%M}={self.rate}'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class BandwidthLimiter:
+    """
+    Ограничитель суммарной скорости передачи данных.
+
+    Ограничение общее для всех одновременных передач. Скорость задаётся
+    в байтах в секунду: rate действует вне интервалов windows, а внутри
+    интервала - скорость интервала. Скорость 0 означает отсутствие
+    ограничения, None в интервале - приостановку передачи данных.
+
+    Приостановка действует только между операциями: планировщик не запускает
+    новые передачи, а уже начатые завершаются со скоростью rate. Иначе
+    передача останавливалась бы посреди тела запроса, занимая поток
+    и соединение до конца интервала и рискуя превысить таймаут сервера.
+    """
+    PAUSE = 'pause'
+
+    rate: int
+    windows: List[BandwidthWindow]
+
+    def __init__(
+        self,
+        rate: int = 0,
+        windows: Union[List[BandwidthWindow], None] = None,
+        clock: Callable[[], datetime.datetime] = datetime.datetime.now,
+    ):
+        self.rate = rate
+        self.windows = windows or []
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._updated_at = time.monotonic()
+
+    @property
+    def current_rate(self) -> Union[int, None]:
+        """ Действующее ограничение скорости: байт в секунду, 0 - без ограничения, None - пауза. """
+        moment = self._clock().time()
+        for window in self.windows:
+            if window.contains(moment):
+                return window.rate
+        return self.rate
+
+    def is_paused(self) -> bool:
+        """ Проверить, приостановлена ли передача данных расписанием. """
+        return self.current_rate is None
+
+    def consume(self, size: int):
+        """
+        Учесть передачу size байт, при необходимости дождавшись разрешения.
+
+        Во время приостановки передача, начатая до неё, не ожидается,
+        а ограничивается скоростью rate.
+
+        Args:
+            size (int): объём данных в байтах.
+        """
+        rate = self.current_rate
+        if rate is None:
+            rate = self.rate
+        if not rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            # Запас не превышает объёма данных за одну секунду
+            self._tokens = min(rate, self._tokens + (now - self._updated_at) * rate)
+            self._updated_at = now
+            self._tokens -= size
+            delay = -self._tokens / rate if self._tokens < 0 else 0.0
+
+        if delay:
+            time.sleep(delay)
+
+    @classmethod
+    def parse_schedule(cls, schedule: str) -> List[BandwidthWindow]:
+        """
+        Разобрать расписание ограничений скорости.
+
+        Args:
+            schedule (str): интервалы через запятую в формате ЧЧ:ММ-ЧЧ:ММ=КБ/с,
+                            например 09:00-18:00=512,18:00-23:00=pause.
+        Returns:
+            List[BandwidthWindow]: интервалы со скоростью в байтах в секунду.
+        Raises:
+            ValueError: если расписание записано некорректно.
+        """
+        windows = []
+        for item in schedule.split(','):
+            item = item.strip()
+            if not item:
+                continue
+
+            period, rate = item.split('=')
+            start, end = period.split('-')
+            rate = rate.strip()
+            windows.append(
+                BandwidthWindow(
+                    start=datetime.datetime.strptime(start.strip(), '%H:%M').time(),
+                    end=datetime.datetime.strptime(end.strip(), '%H:%M').time(),
+                    rate=None if rate == cls.PAUSE else int(rate) * 1024,
+                ),
+            )
+        return windows
@@ -0,0 +1,192 @@
+""" Параллельный обход локальной директории с кэшированием содержимого папок. """
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Union
+
+from utils.file_utils import FileInfo, get_local_path, is_temporary, make_file_info
+
+
+class FolderEntries:
+    """ Вспомогательный класс, содержащий список элементов папки на момент обхода. """
+    modified_at: int
+    entries: List[Tuple[str, bool]]
+
+    def __init__(self, modified_at: int, entries: List[Tuple[str, bool]]):
+        self.modified_at = modified_at
+        self.entries = entries
+
+
+class FileScanner:
+    """
+    Обход синхронизируемой директории в нескольких потоках.
+
+    Вложенные папки обходятся параллельно в max_workers потоках, для каждого
+    элемента выполняется одно обращение к stat. Список элементов папки,
+    время изменения которой не изменилось с прошлого обхода, не перечитывается:
+    проверяются только сами элементы из прошлого обхода. Для файлов, у которых
+    не изменились inode, размер и время изменения, возвращается та же
+    информация, что и в прошлый раз, вместе с уже вычисленными контрольными суммами.
+
+    Символические ссылки на папки не раскрываются. Временные файлы
+    незавершённых скачиваний пропускаются.
+    """
+    # Список папки, изменённой позже этого срока до обхода, не кэшируется:
+    # изменение в пределах точности времени изменения можно не заметить
+    RECENT_INTERVAL_NS = 2 * 10 ** 9
+
+    root: str
+
+    def __init__(self, root: str, max_workers: int = 4):
+        self.root = root
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='scan',
+        )
+        self._folders: Dict[str, FolderEntries] = {}
+        self._files: Dict[str, Tuple[tuple, FileInfo]] = {}
+
+    def get_files_info(self) -> Union[Dict[str, FileInfo], None]:
+        """
+        Получение информации о файлах и папках директории и всех вложенных директорий.
+
+        Returns:
+            Dict[str, FileInfo]: словарь с данными о файлах и папках по относительным путям.
+                                 Или None, если директория не существует.
+        """
+        try:
+            root_stat = os.stat(self.root)
+        except OSError:
+            return
+
+        return {info.name: info for info in self.scan(root_stat.st_mtime_ns)}
+
+    def scan(self, modified_at: Union[int, None] = None) -> Iterator[FileInfo]:
+        """
+        Получать информацию о файлах и папках директории по мере обхода.
+
+        Кэш обновляется, только если обход доведён до конца.
+
+        Args:
+            modified_at (int): время изменения директории в наносекундах,
+                               если оно уже известно.
+        Yields:
+            FileInfo: информация об очередном файле или папке.
+        """
+        if modified_at is None:
+            try:
+                modified_at = os.stat(self.root).st_mtime_ns
+            except OSError:
+                return
+
+        pages = queue.Queue(maxsize=self.max_workers * 2)
+        stopped = threading.Event()
+        lock = threading.Lock()
+        pending = [1]
+        folders: Dict[str, FolderEntries] = {}
+        files: Dict[str, Tuple[tuple, FileInfo]] = {}
+
+        def put(page: Union[list, None]):
+            while not stopped.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def scan_folder(folder: str, folder_modified_at: int):
+            try:
+                if stopped.is_set():
+                    return
+                page = []
+                for name, file_stat, is_dir in self._list_folder(folder, folder_modified_at, folders):
+                    key = (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+                    cached = self._files.get(name)
+                    if cached is not None and cached[0] == key and cached[1].is_dir == is_dir:
+                        info = cached[1]
+                    else:
+                        info = make_file_info(name, get_local_path(self.root, name), file_stat, is_dir)
+                    files[name] = (key, info)
+                    page.append(info)
+                    if is_dir and not stopped.is_set():
+                        with lock:
+                            pending[0] += 1
+                        self._executor.submit(scan_folder, name, file_stat.st_mtime_ns)
+                put(page)
+            finally:
+                with lock:
+                    pending[0] -= 1
+                    is_last = pending[0] == 0
+                if is_last:
+                    put(None)
+
+        self._executor.submit(scan_folder, '', modified_at)
+        try:
+            while True:
+                page = pages.get()
+                if page is None:
+                    break
+                yield from page
+
+        finally:
+            stopped.set()
+
+        self._folders = folders
+        self._files = files
+
+    def _list_folder(
+        self,
+        folder: str,
+        modified_at: int,
+        folders: Dict[str, FolderEntries],
+    ) -> List[Tuple[str, os.stat_result, bool]]:
+        """
+        Получить элементы папки с результатами stat.
+
+        Время изменения папки меняется при добавлении, удалении и переименовании
+        элементов, но не при изменении содержимого файлов. Поэтому если оно
+        совпадает с запомненным, список элементов берётся из кэша,
+        но каждый элемент всё равно проверяется.
+
+        Args:
+            folder (str): относительный путь папки, '' - корень директории.
+            modified_at (int): время изменения папки в наносекундах.
+            folders (Dict[str, FolderEntries]): списки элементов текущего обхода.
+        Returns:
+            List[Tuple[str, os.stat_result, bool]]: относительный путь, результат stat
+                                                    и признак папки для каждого элемента.
+        """
+        cached = self._folders.get(folder)
+        if cached is not None and cached.modified_at == modified_at:
+            items = []
+            for name, is_dir in cached.entries:
+                try:
+                    items.append((name, os.stat(get_local_path(self.root, name)), is_dir))
+                except OSError:
+                    continue
+            folders[folder] = cached
+            return items
+
+        items = []
+        try:
+            entries = os.scandir(get_local_path(self.root, folder) if folder else self.root)
+        except OSError:
+            return items
+
+        with entries:
+            for entry in entries:
+                name = f'{folder}/{entry.name}' if folder else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        items.append((name, entry.stat(), True))
+                    elif entry.is_file() and not is_temporary(entry.name):
+                        items.append((name, entry.stat(), False))
+                except OSError:
+                    continue
+
+        if time.time_ns() - modified_at >= self.RECENT_INTERVAL_NS:
+            folders[folder] = FolderEntries(modified_at, [(name, is_dir) for name, _, is_dir in items])
+        return items
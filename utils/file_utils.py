@@ -1,15 +1,29 @@
 """ Вспомогательные методы для работы с файлами. """
 import datetime
 import os
-from typing import Dict, Union
+import stat
+from typing import Dict, Iterator, List, Union
+
+from utils.bandwidth_limiter import BandwidthLimiter
+
+# Суффикс временных файлов, в которые скачиваются файлы из хранилища
+DOWNLOAD_SUFFIX = '.yadisk-part'
 
 
 class FileInfo:
-    """ Вспомогательный класс, содержащий информацию о файле. """
+    """
+    Вспомогательный класс, содержащий информацию о файле или папке.
+
+    name - путь относительно синхронизируемой директории с разделителем '/'.
+    """
     name: str
     path: str
     modified_at: datetime.datetime
     size: int
+    md5: Union[str, None]
+    sha256: Union[str, None]
+    inode: Union[int, None]
+    is_dir: bool
 
     def __init__(
         self,
@@ -17,17 +31,97 @@ class FileInfo:
         path: str,
         modified_at: datetime.datetime,
         size: int,
+        md5: Union[str, None] = None,
+        sha256: Union[str, None] = None,
+        inode: Union[int, None] = None,
+        is_dir: bool = False,
     ):
         self.name = name
         self.path = path
         self.modified_at = modified_at
         self.size = size
+        self.md5 = md5
+        self.sha256 = sha256
+        self.inode = inode
+        self.is_dir = is_dir
 
     def __str__(self):
-        return f'File {self.name}, modified at {self.modified_at}'
+        kind = 'Folder' if self.is_dir else 'File'
+        return f'{kind} {self.name}, modified at {self.modified_at}'
 
     def __repr__(self):
-        return f'File {self.name}, modified at {self.modified_at}'
+        return self.__str__()
+
+
+class FileReader:
+    """
+    Поток чтения файла порциями ограниченного размера.
+
+    Объём передаваемых данных фиксируется при открытии файла, поэтому
+    дописанные во время передачи данные не нарушают заявленную длину.
+    Можно читать не весь файл, а фрагмент длиной length, начиная с offset.
+    Если задан limiter, скорость чтения ограничивается им.
+    """
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        chunk_size: int = CHUNK_SIZE,
+        offset: int = 0,
+        length: Union[int, None] = None,
+        limiter: Union[BandwidthLimiter, None] = None,
+    ):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.limiter = limiter
+        self._file = open(path, 'rb')
+        self._offset = offset
+        self._remaining = max(0, os.fstat(self._file.fileno()).st_size - offset)
+        if length is not None:
+            self._remaining = min(self._remaining, length)
+        self._length = self._remaining
+        self._file.seek(offset)
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Прочитать очередную порцию данных.
+
+        Args:
+            size (int): желаемый размер порции, не больше chunk_size.
+        Returns:
+            bytes: данные. Пустая строка, если файл прочитан полностью.
+        """
+        if size < 0 or size > self.chunk_size:
+            size = self.chunk_size
+        chunk = self._file.read(min(size, self._remaining))
+        self._remaining -= len(chunk)
+        if self.limiter is not None and chunk:
+            self.limiter.consume(len(chunk))
+        return chunk
+
+    def rewind(self):
+        """ Вернуться к началу фрагмента, например для повторной передачи. """
+        self._file.seek(self._offset)
+        self._remaining = self._length
+
+    def close(self):
+        self._file.close()
+
+    def __iter__(self) -> Iterator[bytes]:
+        chunk = self.read()
+        while chunk:
+            yield chunk
+            chunk = self.read()
+
+    def __len__(self) -> int:
+        return self._remaining
+
+    def __enter__(self) -> 'FileReader':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 def check_if_exists(path: str) -> bool:
@@ -56,50 +150,161 @@ def get_base_name(path: str) -> str:
     return os.path.basename(path)
 
 
-def get_file_bytes(path: str) -> Union[bytes, None]:
+def get_stat(path: str) -> os.stat_result:
     """
-    Получение содержимого файла в байтовом виде.
+    Получение сведений о файле.
 
     Args:
         path (str): путь к файлу.
     Returns:
-        bytes: Содержимое файла. Или None, если файл не существует.
+        os.stat_result: сведения о файле.
     """
 
-    if not check_if_exists(path):
+    return os.stat(path)
+
+
+def get_relative_name(path: str, root: str) -> str:
+    """
+    Получение имени файла относительно директории.
+
+    Args:
+        path (str): путь к файлу.
+        root (str): путь к директории.
+    Returns:
+        str: Относительный путь с разделителем '/'.
+    """
+
+    return os.path.relpath(path, root).replace(os.sep, '/')
+
+
+def get_parent_names(name: str) -> List[str]:
+    """
+    Получение имён всех папок, в которых находится файл.
+
+    Args:
+        name (str): относительный путь с разделителем '/'.
+    Returns:
+        List[str]: имена папок от верхней к нижней.
+    """
+
+    parts = name.split('/')[:-1]
+    return ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def get_local_path(root: str, name: str) -> str:
+    """
+    Получение пути к файлу по имени относительно директории.
+
+    Args:
+        root (str): путь к директории.
+        name (str): относительный путь с разделителем '/'.
+    Returns:
+        str: путь к файлу.
+    """
+
+    return os.path.join(root, *name.split('/'))
+
+
+def is_temporary(name: str) -> bool:
+    """ Проверка, является ли файл временным файлом незавершённого скачивания. """
+
+    return name.endswith(DOWNLOAD_SUFFIX)
+
+
+def make_file_info(name: str, path: str, file_stat: os.stat_result, is_dir: bool) -> FileInfo:
+    """
+    Создание информации о файле или папке по результату stat.
+
+    Args:
+        name (str): относительный путь с разделителем '/'.
+        path (str): путь к файлу.
+        file_stat (os.stat_result): результат stat.
+        is_dir (bool): является ли элемент папкой.
+    Returns:
+        FileInfo: данные о файле.
+    """
+    return FileInfo(
+        name=name,
+        path=path,
+        modified_at=datetime.datetime.fromtimestamp(
+            file_stat.st_mtime,
+            tz=datetime.timezone.utc
+        ),
+        size=0 if is_dir else file_stat.st_size,
+        inode=file_stat.st_ino,
+        is_dir=is_dir,
+    )
+
+
+def get_file_info(root: str, name: str) -> Union[FileInfo, None]:
+    """
+    Получение информации о файле или папке.
+
+    Args:
+        root (str): путь к синхронизируемой директории.
+        name (str): относительный путь с разделителем '/'.
+    Returns:
+        FileInfo: данные о файле. Или None, если файл не существует,
+                  не является обычным файлом или папкой или является
+                  временным файлом скачивания.
+    """
+
+    if is_temporary(name):
         return
 
-    with open(path, 'rb') as f:
-        return f.read()
+    path = get_local_path(root, name)
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return
 
+    if stat.S_ISDIR(file_stat.st_mode):
+        return make_file_info(name, path, file_stat, True)
+    if stat.S_ISREG(file_stat.st_mode):
+        return make_file_info(name, path, file_stat, False)
 
-def get_files_info(path: str) -> Union[Dict[str, FileInfo], None]:
+
+def get_files_info(path: str, name: str = '') -> Union[Dict[str, FileInfo], None]:
     """
-    Получение информации о файлах в директории.
+    Получение информации о файлах и папках в директории и всех вложенных директориях.
+
+    Обход выполняется итеративно, для каждого элемента выполняется
+    не более одного обращения к stat. Символические ссылки на папки
+    не раскрываются. Временные файлы незавершённых скачиваний пропускаются.
 
     Args:
-        path (str): путь к директории.
+        path (str): путь к синхронизируемой директории.
+        name (str): относительный путь обходимой поддиректории, по умолчанию - вся директория.
     Returns:
-        Dict[str, FileInfo]: словарь с данными о файлах.
+        Dict[str, FileInfo]: словарь с данными о файлах и папках по относительным путям.
                              Или None, если директория не существует
     """
 
     if not check_if_exists(path):
         return
 
-    return {
-        f.name: FileInfo(
-            name=f.name,
-            path=f.path,
-            modified_at=datetime.datetime.fromtimestamp(
-                f.stat().st_mtime,
-                tz=datetime.timezone.utc
-            ),
-            size=f.stat().st_size,
-        )
-        for f in os.scandir(path)
-        if f.is_file()
-    }
+    files = {}
+    folders = [name]
+    while folders:
+        folder = folders.pop()
+        try:
+            entries = os.scandir(get_local_path(path, folder) if folder else path)
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                entry_name = f'{folder}/{entry.name}' if folder else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        files[entry_name] = make_file_info(entry_name, entry.path, entry.stat(), True)
+                        folders.append(entry_name)
+                    elif entry.is_file() and not is_temporary(entry.name):
+                        files[entry_name] = make_file_info(entry_name, entry.path, entry.stat(), False)
+                except OSError:
+                    continue
+
+    return files
 
 
 def is_abs_path(path: str) -> bool:
@@ -0,0 +1,82 @@
+""" Вычисление и кэширование контрольных сумм локальных файлов. """
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Tuple
+
+from utils.file_utils import FileInfo, FileReader
+
+
+def compute_hashes(path: str) -> Tuple[str, str]:
+    """
+    Вычислить контрольные суммы файла за одно чтение.
+
+    Args:
+        path (str): путь к файлу.
+    Returns:
+        Tuple[str, str]: md5 и sha256 в шестнадцатеричном виде.
+    """
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    with FileReader(path) as reader:
+        for chunk in reader:
+            md5.update(chunk)
+            sha256.update(chunk)
+    return md5.hexdigest(), sha256.hexdigest()
+
+
+class HashCache:
+    """
+    Фоновое вычисление контрольных сумм с кэшированием.
+
+    Результат запоминается по ключу (inode, размер, время изменения),
+    поэтому каждый файл хешируется один раз на каждое изменение,
+    а не в каждом цикле синхронизации. Хранится не более max_entries
+    результатов: при переполнении забываются давно не запрашивавшиеся,
+    в том числе результаты для удалённых и переименованных файлов.
+    """
+    max_entries: int
+
+    def __init__(self, max_workers: int = 2, max_entries: int = 100000):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='hash',
+        )
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[str, Tuple[tuple, Future]]' = OrderedDict()
+
+    def submit(self, file: FileInfo) -> Future:
+        """
+        Запросить контрольные суммы файла.
+
+        По готовности md5 и sha256 также записываются в атрибуты file.
+
+        Args:
+            file (FileInfo): информация о локальном файле.
+        Returns:
+            Future: результат compute_hashes.
+        """
+        key = (file.inode, file.size, file.modified_at.timestamp())
+        with self._lock:
+            cached = self._cache.get(file.path)
+            if cached is not None and cached[0] == key and not (
+                cached[1].done() and cached[1].exception()
+            ):
+                future = cached[1]
+                self._cache.move_to_end(file.path)
+            else:
+                future = self._executor.submit(compute_hashes, file.path)
+                self._cache[file.path] = (key, future)
+                self._cache.move_to_end(file.path)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+
+        future.add_done_callback(lambda f: self._assign(file, f))
+        return future
+
+    @staticmethod
+    def _assign(file: FileInfo, future: Future):
+        if future.exception() is None:
+            file.md5, file.sha256 = future.result()
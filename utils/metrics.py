@@ -0,0 +1,331 @@
+""" Сбор метрик работы синхронизации и их публикация. """
+import cProfile
+import datetime
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, TypeVar, Union
+
+from loguru import logger
+
+T = TypeVar('T')
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """ Вспомогательный класс, содержащий распределение наблюдаемых значений по интервалам. """
+    buckets: Tuple[float, ...]
+    counts: List[int]
+    total: float
+    count: int
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """ Учесть значение. """
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def get_cumulative_counts(self) -> List[int]:
+        """ Получить количество значений, не превышающих каждую из границ интервалов. """
+        result = []
+        count = 0
+        for bucket_count in self.counts:
+            count += bucket_count
+            result.append(count)
+        return result
+
+
+class Metrics:
+    """
+    Набор метрик синхронизации: счётчики, текущие значения и гистограммы с метками.
+
+    Метрики публикуются в текстовом формате Prometheus (render, start_server)
+    и в JSON (to_dict, start_dump). Перед публикацией вызываются функции,
+    добавленные через add_collector, - они обновляют текущие значения,
+    например длину очередей планировщика.
+
+    Этапы цикла синхронизации выполняются внутри phase, время их выполнения
+    попадает в гистограмму phase_seconds. Если задан profile_directory,
+    каждый этап профилируется cProfile, а результат сохраняется в файл
+    {этап}-{время}.prof, который можно открыть через pstats или snakeviz.
+    """
+    PREFIX = 'yadisk_sync_'
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+    COUNTER = 'counter'
+    GAUGE = 'gauge'
+    HISTOGRAM = 'histogram'
+
+    profile_directory: Union[str, None]
+
+    def __init__(self, profile_directory: Union[str, None] = None):
+        self.profile_directory = profile_directory
+        self._lock = threading.Lock()
+        self._types: Dict[str, str] = {}
+        self._values: Dict[str, Dict[Labels, Union[float, Histogram]]] = {}
+        self._collectors: List[Callable[['Metrics'], None]] = []
+        self._profiling = threading.local()
+
+    def increment(self, name: str, value: float = 1, **labels: str):
+        """ Увеличить счётчик. """
+        key = self._get_key(labels)
+        with self._lock:
+            values = self._get_values(name, self.COUNTER)
+            values[key] = values.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        """ Установить текущее значение. """
+        key = self._get_key(labels)
+        with self._lock:
+            self._get_values(name, self.GAUGE)[key] = value
+
+    def observe(self, name: str, value: float, **labels: str):
+        """ Учесть значение в гистограмме, например длительность запроса в секундах. """
+        key = self._get_key(labels)
+        with self._lock:
+            values = self._get_values(name, self.HISTOGRAM)
+            histogram = values.get(key)
+            if histogram is None:
+                histogram = values[key] = Histogram(self.BUCKETS)
+            histogram.observe(value)
+
+    def add_collector(self, collector: Callable[['Metrics'], None]):
+        """ Добавить функцию, обновляющую метрики перед публикацией. """
+        with self._lock:
+            self._collectors.append(collector)
+
+    @contextmanager
+    def phase(self, name: str, **labels: str) -> Iterator[None]:
+        """
+        Выполнить этап цикла синхронизации с измерением его длительности.
+
+        Args:
+            name (str): название этапа.
+            **labels: дополнительные метки, например имя задания синхронизации.
+        """
+        profile = None
+        if self.profile_directory and not getattr(self._profiling, 'active', False):
+            profile = cProfile.Profile()
+            self._profiling.active = True
+            profile.enable()
+
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe('phase_seconds', time.monotonic() - started_at, phase=name, **labels)
+            if profile is not None:
+                profile.disable()
+                self._profiling.active = False
+                self._save_profile(profile, name)
+
+    def timed(self, items: Iterable[T], name: str, **labels: str) -> Iterator[T]:
+        """
+        Перебрать элементы, измеряя общее время ожидания каждого следующего элемента.
+
+        Время учитывается в гистограмме phase_seconds как этап name,
+        например ожидание страниц списка файлов хранилища.
+        """
+        waited = 0.0
+        iterator = iter(items)
+        try:
+            while True:
+                started_at = time.monotonic()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    waited += time.monotonic() - started_at
+                yield item
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            self.observe('phase_seconds', waited, phase=name, **labels)
+
+    def render(self) -> str:
+        """
+        Получить метрики в текстовом формате Prometheus.
+
+        Returns:
+            str: метрики, по одной строке на значение.
+        """
+        lines = []
+        for name, kind, values in self._collect():
+            full_name = self.PREFIX + name
+            lines.append(f'# TYPE {full_name} {kind}')
+            for key, value in values:
+                if kind != self.HISTOGRAM:
+                    lines.append(f'{full_name}{self._format_labels(key)} {value}')
+                    continue
+
+                bounds = [str(bound) for bound in value.buckets] + ['+Inf']
+                counts = value.get_cumulative_counts() + [value.count]
+                for bound, count in zip(bounds, counts):
+                    lines.append(f'{full_name}_bucket{self._format_labels(key + (("le", bound),))} {count}')
+                lines.append(f'{full_name}_sum{self._format_labels(key)} {value.total}')
+                lines.append(f'{full_name}_count{self._format_labels(key)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> dict:
+        """
+        Получить метрики в виде словаря для сохранения в JSON.
+
+        Returns:
+            dict: время получения и значения метрик по именам.
+        """
+        metrics = {}
+        for name, kind, values in self._collect():
+            items = []
+            for key, value in values:
+                item = {'labels': dict(key)}
+                if kind == self.HISTOGRAM:
+                    item['count'] = value.count
+                    item['sum'] = value.total
+                    item['buckets'] = dict(zip(
+                        [str(bound) for bound in value.buckets],
+                        value.get_cumulative_counts(),
+                    ))
+                else:
+                    item['value'] = value
+                items.append(item)
+            metrics[name] = {'type': kind, 'values': items}
+        return {
+            'time': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'metrics': metrics,
+        }
+
+    def dump(self, path: str):
+        """ Сохранить метрики в JSON-файл, заменив его целиком. """
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=2)
+        os.replace(temporary_path, path)
+
+    def start_dump(self, path: str, interval: int) -> threading.Thread:
+        """
+        Сохранять метрики в JSON-файл раз в interval секунд в фоновом потоке.
+
+        Args:
+            path (str): путь к файлу.
+            interval (int): интервал в секундах.
+        Returns:
+            threading.Thread: запущенный поток.
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump(path)
+                except OSError as e:
+                    logger.warning(
+                        'Не удалось сохранить метрики в {path}: {error}'.format(path=path, error=e),
+                    )
+
+        thread = threading.Thread(target=run, name='metrics-dump', daemon=True)
+        thread.start()
+        return thread
+
+    def start_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        """
+        Запустить HTTP-сервер, отдающий метрики в формате Prometheus по адресу /metrics.
+
+        Args:
+            host (str): адрес, на котором принимаются соединения.
+            port (int): порт.
+        Returns:
+            ThreadingHTTPServer: запущенный сервер.
+        Raises:
+            OSError: если порт занят или недоступен.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+        return server
+
+    def _collect(self) -> List[Tuple[str, str, List[Tuple[Labels, Union[float, Histogram]]]]]:
+        """ Обновить метрики функциями сбора и получить копию значений. """
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            collector(self)
+
+        with self._lock:
+            result = []
+            for name in sorted(self._values):
+                values = []
+                for key, value in sorted(self._values[name].items()):
+                    if isinstance(value, Histogram):
+                        copy = Histogram(value.buckets)
+                        copy.counts = list(value.counts)
+                        copy.total = value.total
+                        copy.count = value.count
+                        value = copy
+                    values.append((key, value))
+                result.append((name, self._types[name], values))
+            return result
+
+    def _get_values(self, name: str, kind: str) -> Dict[Labels, Union[float, Histogram]]:
+        values = self._values.get(name)
+        if values is None:
+            self._types[name] = kind
+            values = self._values[name] = {}
+        return values
+
+    def _save_profile(self, profile: cProfile.Profile, name: str):
+        path = os.path.join(
+            self.profile_directory,
+            '{name}-{time:%Y%m%d-%H%M%S-%f}.prof'.format(name=name, time=datetime.datetime.now()),
+        )
+        try:
+            profile.dump_stats(path)
+        except OSError as e:
+            logger.warning(
+                'Не удалось сохранить профиль этапа {name}: {error}'.format(name=name, error=e),
+            )
+
+    @staticmethod
+    def _get_key(labels: Dict[str, str]) -> Labels:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    @staticmethod
+    def _format_labels(key: Labels) -> str:
+        if not key:
+            return ''
+        escaped = (
+            '{name}="{value}"'.format(
+                name=name,
+                value=value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'),
+            )
+            for name, value in key
+        )
+        return '{' + ','.join(escaped) + '}'
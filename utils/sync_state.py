@@ -0,0 +1,682 @@
+""" Хранилище состояния синхронизации. """
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Union
+
+from utils.file_utils import FileInfo
+
+
+class SyncRecord:
+    """ Вспомогательный класс, содержащий сведения о синхронизированном файле. """
+    name: str
+    size: int
+    modified_at: float
+    md5: Union[str, None]
+    sha256: Union[str, None]
+    inode: Union[int, None]
+    is_dir: bool
+
+    def __init__(
+        self,
+        name: str,
+        size: int,
+        modified_at: float,
+        md5: Union[str, None] = None,
+        sha256: Union[str, None] = None,
+        inode: Union[int, None] = None,
+        is_dir: bool = False,
+    ):
+        self.name = name
+        self.size = size
+        self.modified_at = modified_at
+        self.md5 = md5
+        self.sha256 = sha256
+        self.inode = inode
+        self.is_dir = bool(is_dir)
+
+    @classmethod
+    def from_file_info(
+        cls,
+        local_file: FileInfo,
+        remote_file: Union[FileInfo, None] = None,
+    ) -> 'SyncRecord':
+        """
+        Создать запись по информации о локальном и удалённом файле.
+
+        Контрольные суммы берутся из информации о файле в хранилище,
+        а если она не передана - из информации о локальном файле.
+
+        Args:
+            local_file (FileInfo): информация о локальном файле.
+            remote_file (FileInfo): информация о файле в хранилище, если известна.
+        Returns:
+            SyncRecord
+        """
+        hashed_file = remote_file or local_file
+        return cls(
+            name=local_file.name,
+            size=local_file.size,
+            modified_at=local_file.modified_at.timestamp(),
+            md5=hashed_file.md5,
+            sha256=hashed_file.sha256,
+            inode=local_file.inode,
+            is_dir=local_file.is_dir,
+        )
+
+    def matches(self, local_file: FileInfo) -> bool:
+        """
+        Проверить, что локальный файл не менялся с момента синхронизации.
+
+        Args:
+            local_file (FileInfo): информация о локальном файле.
+        Returns:
+            bool
+        """
+        if self.is_dir or local_file.is_dir:
+            return self.is_dir == local_file.is_dir
+
+        return (
+            self.size == local_file.size and
+            self.modified_at == local_file.modified_at.timestamp()
+        )
+
+    def __str__(self):
+        return f'Record {self.name}, size {self.size}'
+
+    def __repr__(self):
+        return f'Record {self.name}, size {self.size}'
+
+
+class UploadCheckpoint:
+    """ Вспомогательный класс, содержащий сведения о незавершённой передаче файла. """
+    name: str
+    href: str
+    size: int
+    modified_at: float
+    offset: int
+
+    def __init__(
+        self,
+        name: str,
+        href: str,
+        size: int,
+        modified_at: float,
+        offset: int = 0,
+    ):
+        self.name = name
+        self.href = href
+        self.size = size
+        self.modified_at = modified_at
+        self.offset = offset
+
+    def __str__(self):
+        return f'Checkpoint {self.name}, {self.offset} of {self.size} bytes'
+
+    def __repr__(self):
+        return f'Checkpoint {self.name}, {self.offset} of {self.size} bytes'
+
+
+class FileSegment:
+    """ Вспомогательный класс, содержащий сведения о переданном сегменте файла. """
+    name: str
+    index: int
+    offset: int
+    size: int
+    sha256: str
+
+    def __init__(
+        self,
+        name: str,
+        index: int,
+        offset: int,
+        size: int,
+        sha256: str,
+    ):
+        self.name = name
+        self.index = index
+        self.offset = offset
+        self.size = size
+        self.sha256 = sha256
+
+    def __str__(self):
+        return f'Segment {self.index} of {self.name}, {self.size} bytes at {self.offset}'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class BundledFile:
+    """ Вспомогательный класс, содержащий сведения о файле, переданном в составе архива. """
+    name: str
+    bundle: str
+    member: str
+    size: int
+    modified_at: float
+
+    def __init__(
+        self,
+        name: str,
+        bundle: str,
+        member: str,
+        size: int,
+        modified_at: float,
+    ):
+        self.name = name
+        self.bundle = bundle
+        self.member = member
+        self.size = size
+        self.modified_at = modified_at
+
+    def __str__(self):
+        return f'Bundled {self.name} in {self.bundle}'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class SyncState:
+    """
+    Хранилище сведений о последней успешной синхронизации каждого файла.
+
+    Данные хранятся в SQLite. Каждое полное получение списка файлов
+    хранилища открывает новое поколение записей: записи, не подтверждённые
+    в текущем поколении, удаляются по его завершении.
+    """
+    FILE_NAME = 'sync_state.sqlite3'
+    COMMIT_EVERY = 500
+    BATCH_SIZE = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._connection.executescript(
+                '''
+                CREATE TABLE IF NOT EXISTS files (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    modified_at REAL NOT NULL,
+                    md5 TEXT,
+                    sha256 TEXT,
+                    generation INTEGER NOT NULL,
+                    inode INTEGER,
+                    is_dir INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS files_content ON files (size, md5);
+                CREATE TABLE IF NOT EXISTS uploads (
+                    name TEXT PRIMARY KEY,
+                    href TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    modified_at REAL NOT NULL,
+                    offset INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS segments (
+                    name TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    PRIMARY KEY (name, idx)
+                );
+                CREATE TABLE IF NOT EXISTS segmented_files (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    modified_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS bundles (
+                    name TEXT PRIMARY KEY
+                );
+                CREATE TABLE IF NOT EXISTS bundled_files (
+                    name TEXT PRIMARY KEY,
+                    bundle TEXT NOT NULL,
+                    member TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    modified_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS bundled_files_bundle ON bundled_files (bundle);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                ''',
+            )
+            columns = {
+                row[1]
+                for row in self._connection.execute('PRAGMA table_info(files)')
+            }
+            if 'inode' not in columns:
+                self._connection.execute('ALTER TABLE files ADD COLUMN inode INTEGER')
+            if 'is_dir' not in columns:
+                self._connection.execute(
+                    'ALTER TABLE files ADD COLUMN is_dir INTEGER NOT NULL DEFAULT 0',
+                )
+            self._connection.commit()
+        self._generation = int(self._get_meta('generation', '0'))
+
+    def bind(self, root: str) -> bool:
+        """
+        Привязать состояние к папке хранилища.
+
+        Если состояние было сохранено для другой папки или другого аккаунта,
+        все сведения о синхронизации сбрасываются: иначе файлы, отсутствующие
+        в новой папке, считались бы удалёнными из хранилища.
+
+        Args:
+            root (str): идентификатор папки синхронизации в хранилище.
+        Returns:
+            bool: False, если состояние было сброшено.
+        """
+        bound_root = self._get_meta('root', '')
+        if bound_root == root:
+            return True
+
+        with self._lock:
+            is_reset = bool(bound_root)
+            if is_reset:
+                for table in ('files', 'uploads', 'segments', 'segmented_files', 'bundles', 'bundled_files'):
+                    self._connection.execute('DELETE FROM {table}'.format(table=table))
+                self._set_meta('listed_at', '0')
+                self._set_meta('changes_checked_at', '0')
+            self._set_meta('root', root)
+            self._commit()
+        return not is_reset
+
+    @property
+    def listed_at(self) -> float:
+        """ Время последнего полного получения списка файлов хранилища. """
+        return float(self._get_meta('listed_at', '0'))
+
+    @property
+    def changes_checked_at(self) -> float:
+        """ Время последней проверки ленты изменений хранилища. """
+        return float(self._get_meta('changes_checked_at', '0'))
+
+    def set_changes_checked_at(self, checked_at: float):
+        """ Запомнить время проверки ленты изменений хранилища. """
+        with self._lock:
+            self._set_meta('changes_checked_at', str(checked_at))
+            self._maybe_commit()
+
+    def get(self, name: str) -> Union[SyncRecord, None]:
+        """
+        Получить запись о файле.
+
+        Args:
+            name (str): имя файла.
+        Returns:
+            SyncRecord: запись. Или None, если файл не синхронизировался.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT name, size, modified_at, md5, sha256, inode, is_dir FROM files WHERE name = ?',
+                (name,),
+            ).fetchone()
+        if row is None:
+            return
+        return SyncRecord(*row)
+
+    def has_hashed_size(self, size: int) -> bool:
+        """
+        Проверить, есть ли файл заданного размера с известной контрольной суммой.
+
+        Args:
+            size (int): размер файла в байтах.
+        Returns:
+            bool
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT 1 FROM files WHERE size = ? AND md5 IS NOT NULL AND is_dir = 0 LIMIT 1',
+                (size,),
+            ).fetchone()
+        return row is not None
+
+    def find_by_content(
+        self,
+        size: int,
+        md5: str,
+        sha256: str,
+    ) -> Union[SyncRecord, None]:
+        """
+        Найти синхронизированный файл с тем же содержимым.
+
+        Args:
+            size (int): размер файла в байтах.
+            md5 (str): контрольная сумма MD5.
+            sha256 (str): контрольная сумма SHA-256.
+        Returns:
+            SyncRecord: запись о файле. Или None, если такого файла нет.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT name, size, modified_at, md5, sha256, inode, is_dir FROM files '
+                'WHERE size = ? AND md5 = ? AND sha256 = ? AND is_dir = 0 LIMIT 1',
+                (size, md5, sha256),
+            ).fetchone()
+        if row is None:
+            return
+        return SyncRecord(*row)
+
+    def put(self, record: SyncRecord):
+        """ Сохранить запись о файле в текущем поколении. """
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO files '
+                '(name, size, modified_at, md5, sha256, inode, is_dir, generation) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    record.name,
+                    record.size,
+                    record.modified_at,
+                    record.md5,
+                    record.sha256,
+                    record.inode,
+                    record.is_dir,
+                    self._generation,
+                ),
+            )
+            self._maybe_commit()
+
+    def remove(self, name: str):
+        """ Удалить запись о файле. """
+        with self._lock:
+            self._connection.execute('DELETE FROM files WHERE name = ?', (name,))
+            self._maybe_commit()
+
+    def remove_tree(self, name: str):
+        """ Удалить запись о папке и обо всём её содержимом. """
+        with self._lock:
+            self._connection.execute(
+                'DELETE FROM files WHERE name = ? OR (name > ? AND name < ?)',
+                (name, name + '/', name + '0'),
+            )
+            self._maybe_commit()
+
+    def records(self, folder: Union[str, None] = None) -> Iterator[SyncRecord]:
+        """
+        Перебрать записи.
+
+        Записи читаются порциями по BATCH_SIZE, поэтому их можно изменять
+        во время перебора.
+
+        Args:
+            folder (str): перебрать только содержимое этой папки, по умолчанию - все записи.
+        Yields:
+            SyncRecord
+        """
+        last_name = folder + '/' if folder else ''
+        upper_name = folder + '0' if folder else '\U0010ffff'
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    'SELECT name, size, modified_at, md5, sha256, inode, is_dir FROM files '
+                    'WHERE name > ? AND name < ? ORDER BY name LIMIT ?',
+                    (last_name, upper_name, self.BATCH_SIZE),
+                ).fetchall()
+            for row in rows:
+                yield SyncRecord(*row)
+            if len(rows) < self.BATCH_SIZE:
+                return
+            last_name = rows[-1][0]
+
+    def get_checkpoint(self, name: str) -> Union[UploadCheckpoint, None]:
+        """
+        Получить сведения о незавершённой передаче файла.
+
+        Args:
+            name (str): имя файла.
+        Returns:
+            UploadCheckpoint: сведения о передаче. Или None, если передача не начиналась.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT name, href, size, modified_at, offset FROM uploads WHERE name = ?',
+                (name,),
+            ).fetchone()
+        if row is None:
+            return
+        return UploadCheckpoint(*row)
+
+    def save_checkpoint(self, checkpoint: UploadCheckpoint):
+        """ Сохранить сведения о незавершённой передаче файла немедленно. """
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO uploads '
+                '(name, href, size, modified_at, offset) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (
+                    checkpoint.name,
+                    checkpoint.href,
+                    checkpoint.size,
+                    checkpoint.modified_at,
+                    checkpoint.offset,
+                ),
+            )
+            self._commit()
+
+    def remove_checkpoint(self, name: str):
+        """ Удалить сведения о передаче файла. """
+        with self._lock:
+            self._connection.execute('DELETE FROM uploads WHERE name = ?', (name,))
+            self._commit()
+
+    def get_segments(self, name: str) -> List[FileSegment]:
+        """
+        Получить сведения о переданных сегментах файла.
+
+        Args:
+            name (str): имя файла.
+        Returns:
+            List[FileSegment]: сегменты по порядку. Пустой список, если файл не передавался сегментами.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT name, idx, offset, size, sha256 FROM segments WHERE name = ? ORDER BY idx',
+                (name,),
+            ).fetchall()
+        return [FileSegment(*row) for row in rows]
+
+    def save_segment(self, segment: FileSegment):
+        """ Сохранить сведения о переданном сегменте файла немедленно. """
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO segments (name, idx, offset, size, sha256) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (segment.name, segment.index, segment.offset, segment.size, segment.sha256),
+            )
+            self._commit()
+
+    def finish_segments(self, name: str, count: int, size: int, modified_at: float):
+        """
+        Завершить передачу файла сегментами.
+
+        Args:
+            name (str): имя файла.
+            count (int): количество сегментов, сегменты с большими номерами удаляются.
+            size (int): размер файла в байтах.
+            modified_at (float): время изменения переданного файла.
+        """
+        with self._lock:
+            self._connection.execute(
+                'DELETE FROM segments WHERE name = ? AND idx >= ?',
+                (name, count),
+            )
+            self._connection.execute(
+                'INSERT OR REPLACE INTO segmented_files (name, size, modified_at) VALUES (?, ?, ?)',
+                (name, size, modified_at),
+            )
+            self._commit()
+
+    def get_segmented_files(self, folder: Union[str, None] = None) -> List[SyncRecord]:
+        """
+        Получить файлы, переданные сегментами.
+
+        Args:
+            folder (str): только файлы, находящиеся в этой папке, или сам файл с этим именем.
+                          По умолчанию - все файлы.
+        Returns:
+            List[SyncRecord]: имя, размер и время изменения каждого файла.
+        """
+        return self._get_stored_files('segmented_files', folder)
+
+    def remove_segments(self, name: str):
+        """ Удалить сведения о сегментах файла или всех файлов папки. """
+        with self._lock:
+            for table in ('segments', 'segmented_files'):
+                self._connection.execute(
+                    'DELETE FROM {table} WHERE name = ? OR (name > ? AND name < ?)'.format(table=table),
+                    (name, name + '/', name + '0'),
+                )
+            self._commit()
+
+    def move_segments(self, source_name: str, name: str):
+        """ Перенести сведения о сегментах файла на новое имя. """
+        with self._lock:
+            for table in ('segments', 'segmented_files'):
+                self._connection.execute(
+                    'DELETE FROM {table} WHERE name = ?'.format(table=table),
+                    (name,),
+                )
+                self._connection.execute(
+                    'UPDATE {table} SET name = ? WHERE name = ?'.format(table=table),
+                    (name, source_name),
+                )
+            self._commit()
+
+    def get_bundled(self, name: str) -> Union[BundledFile, None]:
+        """
+        Получить сведения о файле, переданном в составе архива.
+
+        Args:
+            name (str): имя файла.
+        Returns:
+            BundledFile: сведения о файле. Или None, если файл не передавался в архиве.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT name, bundle, member, size, modified_at FROM bundled_files WHERE name = ?',
+                (name,),
+            ).fetchone()
+        if row is None:
+            return
+        return BundledFile(*row)
+
+    def save_bundle(self, bundle: str, files: List[BundledFile]):
+        """ Сохранить сведения о переданном архиве и его содержимом немедленно. """
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO bundles (name) VALUES (?)', (bundle,))
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO bundled_files (name, bundle, member, size, modified_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(f.name, f.bundle, f.member, f.size, f.modified_at) for f in files],
+            )
+            self._commit()
+
+    def get_bundled_files(self, folder: Union[str, None] = None) -> List[SyncRecord]:
+        """
+        Получить файлы, переданные в составе архивов.
+
+        Args:
+            folder (str): только файлы, находящиеся в этой папке, или сам файл с этим именем.
+                          По умолчанию - все файлы.
+        Returns:
+            List[SyncRecord]: имя, размер и время изменения каждого файла.
+        """
+        return self._get_stored_files('bundled_files', folder)
+
+    def remove_bundled(self, name: str):
+        """ Удалить сведения о файле или всех файлах папки, переданных в архивах. """
+        with self._lock:
+            self._connection.execute(
+                'DELETE FROM bundled_files WHERE name = ? OR (name > ? AND name < ?)',
+                (name, name + '/', name + '0'),
+            )
+            self._commit()
+
+    def move_bundled(self, source_name: str, name: str):
+        """ Перенести сведения о файле в архиве на новое имя. """
+        with self._lock:
+            self._connection.execute('DELETE FROM bundled_files WHERE name = ?', (name,))
+            self._connection.execute(
+                'UPDATE bundled_files SET name = ? WHERE name = ?',
+                (name, source_name),
+            )
+            self._commit()
+
+    def get_unused_bundles(self) -> List[str]:
+        """ Получить архивы, все файлы которых заменены более новыми версиями или удалены. """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT name FROM bundles WHERE NOT EXISTS '
+                '(SELECT 1 FROM bundled_files WHERE bundled_files.bundle = bundles.name)',
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def remove_bundle(self, bundle: str):
+        """ Удалить сведения об архиве. """
+        with self._lock:
+            self._connection.execute('DELETE FROM bundles WHERE name = ?', (bundle,))
+            self._commit()
+
+    def _get_stored_files(self, table: str, folder: Union[str, None]) -> List[SyncRecord]:
+        query = 'SELECT name, size, modified_at FROM {table}'.format(table=table)
+        params = ()
+        if folder:
+            query += ' WHERE name = ? OR (name > ? AND name < ?)'
+            params = (folder, folder + '/', folder + '0')
+        with self._lock:
+            rows = self._connection.execute(query + ' ORDER BY name', params).fetchall()
+        return [SyncRecord(*row) for row in rows]
+
+    def begin_listing(self):
+        """ Начать новое поколение записей перед полным получением списка файлов. """
+        with self._lock:
+            self._generation += 1
+            self._set_meta('generation', str(self._generation))
+
+    def finish_listing(self):
+        """ Удалить записи прошлых поколений и запомнить время получения списка. """
+        with self._lock:
+            self._connection.execute(
+                'DELETE FROM files WHERE generation < ?',
+                (self._generation,),
+            )
+            self._set_meta('listed_at', str(time.time()))
+            self._commit()
+
+    def invalidate(self):
+        """ Пометить состояние как недостоверное, чтобы запросить полный список файлов. """
+        with self._lock:
+            self._set_meta('listed_at', '0')
+            self._commit()
+
+    def commit(self):
+        """ Записать накопленные изменения на диск. """
+        with self._lock:
+            self._commit()
+
+    def _get_meta(self, key: str, default: str) -> str:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value FROM meta WHERE key = ?',
+                (key,),
+            ).fetchone()
+        return default if row is None else row[0]
+
+    def _set_meta(self, key: str, value: str):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+            (key, value),
+        )
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self._commit()
+
+    def _commit(self):
+        self._connection.commit()
+        self._pending = 0